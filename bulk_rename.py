@@ -0,0 +1,274 @@
+"""按模板或CSV批量重命名图片的事务引擎
+
+先规划完整的重命名顺序：目标被占用的文件等占用者先移走，形成环的（如互换
+001 和 002）借助一个临时文件名打开；执行前写入事务日志并逐步记录进度，中途出错
+立即回滚，进程崩溃后下次打开文件夹时按日志回滚
+"""
+
+import csv
+import json
+import os
+
+from picture_tools import (
+    RENAME_JOURNAL_NAME,
+    rename_in_folder_index,
+    rename_many_in_manifest,
+    temp_path_for,
+)
+
+JOURNAL_VERSION = 2
+# 文件名中不允许出现的字符（按 Windows 的规则，保证文件夹可以在各平台间共享）
+INVALID_NAME_CHARS = set('<>:"/\\|?*')
+
+
+def names_from_template(names, template, start=1):
+    """按模板生成 {原文件名: 新文件名}，扩展名保持不变
+
+    模板中 {n} 为序号（从 start 开始，可写成 {n:03d}），{name} 为原文件名（不含扩展名）
+    """
+    mapping = {}
+    for offset, name in enumerate(names):
+        base_name, ext = os.path.splitext(name)
+        try:
+            new_base = template.format(n=start + offset, name=base_name)
+        except (KeyError, IndexError, ValueError) as e:
+            raise ValueError(f"无效的模板: {template}") from e
+        mapping[name] = new_base.strip() + ext
+    return mapping
+
+
+def names_from_csv(csv_path, names):
+    """读取两列CSV（原文件名, 新文件名），返回 {原文件名: 新文件名}
+
+    原文件名可以省略扩展名；新文件名没有原扩展名时自动补上；第一行不是已知
+    文件时视为表头
+    """
+    lookup = {name: name for name in names}
+    base_names = {}
+    for name in names:
+        base_names.setdefault(os.path.splitext(name)[0], []).append(name)
+    for base_name, matches in base_names.items():
+        if len(matches) == 1:
+            lookup.setdefault(base_name, matches[0])
+
+    mapping = {}
+    with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
+        for row_number, row in enumerate(csv.reader(f), 1):
+            if not row or not row[0].strip():
+                continue
+            old_name = lookup.get(row[0].strip())
+            if old_name is None:
+                if row_number == 1:
+                    continue  # 表头
+                raise ValueError(f"第 {row_number} 行: 找不到图片 {row[0].strip()}")
+            if len(row) < 2 or not row[1].strip():
+                raise ValueError(f"第 {row_number} 行缺少新文件名")
+
+            new_name = row[1].strip()
+            ext = os.path.splitext(old_name)[1]
+            if os.path.splitext(new_name)[1].lower() != ext.lower():
+                new_name += ext
+            mapping[old_name] = new_name
+    return mapping
+
+
+def _check_name(name):
+    base_name = os.path.splitext(name)[0]
+    if not base_name.strip() or name in (".", ".."):
+        raise ValueError("文件名不能为空")
+    if name.startswith(".") or name.endswith((" ", ".")):
+        raise ValueError(f"无效的文件名: {name}")
+    if any(ch in INVALID_NAME_CHARS or ord(ch) < 32 for ch in name):
+        raise ValueError(f"文件名包含无效字符: {name}")
+
+
+def _validate(folder, moves):
+    """检查原文件都存在、新文件名有效且互不重复，也不与其它已有文件冲突"""
+    key = os.path.normcase
+    existing = {key(name) for name in os.listdir(folder)}
+    sources = {key(old_name) for old_name in moves}
+    targets = set()
+    for old_name, new_name in moves.items():
+        if key(old_name) not in existing:
+            raise FileNotFoundError(f"找不到图片: {old_name}")
+        _check_name(new_name)
+        target = key(new_name)
+        if target in targets:
+            raise ValueError(f"目标文件名重复: {new_name}")
+        targets.add(target)
+        if target in existing and target not in sources:
+            raise FileExistsError(f"文件名已存在: {new_name}")
+
+
+def _temp_name(name):
+    # 与其它临时文件同样由 temp_path_for 命名，扫描图片文件夹时会被忽略
+    base, ext = os.path.splitext(name)
+    return os.path.basename(temp_path_for(f"{base}.{os.getpid()}.rename{ext}"))
+
+
+def plan_renames(folder, mapping):
+    """把 {原文件名: 新文件名} 规划为可依次执行的 [(原名, 新名)] 步骤
+
+    目标被另一个待移动文件占用时先移动占用者；形成环时先把环中一个文件移到
+    临时名。每个文件只移动一次，只有环才多一步
+    """
+    moves = {old: new for old, new in mapping.items() if old != new}
+    _validate(folder, moves)
+
+    key = os.path.normcase
+    source_by_key = {key(old_name): old_name for old_name in moves}
+    done = set()
+    steps = []
+    for start in moves:
+        if start in done:
+            continue
+
+        # 沿 "目标被谁占用" 前进，直到目标空闲（链）或回到起点（环）
+        path = [start]
+        cycle = False
+        while True:
+            occupant = source_by_key.get(key(moves[path[-1]]))
+            if occupant is None or occupant in done:
+                break
+            if occupant == start:
+                cycle = True
+                break
+            path.append(occupant)
+
+        if cycle:
+            temp_name = _temp_name(start)
+            steps.append((start, temp_name))
+            steps.extend((name, moves[name]) for name in reversed(path[1:]))
+            steps.append((temp_name, moves[start]))
+        else:
+            steps.extend((name, moves[name]) for name in reversed(path))
+        done.update(path)
+    return steps
+
+
+def _journal_path(folder):
+    return os.path.join(folder, RENAME_JOURNAL_NAME)
+
+
+def _write_journal(folder, steps):
+    """在执行前把全部步骤写入磁盘，返回以追加方式打开的日志，用于记录进度
+
+    日志每行一个JSON：第一行为步骤列表，之后每完成（或撤销）一步追加一行
+    """
+    journal_path = _journal_path(folder)
+    temp_path = temp_path_for(journal_path)
+    with open(temp_path, "w", encoding="utf-8") as f:
+        header = {"version": JOURNAL_VERSION, "steps": steps}
+        f.write(json.dumps(header, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, journal_path)
+    return open(journal_path, "a", encoding="utf-8")
+
+
+def _log_progress(journal, kind, index):
+    """追加一条进度记录并立即落盘"""
+    journal.write(json.dumps({kind: index}) + "\n")
+    journal.flush()
+    os.fsync(journal.fileno())
+
+
+def _read_journal(journal_path):
+    """返回 (步骤列表, 已完成的步数, 已撤销的步数)"""
+    with open(journal_path, "r", encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    header = json.loads(lines[0])
+    if header.get("version") != JOURNAL_VERSION:
+        raise ValueError(f"不支持的日志版本: {header.get('version')}")
+    steps = [tuple(step) for step in header["steps"]]
+    done = undone = 0
+    for line in lines[1:]:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            break  # 写到一半时崩溃留下的不完整记录
+        if "done" in record:
+            done = record["done"] + 1
+        elif "undone" in record:
+            undone += 1
+    return steps, done, undone
+
+
+def _step_ran(folder, step):
+    old_name, new_name = step
+    return os.path.exists(os.path.join(folder, new_name)) and not os.path.exists(
+        os.path.join(folder, old_name)
+    )
+
+
+def _undo_steps(folder, steps, journal, undone=0):
+    """倒序撤销已执行的前 len(steps) 步中尚未撤销的部分，返回本次撤销的数量
+
+    每撤销一步追加一条记录，撤销过程中崩溃后可以接着撤销
+    """
+    count = 0
+    for index in reversed(range(len(steps) - undone)):
+        old_name, new_name = steps[index]
+        # 只有撤销中途崩溃时正在撤销的那一步可能已经撤销过
+        if _step_ran(folder, steps[index]):
+            os.rename(os.path.join(folder, new_name), os.path.join(folder, old_name))
+            count += 1
+        _log_progress(journal, "undone", index)
+    return count
+
+
+def recover_renames(folder):
+    """回滚上次中断的批量重命名，返回恢复的文件数；没有未完成的事务时返回 0"""
+    journal_path = _journal_path(folder)
+    try:
+        steps, done, undone = _read_journal(journal_path)
+    except FileNotFoundError:
+        return 0
+    except (OSError, ValueError, KeyError, TypeError, IndexError) as e:
+        print(f"读取重命名日志失败: {e}")
+        return 0
+
+    with open(journal_path, "a", encoding="utf-8") as journal:
+        # 已记录完成的步骤之后最多还有一步在记录前已执行：按计划它的目标此时
+        # 必然空闲，因此可以由文件是否存在准确判断
+        if not undone and done < len(steps) and _step_ran(folder, steps[done]):
+            _log_progress(journal, "done", done)
+            done += 1
+        undone_count = _undo_steps(folder, steps[:done], journal, undone)
+    os.remove(journal_path)
+    return undone_count
+
+
+def apply_renames(folder, mapping):
+    """以事务方式批量重命名，返回实际改名的 {原文件名: 新文件名}
+
+    任一步失败时撤销已完成的步骤并重新抛出异常；成功后同步更新提取清单和
+    文件夹索引
+    """
+    # 先处理上次遗留的事务，保证文件夹处于一致状态
+    recover_renames(folder)
+
+    steps = plan_renames(folder, mapping)
+    if not steps:
+        return {}
+
+    executed = 0
+    with _write_journal(folder, steps) as journal:
+        try:
+            for index, (old_name, new_name) in enumerate(steps):
+                os.rename(
+                    os.path.join(folder, old_name), os.path.join(folder, new_name)
+                )
+                executed += 1
+                _log_progress(journal, "done", index)
+        except BaseException:
+            _undo_steps(folder, steps[:executed], journal)
+            journal.close()
+            os.remove(_journal_path(folder))
+            raise
+    os.remove(_journal_path(folder))
+
+    renamed = {old: new for old, new in mapping.items() if old != new}
+    rename_many_in_manifest(folder, renamed)
+    rename_in_folder_index(folder, renamed)
+    return renamed
@@ -0,0 +1,337 @@
+"""Word图片提取工具的命令行入口
+
+不导入 tkinter 与 python-docx，各子命令只在执行时才导入所需模块，
+可用于服务器端任务::
+
+    python cli.py extract report.docx -o out/
+    python cli.py extract "reports/*.docx" -o out/
+    python cli.py compress out/001.jpg out/002.png --quality 80
+    python cli.py compress out/*.jpg --target-size 200K
+    python cli.py batch-compress out/ -o out/compressed --format webp
+    python cli.py rename out/ 001.jpg 封面
+    python cli.py rotate out/*.jpg --angle -90
+    python cli.py bulk-rename out/ --template "图片_{n:03d}"
+    python cli.py update-docx report.docx out/ -o report_updated.docx
+"""
+
+import argparse
+import os
+import sys
+
+
+def cmd_extract(args):
+    from picture_tools import (
+        BatchExtractionJob,
+        collect_docx_files,
+        extract_docx_to_folder,
+    )
+
+    dedup = None if args.dedup == "none" else args.dedup
+
+    # 单个文档直接提取到输出目录，文件夹或通配符按批量模式处理
+    if os.path.isfile(args.source):
+        summary = extract_docx_to_folder(
+            args.source, args.output, dedup=dedup, max_workers=args.workers
+        )
+        if summary["error"]:
+            print(f"提取失败: {summary['error']}", file=sys.stderr)
+            return 1
+        print(
+            f"提取 {summary['images']} 张图片到 {summary['output']}"
+            f"（{summary['bytes']} 字节，{summary['seconds']} 秒）"
+        )
+        return 0
+
+    docx_paths = collect_docx_files(args.source)
+    if not docx_paths:
+        print(f"没有找到 .docx 文件: {args.source}", file=sys.stderr)
+        return 1
+
+    job = BatchExtractionJob(
+        docx_paths, args.output, dedup=dedup, max_workers=args.workers
+    )
+    summaries, _, error = job.run()
+    if error is not None:
+        print(f"批量提取失败: {error}", file=sys.stderr)
+        return 1
+
+    failed = [summary for summary in summaries if summary["error"]]
+    for summary in summaries:
+        status = summary["error"] or f"{summary['images']} 张"
+        print(f"{summary['docx']}: {status}")
+    print(
+        f"共 {len(summaries)} 个文档，失败 {len(failed)} 个，"
+        f"报告: {os.path.join(args.output, job.REPORT_NAME)}"
+    )
+    return 1 if failed else 0
+
+
+def parse_size(text):
+    """解析 200K、1.5M、204800 这样的大小，返回字节数"""
+    text = text.strip().upper().removesuffix("B")
+    units = {"K": 1024, "M": 1024 * 1024}
+    multiplier = units.get(text[-1:], 1)
+    if text[-1:] in units:
+        text = text[:-1]
+    try:
+        size = int(float(text) * multiplier)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无效的大小: {text}")
+    if size <= 0:
+        raise argparse.ArgumentTypeError("大小必须为正数")
+    return size
+
+
+def cmd_compress(args):
+    from picture_tools import compress_image_file, compress_image_file_to_target
+
+    exit_code = 0
+    for image_path in args.images:
+        try:
+            if args.target_size is None:
+                print(compress_image_file(image_path, quality=args.quality))
+                continue
+            result = compress_image_file_to_target(
+                image_path, args.target_size, allow_downscale=not args.no_downscale
+            )
+            print(
+                f"{result['path']}: {result['bytes']} 字节，"
+                f"质量 {result['quality'] or '-'}，"
+                f"色度采样 {result['subsampling'] or '-'}，"
+                f"缩放 {result['scale']}，编码 {result['encodes']} 次"
+            )
+            if not result["fits"]:
+                print(f"{image_path}: 无法压缩到目标大小以内", file=sys.stderr)
+                exit_code = 1
+        except Exception as e:
+            print(f"{image_path}: 压缩失败: {e}", file=sys.stderr)
+            exit_code = 1
+    return exit_code
+
+
+def cmd_batch_compress(args):
+    from picture_tools import BatchCompressionJob, collect_image_files
+
+    image_paths = collect_image_files(args.source)
+    if not image_paths:
+        print(f"没有找到图片文件: {args.source}", file=sys.stderr)
+        return 1
+
+    job = BatchCompressionJob(
+        image_paths,
+        args.output,
+        output_format=args.format,
+        quality=args.quality,
+        max_workers=args.workers,
+    )
+    summaries, _, error = job.run()
+    if error is not None:
+        print(f"批量压缩失败: {error}", file=sys.stderr)
+        return 1
+
+    for summary in summaries:
+        if summary["error"]:
+            print(f"{summary['source']}: {summary['error']}", file=sys.stderr)
+    totals = job.totals
+    print(
+        f"共 {totals['images']} 张，写出 {totals['written']} 张，"
+        f"跳过 {totals['skipped']} 张（压缩后不更小），失败 {totals['failed']} 张"
+    )
+    print(
+        f"节省 {totals['saved_bytes'] / (1024 * 1024):.2f} MB，"
+        f"耗时 {totals['seconds']} 秒"
+        f"（{totals['images_per_second']} 张/秒，{totals['mb_per_second']} MB/秒）"
+    )
+    return 1 if totals["failed"] else 0
+
+
+def cmd_rename(args):
+    from picture_tools import rename_image
+
+    try:
+        print(rename_image(args.folder, args.old_name, args.new_name))
+    except Exception as e:
+        print(f"重命名失败: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def cmd_bulk_rename(args):
+    import time
+
+    from bulk_rename import (
+        apply_renames,
+        names_from_csv,
+        names_from_template,
+        recover_renames,
+    )
+    from picture_tools import scan_image_folder
+
+    try:
+        recovered = recover_renames(args.folder)
+        if recovered:
+            print(f"已回滚上次未完成的批量重命名（{recovered} 个文件）")
+        if args.recover:
+            return 0
+
+        # 与图形界面一致，按文件名中的数字排序
+        names = sorted(
+            scan_image_folder(args.folder),
+            key=lambda x: int("".join(filter(str.isdigit, x)) or "0"),
+        )
+        if args.csv:
+            mapping = names_from_csv(args.csv, names)
+        else:
+            mapping = names_from_template(names, args.template, start=args.start)
+
+        start = time.perf_counter()
+        renamed = apply_renames(args.folder, mapping)
+        seconds = time.perf_counter() - start
+    except Exception as e:
+        print(f"批量重命名失败，未做任何修改: {e}", file=sys.stderr)
+        return 1
+
+    if args.verbose:
+        for old_name, new_name in renamed.items():
+            print(f"{old_name} -> {new_name}")
+    print(f"已重命名 {len(renamed)} 个文件，耗时 {seconds:.3f} 秒")
+    return 0
+
+
+def cmd_rotate(args):
+    from jpeg_orientation import rotate_jpeg
+
+    exit_code = 0
+    for image_path in args.images:
+        try:
+            rotate_jpeg(image_path, args.angle, flip_horizontal=args.flip)
+            print(image_path)
+        except Exception as e:
+            print(f"{image_path}: 旋转失败: {e}", file=sys.stderr)
+            exit_code = 1
+    return exit_code
+
+
+def cmd_update_docx(args):
+    from docx_update import update_docx_from_folder
+
+    try:
+        summary = update_docx_from_folder(args.docx, args.folder, args.output)
+    except Exception as e:
+        print(f"更新文档失败: {e}", file=sys.stderr)
+        return 1
+
+    for rel_path, reason in summary["skipped"]:
+        print(f"{rel_path}: 跳过，{reason}", file=sys.stderr)
+    print(
+        f"替换 {summary['replaced']} 张图片，写入 {summary['output']}"
+        f"（{summary['bytes_before'] / (1024 * 1024):.2f} MB -> "
+        f"{summary['bytes_after'] / (1024 * 1024):.2f} MB，"
+        f"{summary['seconds']} 秒）"
+    )
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Word图片提取与重命名工具（命令行）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    extract = subparsers.add_parser("extract", help="从 .docx 中提取图片")
+    extract.add_argument("source", help=".docx 文件、包含 .docx 的文件夹或通配符")
+    extract.add_argument("-o", "--output", required=True, help="输出文件夹")
+    extract.add_argument(
+        "--dedup",
+        choices=["skip", "hardlink", "none"],
+        default="skip",
+        help="重复图片的处理方式（默认 skip）",
+    )
+    extract.add_argument("--workers", type=int, default=None, help="并行数")
+    extract.set_defaults(func=cmd_extract)
+
+    compress = subparsers.add_parser("compress", help="压缩图片")
+    compress.add_argument("images", nargs="+", help="图片文件")
+    compress.add_argument("--quality", type=int, default=85, help="JPEG质量")
+    compress.add_argument(
+        "--target-size",
+        type=parse_size,
+        default=None,
+        help="目标文件大小（如 200K），自动搜索质量",
+    )
+    compress.add_argument(
+        "--no-downscale",
+        action="store_true",
+        help="按目标大小压缩时不缩小图片尺寸",
+    )
+    compress.set_defaults(func=cmd_compress)
+
+    batch_compress = subparsers.add_parser(
+        "batch-compress", help="用多进程批量压缩图片，可转换格式"
+    )
+    batch_compress.add_argument("source", help="图片文件夹或通配符")
+    batch_compress.add_argument("-o", "--output", required=True, help="输出文件夹")
+    batch_compress.add_argument(
+        "--format",
+        choices=["keep", "jpeg", "webp", "png"],
+        default="keep",
+        help="输出格式（默认 keep 保持原格式；jpeg 为渐进式JPEG）",
+    )
+    batch_compress.add_argument("--quality", type=int, default=85, help="有损格式的质量")
+    batch_compress.add_argument("--workers", type=int, default=None, help="进程数")
+    batch_compress.set_defaults(func=cmd_batch_compress)
+
+    rename = subparsers.add_parser("rename", help="重命名图片")
+    rename.add_argument("folder", help="图片文件夹")
+    rename.add_argument("old_name", help="原文件名（含扩展名）")
+    rename.add_argument("new_name", help="新文件名（不含扩展名）")
+    rename.set_defaults(func=cmd_rename)
+
+    bulk_rename = subparsers.add_parser(
+        "bulk-rename", help="按模板或CSV对照表批量重命名（可互换文件名，失败自动回滚）"
+    )
+    bulk_rename.add_argument("folder", help="图片文件夹")
+    source = bulk_rename.add_mutually_exclusive_group(required=True)
+    source.add_argument(
+        "--template", help="新文件名模板，{n} 为序号、{name} 为原文件名，如 图片_{n:03d}"
+    )
+    source.add_argument("--csv", help="两列CSV：原文件名, 新文件名")
+    source.add_argument(
+        "--recover", action="store_true", help="只回滚上次中断的批量重命名"
+    )
+    bulk_rename.add_argument("--start", type=int, default=1, help="模板序号起始值")
+    bulk_rename.add_argument(
+        "-v", "--verbose", action="store_true", help="列出每个文件的新名称"
+    )
+    bulk_rename.set_defaults(func=cmd_bulk_rename)
+
+    rotate = subparsers.add_parser(
+        "rotate", help="无损旋转/翻转JPEG（只改写EXIF方向标记）"
+    )
+    rotate.add_argument("images", nargs="+", help="JPEG文件")
+    rotate.add_argument(
+        "--angle", type=int, default=0, help="逆时针旋转角度，90的整数倍"
+    )
+    rotate.add_argument(
+        "--flip", action="store_true", help="旋转前先水平翻转"
+    )
+    rotate.set_defaults(func=cmd_rotate)
+
+    update_docx = subparsers.add_parser(
+        "update-docx", help="把编辑过的图片写回文档，生成新的 .docx"
+    )
+    update_docx.add_argument("docx", help="原 .docx 文件")
+    update_docx.add_argument("folder", help="从该文档提取图片的文件夹")
+    update_docx.add_argument(
+        "-o", "--output", default=None, help="新文档路径（默认在原文件名后加 _updated）"
+    )
+    update_docx.set_defaults(func=cmd_update_docx)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,365 @@
+"""把编辑过的图片写回 .docx
+
+按提取清单找到每个 word/media 成员对应的图片文件及其最新的编辑结果（裁剪、压缩），
+生成一份新文档：被替换的图片直接写入，其余成员按原样复制压缩后的数据，不解压也
+不重新压缩，整个过程只顺序读写一遍
+"""
+
+import copy
+import os
+import posixpath
+import re
+import struct
+import time
+import zipfile
+import zlib
+
+from image_probe import probe_bytes, probe_file
+from picture_tools import (
+    COPY_CHUNK_SIZE,
+    IMAGE_EXT_MAP,
+    SNIFF_BYTES,
+    load_manifest,
+    manifest_matches,
+    temp_path_for,
+)
+
+# Word 能显示的图片格式及其内容类型
+CONTENT_TYPES = {
+    "png": "image/png",
+    "jpeg": "image/jpeg",
+    "gif": "image/gif",
+    "bmp": "image/bmp",
+    "tiff": "image/tiff",
+}
+# 编辑结果在文件名后加的后缀：裁剪为 _cropped、_cropped_2，压缩为 _compressed，可叠加
+EDIT_SUFFIX = re.compile(r"(?:_cropped(?:_\d+)?)?(?:_compressed)?$")
+# 批量压缩的默认输出子文件夹，其中的同名图片也视为编辑结果
+COMPRESSED_FOLDER = "compressed"
+# 宽高比变化超过该比例时，按新图片调整文档中的显示高度
+ASPECT_TOLERANCE = 0.01
+
+CONTENT_TYPES_NAME = "[Content_Types].xml"
+RELATIONSHIP_PATTERN = re.compile(rb"<Relationship\b[^>]*>")
+DRAWING_PATTERN = re.compile(rb"<w:drawing>.*?</w:drawing>", re.S)
+EXTENT_PATTERN = re.compile(rb'(<(?:wp:extent|a:ext) cx=")(\d+)(" cy=")(\d+)(")')
+
+
+def updated_docx_path_for(docx_path):
+    """更新后文档的默认保存路径：在原文件名后加 _updated"""
+    base_name, ext = os.path.splitext(docx_path)
+    return f"{base_name}_updated{ext}"
+
+
+def _file_crc(path):
+    crc = 0
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def _edited_versions(image_folder):
+    """按原文件名（不含扩展名和编辑后缀）分组列出图片文件夹中的文件"""
+    versions = {}
+    folders = [image_folder, os.path.join(image_folder, COMPRESSED_FOLDER)]
+    for folder in folders:
+        try:
+            entries = list(os.scandir(folder))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.name.startswith(".") or not entry.is_file():
+                continue
+            stem = EDIT_SUFFIX.sub("", os.path.splitext(entry.name)[0])
+            versions.setdefault(stem, []).append(entry.path)
+    return versions
+
+
+def find_replacements(docx_path, image_folder):
+    """根据提取清单找出需要写回文档的图片，返回 {zip成员路径: 图片文件路径}
+
+    每张图片取其文件本身与编辑结果中最后修改的一个；文件本身未被修改过时不替换。
+    去重时只记入清单的图片与首次出现的图片使用同一个结果
+    """
+    manifest = load_manifest(image_folder)
+    if manifest is None:
+        raise ValueError("图片文件夹中没有提取清单，无法对应到文档中的图片")
+    if not manifest_matches(manifest, docx_path):
+        raise ValueError(f"图片文件夹是从 {manifest['source']} 提取的")
+
+    versions = _edited_versions(image_folder)
+    entries = manifest["entries"]
+    replacements = {}
+    for rel_path, entry in entries.items():
+        output = entry.get("output")
+        candidates = versions.get(os.path.splitext(output or "")[0])
+        if not output or not candidates:
+            continue
+        newest = max(candidates, key=os.path.getmtime)
+        if (
+            newest == os.path.join(image_folder, output)
+            and os.path.getsize(newest) == entry.get("size")
+            and _file_crc(newest) == entry.get("crc")
+        ):
+            continue  # 提取后没有修改过
+        replacements[rel_path] = newest
+
+    for rel_path, entry in entries.items():
+        primary = entry.get("duplicate_of")
+        if not entry.get("output") and primary in replacements:
+            replacements[rel_path] = replacements[primary]
+    return replacements
+
+
+def _display_size(info):
+    """按EXIF方向换算后的显示尺寸，未知时返回 None"""
+    if info is None or not info.width or not info.height:
+        return None
+    if info.orientation in (5, 6, 7, 8):
+        return info.height, info.width
+    return info.width, info.height
+
+
+def _rels_part(rels_name):
+    """.rels 文件所描述的部件所在的目录，如 word/_rels/document.xml.rels -> word"""
+    return posixpath.dirname(posixpath.dirname(rels_name))
+
+
+def _source_part(rels_name):
+    """.rels 文件所描述的部件，如 word/_rels/document.xml.rels -> word/document.xml"""
+    part_name = posixpath.basename(rels_name)[: -len(".rels")]
+    return posixpath.join(_rels_part(rels_name), part_name)
+
+
+def _attribute(element, name):
+    match = re.search(rb"\b" + name + rb'="([^"]*)"', element)
+    return match.group(1).decode("utf-8") if match else None
+
+
+def _update_relationships(rels_name, data, renamed, resized):
+    """改写指向已改名图片的关系，返回 (新内容或 None, {关系ID: 需调整尺寸的图片})"""
+    part_dir = _rels_part(rels_name)
+    resized_ids = {}
+
+    def replace(match):
+        element = match.group(0)
+        target = _attribute(element, b"Target")
+        if not target or _attribute(element, b"TargetMode") == "External":
+            return element
+        if target.startswith("/"):
+            member = target.lstrip("/")
+        else:
+            member = posixpath.normpath(posixpath.join(part_dir, target))
+        if member in resized:
+            resized_ids[_attribute(element, b"Id")] = member
+        if member not in renamed:
+            return element
+        new_target = renamed[member]
+        if target.startswith("/"):
+            new_target = "/" + new_target
+        else:
+            new_target = posixpath.relpath(new_target, part_dir or ".")
+        return element.replace(
+            f'Target="{target}"'.encode("utf-8"),
+            f'Target="{new_target}"'.encode("utf-8"),
+        )
+
+    new_data = RELATIONSHIP_PATTERN.sub(replace, data)
+    return (new_data if new_data != data else None), resized_ids
+
+
+def _update_content_types(data, renamed, formats):
+    """为改名后的图片补充扩展名对应的内容类型，并更新单独声明的部件"""
+    for old_name, new_name in renamed.items():
+        content_type = CONTENT_TYPES[formats[old_name]]
+        old_part = f'PartName="/{old_name}"'.encode("utf-8")
+        if old_part in data:
+            data = re.sub(
+                rb"<Override\b[^>]*" + re.escape(old_part) + rb"[^>]*>",
+                f'<Override PartName="/{new_name}" ContentType="{content_type}"/>'
+                .encode("utf-8"),
+                data,
+            )
+        ext = posixpath.splitext(new_name)[1][1:]
+        if not re.search(rb'Extension="' + re.escape(ext.encode()) + rb'"', data, re.I):
+            default = f'<Default Extension="{ext}" ContentType="{content_type}"/>'
+            data = data.replace(b"</Types>", default.encode("utf-8") + b"</Types>")
+    return data
+
+
+def _update_extents(data, resized_ids, aspects):
+    """图片宽高比改变时保持文档中的显示宽度不变，按新宽高比调整高度"""
+
+    def replace_drawing(match):
+        drawing = match.group(0)
+        embed = re.search(rb'r:embed="([^"]+)"', drawing)
+        member = resized_ids.get(embed.group(1).decode("utf-8")) if embed else None
+        if member is None:
+            return drawing
+        aspect = aspects[member]
+        return EXTENT_PATTERN.sub(
+            lambda m: m.group(1)
+            + m.group(2)
+            + m.group(3)
+            + str(round(int(m.group(2)) * aspect)).encode("ascii")
+            + m.group(5),
+            drawing,
+        )
+
+    return DRAWING_PATTERN.sub(replace_drawing, data)
+
+
+def _copy_member_raw(source, target, info):
+    """把zip成员的压缩数据原样复制到另一个zip，不解压也不重新压缩
+
+    zipfile 没有公开的原样复制接口，这里直接写本地文件头和数据，
+    再登记到 target 的目录中，关闭时由 zipfile 写出中央目录
+    """
+    source.fp.seek(info.header_offset)
+    header = source.fp.read(zipfile.sizeFileHeader)
+    if header[:4] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile(f"文件头已损坏: {info.filename}")
+    name_length, extra_length = struct.unpack("<HH", header[26:30])
+    source.fp.seek(info.header_offset + len(header) + name_length + extra_length)
+
+    copied = copy.copy(info)
+    copied.flag_bits &= ~0x08  # CRC和大小已知，直接写在本地文件头中
+    copied.header_offset = target.fp.tell()
+    target.fp.write(copied.FileHeader())
+    remaining = info.compress_size
+    while remaining:
+        chunk = source.fp.read(min(COPY_CHUNK_SIZE, remaining))
+        if not chunk:
+            raise zipfile.BadZipFile(f"数据不完整: {info.filename}")
+        target.fp.write(chunk)
+        remaining -= len(chunk)
+
+    target.filelist.append(copied)
+    target.NameToInfo[copied.filename] = copied
+    target.start_dir = target.fp.tell()
+
+
+def _plan_replacements(source, replacements, skipped):
+    """检查替换图片，返回 (原成员 -> 新成员名, 原成员 -> 格式, 原成员 -> 新宽高比)"""
+    names = set(source.namelist())
+    members = {}
+    formats = {}
+    aspects = {}
+    for rel_path, path in replacements.items():
+        if rel_path not in names:
+            skipped.append((rel_path, "文档中没有该图片"))
+            continue
+        info = probe_file(path)
+        if info is None or info.format not in CONTENT_TYPES:
+            skipped.append((rel_path, f"Word 不支持的格式: {os.path.basename(path)}"))
+            continue
+
+        with source.open(rel_path) as f:
+            original = probe_bytes(f.read(SNIFF_BYTES))
+        member = rel_path
+        if original is None or original.format != info.format:
+            # 格式变化时扩展名随之改变，避免与内容类型不符
+            base_name = posixpath.splitext(rel_path)[0]
+            ext = IMAGE_EXT_MAP[info.format]
+            member = f"{base_name}{ext}"
+            counter = 1
+            while member in names:
+                member = f"{base_name}_{counter}{ext}"
+                counter += 1
+            names.add(member)
+        members[rel_path] = member
+        formats[rel_path] = info.format
+
+        old_size, new_size = _display_size(original), _display_size(info)
+        if old_size and new_size:
+            old_aspect = old_size[1] / old_size[0]
+            new_aspect = new_size[1] / new_size[0]
+            if abs(new_aspect / old_aspect - 1) > ASPECT_TOLERANCE:
+                aspects[rel_path] = new_aspect
+    return members, formats, aspects
+
+
+def update_docx(docx_path, replacements, output_path=None):
+    """生成替换了图片的新文档，返回汇总信息
+
+    replacements 为 {zip成员路径: 图片文件路径}；未被替换的成员原样复制压缩数据，
+    图片格式改变时同步修改成员扩展名、关系和内容类型，宽高比改变时调整显示高度
+    """
+    start = time.perf_counter()
+    output_path = output_path or updated_docx_path_for(docx_path)
+    skipped = []
+    temp_path = temp_path_for(output_path)
+    try:
+        with zipfile.ZipFile(docx_path, "r") as source:
+            members, formats, aspects = _plan_replacements(
+                source, replacements, skipped
+            )
+            renamed = {old: new for old, new in members.items() if old != new}
+
+            # 只有引用了改名或改变宽高比的图片的部件需要改写，其余都原样复制
+            rewritten = {}
+            resized_parts = {}
+            if renamed or aspects:
+                for name in source.namelist():
+                    if not name.endswith(".rels"):
+                        continue
+                    data, resized_ids = _update_relationships(
+                        name, source.read(name), renamed, aspects
+                    )
+                    if data is not None:
+                        rewritten[name] = data
+                    if resized_ids:
+                        resized_parts[_source_part(name)] = resized_ids
+            if renamed and CONTENT_TYPES_NAME in source.NameToInfo:
+                rewritten[CONTENT_TYPES_NAME] = _update_content_types(
+                    source.read(CONTENT_TYPES_NAME), renamed, formats
+                )
+            for part, resized_ids in resized_parts.items():
+                if part in source.NameToInfo:
+                    rewritten[part] = _update_extents(
+                        source.read(part), resized_ids, aspects
+                    )
+
+            with zipfile.ZipFile(temp_path, "w", zipfile.ZIP_DEFLATED) as target:
+                for info in source.infolist():
+                    name = info.filename
+                    if name in members:
+                        # 图片本身已是压缩格式，不再压缩
+                        target.write(
+                            replacements[name],
+                            members[name],
+                            compress_type=zipfile.ZIP_STORED,
+                        )
+                    elif name in rewritten:
+                        part = zipfile.ZipInfo(name, info.date_time)
+                        part.compress_type = zipfile.ZIP_DEFLATED
+                        part.external_attr = info.external_attr
+                        target.writestr(part, rewritten[name])
+                    else:
+                        _copy_member_raw(source, target, info)
+        os.replace(temp_path, output_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    return {
+        "output": output_path,
+        "replaced": len(members),
+        "renamed": len(renamed),
+        "resized": len(aspects),
+        "skipped": skipped,
+        "bytes_before": os.path.getsize(docx_path),
+        "bytes_after": os.path.getsize(output_path),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def update_docx_from_folder(docx_path, image_folder, output_path=None):
+    """把图片文件夹中编辑过的图片写回文档，生成新文档并返回汇总信息"""
+    replacements = find_replacements(docx_path, image_folder)
+    return update_docx(docx_path, replacements, output_path)
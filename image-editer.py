@@ -1,20 +1,242 @@
+import io
 import os
-import zipfile
+import math
+import queue
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
-from PIL import Image, ImageTk
-import imghdr
-from docx import Document
-import re
-import xml.etree.ElementTree as ET
+from tkinter import ttk, filedialog, messagebox, simpledialog
+from PIL import Image, ImageOps, ImageTk
+
+from picture_tools import (
+    BatchCompressionJob,
+    BatchExtractionJob,
+    DocxImageSource,
+    ImageExtractionJob,
+    ImageWriter,
+    collect_docx_files,
+    compressed_path_for,
+    rename_image,
+    save_compressed,
+    save_to_target,
+    scan_image_folder,
+)
+from bulk_rename import (
+    apply_renames,
+    names_from_csv,
+    names_from_template,
+    recover_renames,
+)
+from docx_update import update_docx_from_folder, updated_docx_path_for
+from image_edits import EditHistory
+from image_probe import EXIF_ORIENTATION_TAG, probe_file
+from jpeg_orientation import transform_jpeg
+from large_image import (
+    DEFAULT_MEMORY_BUDGET,
+    LARGE_IMAGE_PIXELS,
+    LargeImage,
+    bitmap_nbytes,
+    is_large_image,
+    shrink,
+)
+from memory_budget import EVICTABLE, NEARBY, PINNED, MemoryBudget, photo_nbytes
+from thumbnails import ThumbnailCache
+
+
+def load_image(path):
+    """解码图片并按EXIF方向标记转正"""
+    image = Image.open(path)
+    image.load()
+    if image.getexif().get(EXIF_ORIENTATION_TAG, 1) != 1:
+        image = ImageOps.exif_transpose(image)
+    return image
+
+
+class DecodedImageCache:
+    """已解码图片的LRU缓存，键为 (路径, 修改时间)，按占用字节数而非数量限制"""
+
+    def __init__(self, max_bytes=512 * 1024 * 1024, budget=None):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # 全局内存预算：当前图片由查看器计入，前后相邻的图片较晚淘汰
+        self.budget = budget
+        self.current_path = None
+        self.nearby_paths = set()
+
+    @staticmethod
+    def make_key(path):
+        return (os.path.abspath(path), os.stat(path).st_mtime_ns)
+
+    def get(self, path):
+        """命中时返回缓存的图片，文件已被修改或不存在时返回 None"""
+        try:
+            key = self.make_key(path)
+        except OSError:
+            return None
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            if self.budget is not None:
+                self.budget.touch(self, key)
+            return entry[0]
+
+    def contains(self, path):
+        try:
+            key = self.make_key(path)
+        except OSError:
+            return False
+        with self.lock:
+            return key in self.entries
+
+    def put(self, path, image):
+        try:
+            key = self.make_key(path)
+        except OSError:
+            return
+        size = bitmap_nbytes(image.mode, image.size)
+        if size > self.max_bytes:
+            return  # 单张超过上限的图片不缓存
+
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self.entries[key] = (image, size)
+            self.current_bytes += size
+            self._charge(key, size)
+
+            # 淘汰最久未使用的图片直到满足字节上限
+            while self.current_bytes > self.max_bytes and len(self.entries) > 1:
+                evicted_key, (_, evicted_size) = self.entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                if self.budget is not None:
+                    self.budget.discharge(self, evicted_key)
+
+    def reserve(self, path, nbytes):
+        """解码前在内存预算中为图片预留空间，返回缓存键；预算不足时返回 None"""
+        key = self.make_key(path)
+        if self.budget is not None and not self.budget.reserve(self, key, nbytes):
+            return None
+        return key
+
+    def release_reservation(self, key):
+        """取消未被 put 登记为实际占用的预留（解码失败或图片未被缓存）"""
+        if self.budget is None:
+            return
+        with self.lock:
+            if key not in self.entries:
+                self.budget.discharge(self, key)
+
+    def set_focus(self, current_path, nearby_paths=()):
+        """设置当前图片和前后相邻的图片，按此调整各条目在内存预算中的优先级"""
+        with self.lock:
+            self.current_path = current_path and os.path.abspath(current_path)
+            self.nearby_paths = {os.path.abspath(path) for path in nearby_paths}
+            for key, (_, size) in self.entries.items():
+                self._charge(key, size)
+
+    def _charge(self, key, size):
+        # 调用方持有 self.lock
+        if self.budget is None:
+            return
+        if key[0] == self.current_path:
+            # 与查看器持有的是同一份位图，由查看器计入，避免重复统计
+            self.budget.charge(self, key, 0, PINNED)
+            return
+        priority = NEARBY if key[0] in self.nearby_paths else EVICTABLE
+        self.budget.charge(self, key, size, priority, lambda: self._drop(key))
+
+    def _drop(self, key):
+        """内存预算淘汰的回调"""
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.current_bytes -= entry[1]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.current_bytes = 0
+            if self.budget is not None:
+                self.budget.discharge_owner(self)
+
+
+class ImagePrefetcher:
+    """在后台线程中预先解码前后若干张图片并放入缓存"""
+
+    def __init__(self, cache, ahead=3, behind=1, max_pixels=LARGE_IMAGE_PIXELS):
+        self.cache = cache
+        self.ahead = ahead  # 预读后面几张
+        self.behind = behind  # 预读前面几张
+        self.max_pixels = max_pixels  # 超过该像素数的大图按需解码，不预读
+        self.pending = []
+        self.condition = threading.Condition()
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def prefetch_around(self, paths, index):
+        """以当前位置为中心，按距离由近到远安排预读，覆盖之前未完成的请求"""
+        order = []
+        for distance in range(1, max(self.ahead, self.behind) + 1):
+            if distance <= self.ahead and index + distance < len(paths):
+                order.append(paths[index + distance])
+            if distance <= self.behind and index - distance >= 0:
+                order.append(paths[index - distance])
+
+        with self.condition:
+            self.pending = order
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                path = self.pending.pop(0)
+
+            if self.cache.contains(path):
+                continue
+            key = None
+            try:
+                info = probe_file(path)
+                if info is not None and info.width and info.height:
+                    pixels = info.width * info.height
+                    if pixels > self.max_pixels:
+                        continue  # 大图按需解码，不预读
+                    # 先预留再解码，与其它后台线程一起不超过内存预算
+                    key = self.cache.reserve(path, pixels * 4)
+                    if key is None:
+                        continue  # 内存预算不足时不预读
+                # 在后台线程中完成解码
+                self.cache.put(path, load_image(path))
+            except Exception as e:
+                print(f"预读图片失败 {path}: {e}")
+            finally:
+                if key is not None:
+                    self.cache.release_reservation(key)
 
 
 class ZoomableImage(ttk.Frame):
     def __init__(self, master, **kwargs):
         super().__init__(master, **kwargs)
-        self.image = None
-        self.original_image = None  # 保存原始图像
+        self.image = None  # 当前显示的图像（预览图应用编辑后的结果）
+        self.original_image = None  # 全分辨率原图，编辑过程中不会被修改
+        self.large_source = None  # 大图模式下按需解码的原图，此时没有 original_image
+        self.preview_base = None  # 编辑所用的预览图，大图为原图缩小后的版本
+        self.preview_ratio = 1.0  # 预览图相对原图的比例
+        self.edits = None  # 非破坏性编辑记录，保存时才应用到全分辨率原图
+        self.history = None  # 当前图片的编辑操作日志，用于撤销/重做
+        # (路径, 修改时间) -> EditHistory，本次会话内切换图片后再回来仍可撤销
+        self.histories = {}
         self.photo_image = None
+        self.pyramid = []  # 多分辨率金字塔，第k层为原图的 1/2^k，按需生成
         self.canvas = tk.Canvas(self, bg="white", highlightthickness=0)
         self.canvas.pack(fill=tk.BOTH, expand=True)
 
@@ -23,15 +245,52 @@ class ZoomableImage(ttk.Frame):
         self.max_scale = 4.0
         self.min_scale = 0.1
 
+        # 视口渲染时在画布可见区域外额外渲染的边距（像素）
+        self.viewport_margin = 32
+
+        # 金字塔最小层尺寸，短边小于该值时不再继续缩小
+        self.pyramid_min_size = 64
+
+        # 预览图最大像素数，超过时编辑和显示都基于缩小后的预览图
+        self.preview_max_pixels = 16_000_000
+        # 超过该像素数的图片使用大图模式：只解码预览图，放大查看时解码可见区域，
+        # 保存时才解码全分辨率原图；放大查看保留的数据不超过 large_image_budget 字节
+        self.large_image_pixels = LARGE_IMAGE_PIXELS
+        self.large_image_budget = DEFAULT_MEMORY_BUDGET
+
+        # 保存旋转/翻转时，JPEG只改写EXIF方向标记而不重新编码
+        self.lossless_jpeg_rotation = True
+
+        # 保存、裁剪和压缩的结果交给后台写盘队列，界面直接显示内存中的结果
+        self.writer = ImageWriter()
+        self.pending_paths = set()  # 已提交但尚未写完的目标路径
+        # 裁剪结果路径 -> (原图的操作日志, 裁剪操作)，写完后从原图的日志中去掉该裁剪
+        self.pending_crops = {}
+        self.on_path_changed = None  # 裁剪后当前图片切换为新文件时的回调
+        # 写盘前当前图片还不在磁盘上时（浏览文档模式）调用，返回写出的文件路径
+        self.materialize = None
+        # 全局内存预算：登记持有的原图、预览图、金字塔和Tk图片
+        self.budget = None
+
+        # 渐进式渲染：拖动/缩放过程中用快速插值，停止操作后再用高质量插值重绘
+        self.interactive_resample = Image.Resampling.BILINEAR
+        self.final_resample = Image.Resampling.LANCZOS
+        self.refine_delay = 100  # 停止操作多少毫秒后进行高质量重绘
+        self.frame_budget = 0.016  # 交互渲染单帧耗时上限（秒），超出后降级为最近邻
+        self.current_interactive_resample = self.interactive_resample
+        self.render_job = None
+        self.refine_job = None
+
+        # 当前画布上的图片项及其所占的画布矩形
+        self.image_item = None
+        self.rendered_rect = None
+
         # 初始化拖动参数
         self.x = 0
         self.y = 0
         self.last_x = 0
         self.last_y = 0
 
-        # 初始化旋转角度
-        self.rotation_angle = 0
-
         # 裁剪相关参数
         self.crop_rect = None
         self.crop_start_x = None
@@ -47,26 +306,100 @@ class ZoomableImage(ttk.Frame):
         self.canvas.bind("<B1-Motion>", self.on_move_press)
         self.canvas.bind("<Configure>", self.on_canvas_resize)
 
-    def set_image(self, image_path):
+    def set_image(self, image_path, image=None):
+        """显示图片；image 为预先解码好的位图（如来自缓存）时不再读取磁盘"""
         try:
-            if image_path and os.path.exists(image_path):
-                self.image = Image.open(image_path)
-                self.original_image = self.image.copy()  # 保存原始图像
+            if image is None and image_path and os.path.exists(image_path):
+                if is_large_image(image_path, self.large_image_pixels):
+                    source = LargeImage(image_path, self.large_image_budget)
+                    self._load_large(source, image_path)
+                    self.reset_view()
+                    self.update_image()
+                    return True
+                image = load_image(image_path)
+            if image is not None:
+                # 原图不会被原地修改，缓存中的位图也无需再复制一份
+                self._load_source(image, image_path)
                 self.reset_view()
                 self.update_image()
                 return True
             else:
                 self.show_message("无图片可显示")
                 return False
+        except MemoryError as e:
+            self.show_message(str(e) or "图片过大，内存不足")
+            print(f"图片加载错误: {e}")
+            return False
         except Exception as e:
             self.show_message("图片加载失败")
             print(f"图片加载错误: {e}")  # 在控制台记录错误，但不弹出对话框
             return False
 
+    def _load_source(self, image, image_path=None):
+        """设置全分辨率原图，生成预览图并恢复该图片在本次会话中的编辑记录"""
+        self.original_image = image
+        self.large_source = None
+        width, height = image.size
+        factor = 1
+        if width * height > self.preview_max_pixels:
+            factor = math.ceil(math.sqrt(width * height / self.preview_max_pixels))
+        self._set_preview(shrink(image, factor), image.size, image_path)
+
+    def _load_large(self, source, image_path):
+        """大图模式：只保留按需解码的原图和预览图，不持有全分辨率位图"""
+        preview_base = source.preview(self.preview_max_pixels)
+        self.original_image = None
+        self.large_source = source
+        self._set_preview(preview_base, source.size, image_path)
+
+    def _set_preview(self, preview_base, size, image_path):
+        self.preview_base = preview_base
+        self.preview_ratio = preview_base.width / size[0]
+        self.history = self._history_for(image_path, size)
+        self.edits = self.history.pipeline()
+        self._refresh_edits()
+
+    def _history_for(self, image_path, size):
+        """取出图片的编辑操作日志；文件在磁盘上被修改过时重新开始"""
+        try:
+            stat = os.stat(image_path)
+            key = (os.path.abspath(image_path), stat.st_mtime_ns)
+        except OSError:
+            # 浏览文档模式或后台写盘完成前图片还不在磁盘上，按路径记住
+            key = (os.path.abspath(image_path), None)
+        except TypeError:
+            return EditHistory(size)
+        history = self.histories.get(key)
+        if history is None and key[1] is not None:
+            # 文件写出之前记住的日志在写出后继续使用
+            history = self.histories.pop((key[0], None), None)
+            if history is not None:
+                self.histories[key] = history
+        if history is None or history.source_size != size:
+            history = self.histories[key] = EditHistory(size)
+        return history
+
+    def _record_edit(self, name, *args):
+        """对编辑记录执行一个操作并写入操作日志"""
+        getattr(self.edits, name)(*args)
+        self.history.record(name, *args)
+
+    def _refresh_edits(self):
+        """把编辑记录应用到预览图上用于显示"""
+        self.image = self.edits.apply(self.preview_base, self.preview_ratio)
+        self.invalidate_pyramid()
+
+    def render_full(self):
+        """把编辑记录一次性应用到全分辨率原图，用于保存"""
+        if self.large_source is not None:
+            return self.large_source.render(self.edits)
+        return self.edits.apply(self.original_image)
+
     def show_message(self, message):
         """在画布上显示消息"""
         self.image = None
         self.photo_image = None
+        self.invalidate_pyramid()
         self.canvas.delete("all")
 
         canvas_width = self.canvas.winfo_width()
@@ -81,6 +414,7 @@ class ZoomableImage(ttk.Frame):
                 fill="gray",
                 width=canvas_width - 40,
             )
+        self._account_memory()
 
     def reset_view(self):
         self.scale = 1.0
@@ -94,55 +428,259 @@ class ZoomableImage(ttk.Frame):
 
         self._apply_transform()
 
-    def _apply_transform(self):
-        if not self.image:
-            return
-
-        self.canvas.delete("all")
+    def invalidate_pyramid(self):
+        """图像内容变化（加载、旋转、翻转、裁剪）后清空金字塔"""
+        self.pyramid = [self.image] if self.image else []
+
+    def _pyramid_level(self, scale):
+        """返回分辨率不低于目标缩放比例的最小金字塔层及其缩小倍数
+
+        各层通过 Image.reduce 逐级减半，只在第一次用到时生成
+        """
+        if not self.pyramid:
+            self.invalidate_pyramid()
+        level_image = self.pyramid[0]
+        # 调色板、二值等模式不支持 reduce，且缩放时本就使用最近邻，直接用原图
+        if level_image.mode in ("1", "P", "PA") or level_image.mode.startswith("I;"):
+            return level_image, 1
+
+        level = 0
+        while scale * 2 ** (level + 1) <= 1:
+            if level + 1 >= len(self.pyramid):
+                previous = self.pyramid[level]
+                if min(previous.size) // 2 < self.pyramid_min_size:
+                    break
+                self.pyramid.append(previous.reduce(2))
+            level += 1
+        return self.pyramid[level], 2**level
+
+    def _visible_region(self, canvas_width, canvas_height):
+        """计算画布可见区域（含边距）对应的源图矩形
+
+        返回 (源图box, 画布矩形)，源图box为浮点坐标，画布矩形为整数像素；
+        图片与可见区域不相交时返回 None
+        """
+        img_width, img_height = self.image.size
+        scaled_width = img_width * self.scale
+        scaled_height = img_height * self.scale
+
+        # 图片左上角在画布上的位置
+        img_left = canvas_width / 2 + self.x - scaled_width / 2
+        img_top = canvas_height / 2 + self.y - scaled_height / 2
+
+        # 可见区域与图片区域求交
+        margin = self.viewport_margin
+        left = max(math.floor(img_left), -margin)
+        top = max(math.floor(img_top), -margin)
+        right = min(math.ceil(img_left + scaled_width), canvas_width + margin)
+        bottom = min(math.ceil(img_top + scaled_height), canvas_height + margin)
+        if right <= left or bottom <= top:
+            return None
+
+        box = (
+            max(0.0, (left - img_left) / self.scale),
+            max(0.0, (top - img_top) / self.scale),
+            min(float(img_width), (right - img_left) / self.scale),
+            min(float(img_height), (bottom - img_top) / self.scale),
+        )
+        return box, (left, top, right, bottom)
 
-        # 计算缩放后的尺寸
+    def _clamp_offset(self, canvas_width, canvas_height):
+        """限制拖动范围，避免图片被拖出画布"""
         img_width, img_height = self.image.size
         scaled_width = int(img_width * self.scale)
         scaled_height = int(img_height * self.scale)
 
-        # 调整图片位置（居中或根据拖动位置）
-        canvas_width = self.canvas.winfo_width()
-        canvas_height = self.canvas.winfo_height()
-
-        # 限制拖动范围
         max_x = max(0, (scaled_width - canvas_width) // 2)
         max_y = max(0, (scaled_height - canvas_height) // 2)
         self.x = max(-max_x, min(max_x, self.x))
         self.y = max(-max_y, min(max_y, self.y))
 
-        # 创建缩放后的图片
-        resized_image = self.image.resize(
-            (scaled_width, scaled_height), Image.Resampling.LANCZOS
-        )
-        self.photo_image = ImageTk.PhotoImage(resized_image)
+    def _apply_transform(self, resample=None):
+        if not self.image:
+            return
 
-        # 在画布上显示图片
-        x_pos = canvas_width // 2 + self.x
-        y_pos = canvas_height // 2 + self.y
-        self.canvas.create_image(x_pos, y_pos, image=self.photo_image, anchor=tk.CENTER)
+        detail = resample is None  # 高质量重绘时大图可显示全分辨率细节
+        if resample is None:
+            resample = self.final_resample
+
+        self.canvas.delete("all")
+        self.image_item = None
+        self.rendered_rect = None
+
+        # 调整图片位置（居中或根据拖动位置）
+        canvas_width = self.canvas.winfo_width()
+        canvas_height = self.canvas.winfo_height()
+        self._clamp_offset(canvas_width, canvas_height)
+
+        # 只对画布可见区域重采样，渲染开销与缩放倍数无关
+        region = self._visible_region(canvas_width, canvas_height)
+        if region:
+            box, (left, top, right, bottom) = region
+            size = (right - left, bottom - top)
+
+            resized_image = None
+            if (
+                detail
+                and self.large_source is not None
+                and self.scale > 1
+                and self.preview_ratio < 1
+            ):
+                resized_image = self._render_detail(box, size, resample)
+            if resized_image is None:
+                # 缩小显示时从金字塔中最接近的上一层重采样，而不是每次都用原图
+                level_image, factor = self._pyramid_level(self.scale)
+                if factor > 1:
+                    level_width, level_height = level_image.size
+                    box = (
+                        box[0] / factor,
+                        box[1] / factor,
+                        min(float(level_width), box[2] / factor),
+                        min(float(level_height), box[3] / factor),
+                    )
+                resized_image = level_image.resize(size, resample, box=box)
+            self.photo_image = ImageTk.PhotoImage(resized_image)
+
+            # 在画布上显示图片
+            self.image_item = self.canvas.create_image(
+                left, top, image=self.photo_image, anchor=tk.NW
+            )
+            self.rendered_rect = (left, top, right, bottom)
+        else:
+            self.photo_image = None
 
         # 显示缩放比例
         self.canvas.create_text(
             10,
             10,
-            text=f"缩放: {self.scale * 100:.0f}%",
+            text=f"缩放: {self.scale * self.preview_ratio * 100:.0f}%",
             anchor=tk.NW,
             fill="black",
             font=("Arial", 10, "bold"),
         )
+        self._account_memory()
 
-    def zoom(self, factor, x=None, y=None):
+    def _account_memory(self):
+        """把当前持有的位图登记到全局内存预算，超出上限时淘汰其它缓存"""
+        budget = self.budget
+        if budget is None:
+            return
+
+        # 原图、预览图和显示图可能是同一个对象，只统计一次
+        counted = set()
+        for name in ("original_image", "preview_base", "image"):
+            image = getattr(self, name)
+            if image is None or id(image) in counted:
+                budget.discharge(self, name)
+                continue
+            counted.add(id(image))
+            budget.charge(self, name, bitmap_nbytes(image.mode, image.size), PINNED)
+
+        photo = self.photo_image
+        if photo is not None:
+            photo_bytes = photo_nbytes(photo.width(), photo.height())
+            budget.charge(self, "photo_image", photo_bytes, PINNED)
+        else:
+            budget.discharge(self, "photo_image")
+
+        # 金字塔和大图放大区域可以重新生成，内存不足时先于相邻图片释放
+        pyramid_bytes = sum(
+            bitmap_nbytes(level.mode, level.size) for level in self.pyramid[1:]
+        )
+        budget.charge(self, "pyramid", pyramid_bytes, NEARBY, self.invalidate_pyramid)
+        source = self.large_source
+        if source is not None:
+            budget.charge(
+                self, "large_source", source.memory_usage(), NEARBY, source.release
+            )
+        else:
+            budget.discharge(self, "large_source")
+        budget.enforce()
+
+    def _render_detail(self, box, size, resample):
+        """放大查看大图时只解码可见区域的全分辨率数据，超出内存预算时返回 None"""
+        ratio = self.preview_ratio
+        full_box = tuple(value / ratio for value in box)
+        source = self.large_source
+        try:
+            located = source.region(source.orientation.then(self.edits), full_box, size)
+        except (OSError, MemoryError) as e:
+            print(f"解码图片区域失败: {e}")
+            return None
+        if located is None:
+            return None
+        piece, sub_box = located
+        return piece.resize(size, resample, box=sub_box)
+
+    def render_progressive(self):
+        """交互过程中的渲染请求：合并连续事件并快速渲染，空闲后再高质量重绘"""
+        if self.render_job is None:
+            self.render_job = self.after_idle(self._render_interactive)
+        self._schedule_refine()
+
+    def _render_interactive(self):
+        """用快速插值渲染一帧，超出帧预算时后续帧降级为最近邻插值"""
+        self.render_job = None
+        start = time.perf_counter()
+        self._apply_transform(self.current_interactive_resample)
+        if time.perf_counter() - start > self.frame_budget:
+            self.current_interactive_resample = Image.Resampling.NEAREST
+
+    def _schedule_refine(self):
+        if self.refine_job is not None:
+            self.after_cancel(self.refine_job)
+        self.refine_job = self.after(self.refine_delay, self._refine)
+
+    def _refine(self):
+        """输入停止后用高质量插值重绘"""
+        self.refine_job = None
+        if self.render_job is not None:
+            self.after_cancel(self.render_job)
+            self.render_job = None
+        self.current_interactive_resample = self.interactive_resample
+        self._apply_transform()
+
+    def _shift_rendered_image(self, dx, dy):
+        """纯平移时直接移动已渲染的图片项，渲染区域仍覆盖画布时返回 True"""
+        if self.image_item is None or self.rendered_rect is None:
+            return False
+
+        canvas_width = self.canvas.winfo_width()
+        canvas_height = self.canvas.winfo_height()
+        left, top, right, bottom = self.rendered_rect
+        left, top, right, bottom = left + dx, top + dy, right + dx, bottom + dy
+
+        # 平移后渲染区域必须覆盖图片在画布中的全部可见部分
+        region = self._visible_region(canvas_width, canvas_height)
+        if not region:
+            return False
+        _, (need_left, need_top, need_right, need_bottom) = region
+        need_left = max(need_left, 0)
+        need_top = max(need_top, 0)
+        need_right = min(need_right, canvas_width)
+        need_bottom = min(need_bottom, canvas_height)
+        if (
+            left > need_left
+            or top > need_top
+            or right < need_right
+            or bottom < need_bottom
+        ):
+            return False
+
+        self.canvas.move(self.image_item, dx, dy)
+        self.rendered_rect = (left, top, right, bottom)
+        return True
+
+    def zoom(self, factor, x=None, y=None, progressive=False):
         if not self.image:
             return
 
         old_scale = self.scale
+        max_scale = self.max_scale
+        if self.large_source is not None:
+            max_scale /= self.preview_ratio  # 大图可放大到全分辨率的 max_scale 倍
         self.scale *= factor
-        self.scale = max(self.min_scale, min(self.max_scale, self.scale))
+        self.scale = max(self.min_scale, min(max_scale, self.scale))
 
         if x is not None and y is not None and old_scale != 0:
             canvas_width = self.canvas.winfo_width()
@@ -154,12 +692,15 @@ class ZoomableImage(ttk.Frame):
             self.x = rel_x - (rel_x - self.x) * (self.scale / old_scale)
             self.y = rel_y - (rel_y - self.y) * (self.scale / old_scale)
 
-        self._apply_transform()
+        if progressive:
+            self.render_progressive()
+        else:
+            self._apply_transform()
 
     def on_mouse_wheel(self, event):
         if self.image:  # 只在有图片时响应缩放
             factor = 1.1 if event.delta > 0 else 0.9
-            self.zoom(factor, event.x, event.y)
+            self.zoom(factor, event.x, event.y, progressive=True)
 
     def on_button_press(self, event):
         if self.image:  # 只在有图片时响应拖动
@@ -173,12 +714,20 @@ class ZoomableImage(ttk.Frame):
             self.last_x = event.x
             self.last_y = event.y
 
+            old_x, old_y = self.x, self.y
             self.x += dx
             self.y += dy
-            self._apply_transform()
+            self._clamp_offset(self.canvas.winfo_width(), self.canvas.winfo_height())
+
+            # 尚有待执行的渲染时只累积偏移；否则优先直接移动已有图片项
+            dx, dy = self.x - old_x, self.y - old_y
+            if self.render_job is None and self._shift_rendered_image(dx, dy):
+                self._schedule_refine()
+            else:
+                self.render_progressive()
 
     def on_canvas_resize(self, event):
-        self._apply_transform()
+        self.render_progressive()
 
     def start_cropping(self):
         """开始裁剪模式"""
@@ -243,10 +792,37 @@ class ZoomableImage(ttk.Frame):
         self.canvas.bind("<ButtonPress-1>", self.on_button_press)
         self.canvas.bind("<B1-Motion>", self.on_move_press)
 
-    def save_cropped_image(self):
-        """保存裁剪后的图片"""
+    @staticmethod
+    def _save_edited(image, path):
+        """根据扩展名选择保存格式"""
+        ext = os.path.splitext(path)[1]
+        if ext.lower() in [".jpg", ".jpeg"]:
+            image.convert("RGB").save(path, "JPEG", quality=95)
+        else:
+            image.save(path)
+
+    def _ensure_file(self):
+        """写盘前确保当前图片已是磁盘上的文件，失败返回 False"""
+        if self.materialize is None or os.path.isfile(self.current_image_path):
+            return True
+        try:
+            self.current_image_path = self.materialize()
+        except Exception as e:
+            print(f"写出图片失败: {e}")
+            return False
+        return True
+
+    def _submit_write(self, output_path, save, tag):
+        """把写盘任务交给后台队列，写完之前该路径视为已占用"""
+        self.pending_paths.add(output_path)
+        self.writer.submit(output_path, save, tag)
+
+    def save_cropped_image(self, full_image):
+        """在后台保存裁剪后的图片，返回新文件路径"""
         if not hasattr(self, "current_image_path") or not self.current_image_path:
-            return
+            return None
+        if not self._ensure_file():
+            return None
 
         # 获取当前文件名和路径信息
         folder_path = os.path.dirname(self.current_image_path)
@@ -264,36 +840,18 @@ class ZoomableImage(ttk.Frame):
         counter = 1
         new_filepath = os.path.join(folder_path, new_filename)
 
-        # 如果文件已存在，则添加数字后缀
-        while os.path.exists(new_filepath):
+        # 如果文件已存在（或正在写入），则添加数字后缀
+        while os.path.exists(new_filepath) or new_filepath in self.pending_paths:
             new_filename = f"{base_name}_cropped_{counter}{ext}"
             new_filepath = os.path.join(folder_path, new_filename)
             counter += 1
 
-        # 保存裁剪后的图片
-        try:
-            # 根据扩展名选择保存格式
-            if ext.lower() in [".jpg", ".jpeg"]:
-                rgb_image = self.image.convert("RGB")
-                rgb_image.save(new_filepath, "JPEG", quality=95)
-            else:
-                self.image.save(new_filepath)
-
-            # 更新当前图片路径
-            self.current_image_path = new_filepath
-
-            # 更新主窗口中的文件名显示
-            try:
-                main_window = self.master.master.master.master
-                if hasattr(main_window, "name_var"):
-                    name_part, _ = os.path.splitext(new_filename)
-                    # 使用最新的文件名更新显示
-                    main_window.name_var.set(name_part)
-            except:
-                pass
-
-        except Exception as e:
-            print(f"保存裁剪图片失败: {e}")
+        self._submit_write(
+            new_filepath,
+            lambda temp_path: self._save_edited(full_image, temp_path),
+            ("crop", self.current_image_path),
+        )
+        return new_filepath
 
     def crop_image(self):
         """执行裁剪操作"""
@@ -336,11 +894,12 @@ class ZoomableImage(ttk.Frame):
             self.cancel_cropping()
             return
 
-        # 执行裁剪
-        cropped_image = self.image.crop((left, top, right, bottom))
-        self.image = cropped_image
-        self.original_image = self.image.copy()
-        self.rotation_angle = 0  # 重置旋转角度
+        # 记录裁剪（换算到全分辨率坐标），只对预览图生效
+        ratio = self.preview_ratio
+        self._record_edit(
+            "crop", (left / ratio, top / ratio, right / ratio, bottom / ratio)
+        )
+        self._refresh_edits()
 
         # 清除裁剪矩形
         if self.crop_rectangle_id:
@@ -351,14 +910,21 @@ class ZoomableImage(ttk.Frame):
         self.crop_end_x = None
         self.crop_end_y = None
 
-        # 保存裁剪后的图片
-        self.save_cropped_image()
-
-        # 重新加载裁剪后的图片以替换原图
-        self.set_image(self.current_image_path)
+        # 只在保存时对全分辨率原图应用一次全部编辑，结果在后台写盘
+        full_image = self.render_full()
+        source_history = self.history
+        new_filepath = self.save_cropped_image(full_image)
+        if new_filepath is None:
+            return
+        self.pending_crops[new_filepath] = (source_history, source_history.last())
 
+        # 直接以内存中的裁剪结果作为新文件的原图，不再从磁盘重新读取
+        self.current_image_path = new_filepath
+        self._load_source(full_image, new_filepath)
         self.reset_view()
         self.update_image()
+        if self.on_path_changed:
+            self.on_path_changed(new_filepath)
 
     def cancel_cropping(self):
         """取消裁剪模式"""
@@ -390,8 +956,8 @@ class ZoomableImage(ttk.Frame):
         if not self.image:
             return
 
-        self.rotation_angle = (self.rotation_angle + angle) % 360
-        self.image = self.original_image.rotate(self.rotation_angle, expand=True)
+        self._record_edit("rotate", angle)
+        self._refresh_edits()
         self.reset_view()
         self.scale = 0.5  # 设置默认缩放为50%
         self.update_image()
@@ -401,10 +967,9 @@ class ZoomableImage(ttk.Frame):
         if not self.image:
             return
 
-        self.image = self.image.transpose(Image.FLIP_LEFT_RIGHT)
-        # 更新original_image以保持翻转效果
-        self.original_image = self.image.copy()
-        self.rotation_angle = 0  # 重置旋转角度
+        # 翻转与已有的旋转合成为一个变换，不复制原图
+        self._record_edit("flip_horizontal")
+        self._refresh_edits()
         self.reset_view()
         self.scale = 0.5  # 设置默认缩放为50%
         self.update_image()
@@ -414,51 +979,388 @@ class ZoomableImage(ttk.Frame):
         if not self.image:
             return
 
-        self.image = self.image.transpose(Image.FLIP_TOP_BOTTOM)
-        # 更新original_image以保持翻转效果
-        self.original_image = self.image.copy()
-        self.rotation_angle = 0  # 重置旋转角度
+        # 翻转与已有的旋转合成为一个变换，不复制原图
+        self._record_edit("flip_vertical")
+        self._refresh_edits()
         self.reset_view()
         self.scale = 0.5  # 设置默认缩放为50%
         self.update_image()
 
-    def compress_image(self, quality=85):
-        """压缩图片"""
+    def compress_image(self, quality=85, target_bytes=None):
+        """在后台压缩图片，返回压缩结果的路径
+
+        指定 target_bytes 时搜索不超过该大小的最高质量，搜索结果随写盘结果一起
+        通过 self.writer.results 返回
+        """
         if not self.image or not hasattr(self, "current_image_path"):
             return False
+        if not self._ensure_file():
+            return False
+
+        # 在原文件名后加 _compressed，根据扩展名选择保存格式
+        compressed_path = compressed_path_for(self.current_image_path)
+        full_image = self.render_full()
+        if target_bytes:
+
+            def save(temp_path):
+                return save_to_target(full_image, temp_path, target_bytes)
+
+        else:
+
+            def save(temp_path):
+                save_compressed(full_image, temp_path, quality)
+
+        self._submit_write(compressed_path, save, ("compress", self.current_image_path))
+        return compressed_path
+
+    def save_orientation(self):
+        """把旋转和翻转保存回当前文件，成功返回 True
+
+        不含裁剪的JPEG只改写EXIF方向标记（几个字节），不解码也不重新编码；
+        其它情况在后台按原格式重新编码，并原子地替换原文件
+        """
+        image_path = getattr(self, "current_image_path", None)
+        if not self.image or not image_path:
+            return False
+        if self.edits.is_identity:
+            return True
+        if not self._ensure_file():
+            return False
+        image_path = self.current_image_path
 
+        full_image = None
         try:
-            # 获取文件路径和扩展名
-            folder_path = os.path.dirname(self.current_image_path)
-            filename = os.path.basename(self.current_image_path)
-            name, ext = os.path.splitext(filename)
-
-            # 创建压缩后的文件名
-            compressed_filename = f"{name}_compressed{ext}"
-            compressed_path = os.path.join(folder_path, compressed_filename)
-
-            # 根据扩展名选择保存格式
-            if ext.lower() in [".jpg", ".jpeg"]:
-                rgb_image = self.image.convert("RGB")
-                rgb_image.save(compressed_path, "JPEG", quality=quality, optimize=True)
-            elif ext.lower() == ".png":
-                self.image.save(compressed_path, "PNG", optimize=True)
+            info = probe_file(image_path)
+            if (
+                self.lossless_jpeg_rotation
+                and self.edits.crop_box is None
+                and info is not None
+                and info.format == "jpeg"
+            ):
+                transform_jpeg(image_path, self.edits.flip, self.edits.turns)
             else:
-                self.image.save(compressed_path)
+                full_image = self.render_full()
+                if info is not None and info.format == "jpeg":
+
+                    def save(temp_path):
+                        full_image.convert("RGB").save(temp_path, "JPEG", quality=95)
 
-            return compressed_path
+                else:
+                    image_format = info.format.upper() if info else None
+
+                    def save(temp_path):
+                        full_image.save(temp_path, image_format)
+
+                self._submit_write(image_path, save, ("orientation", image_path))
         except Exception as e:
-            print(f"压缩图片失败: {e}")
+            print(f"保存旋转失败: {e}")
             return False
 
+        # 以编辑后的位图作为新的原图，无需重新读取磁盘；
+        # 旧的操作日志针对的是修改前的文件，不能再用于新内容
+        saved_path = os.path.abspath(image_path)
+        for key in [key for key in self.histories if key[0] == saved_path]:
+            del self.histories[key]
+        if full_image is None and self.large_source is not None:
+            # 大图只改写了方向标记，重新按需打开，仍不解码全分辨率原图
+            source = LargeImage(image_path, self.large_image_budget)
+            self._load_large(source, image_path)
+        else:
+            if full_image is None:
+                full_image = self.render_full()
+            self._load_source(full_image, image_path)
+        self.reset_view()
+        self.update_image()
+        return True
+
+    def take_write_result(self):
+        """取出一个已完成的后台写盘结果，没有时返回 None"""
+        try:
+            result = self.writer.results.get_nowait()
+        except queue.Empty:
+            return None
+        status, _, path, _ = result
+        self.pending_paths.discard(path)
+        pending_crop = self.pending_crops.pop(path, None)
+        if pending_crop is not None and status != "failed":
+            # 裁剪已另存为新文件，原图本身没有被裁剪
+            history, operation = pending_crop
+            history.discard(operation)
+        return result
+
     def reset_image(self):
         """重置图片到原始状态"""
-        if self.original_image:
-            self.image = self.original_image.copy()
-            self.rotation_angle = 0
+        if self.preview_base is not None:
+            # 重置也记录为一个操作，可以撤销
+            self._record_edit("reset")
+            self._refresh_edits()
             self.reset_view()
             self.update_image()
 
+    def undo(self):
+        """撤销上一步编辑"""
+        if not self.image or not self.history or not self.history.can_undo():
+            return False
+        self.edits = self.history.undo()
+        self._refresh_edits()
+        self.reset_view()
+        self.update_image()
+        return True
+
+    def redo(self):
+        """重做上一步被撤销的编辑"""
+        if not self.image or not self.history or not self.history.can_redo():
+            return False
+        self.edits = self.history.redo()
+        self._refresh_edits()
+        self.reset_view()
+        self.update_image()
+        return True
+
+
+class ThumbnailStrip(ttk.Frame):
+    """可滚动的缩略图条
+
+    只为当前可见的行创建画布项并请求缩略图，缩略图在后台线程中生成（带磁盘缓存），
+    内存中最多保留 max_photos 张，并计入全局内存预算
+    """
+
+    def __init__(self, master, on_select=None, thumb_size=96, **kwargs):
+        super().__init__(master, **kwargs)
+        self.on_select = on_select
+        self.thumb_size = thumb_size
+        self.row_height = thumb_size + 24  # 缩略图下方显示文件名
+        self.strip_width = thumb_size + 16
+        self.paths = []
+        self.current_index = -1
+
+        # 缩略图缓存与后台生成
+        self.cache = ThumbnailCache(size=thumb_size)
+        self.loader = None  # 自定义的缩略图生成函数（如直接读取文档中的图片）
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.photos = OrderedDict()  # 路径 -> PhotoImage，按最近使用排序
+        self.max_photos = 300
+        self.budget = None
+        self.wanted = set()  # 当前可见、需要生成缩略图的路径
+        self.pending = set()
+        self.results = queue.Queue()
+        self.poll_job = None
+
+        self.canvas = tk.Canvas(
+            self,
+            width=self.strip_width,
+            bg="#f0f0f0",
+            highlightthickness=0,
+            yscrollincrement=self.row_height // 2,
+        )
+        self.scrollbar = ttk.Scrollbar(
+            self, orient=tk.VERTICAL, command=self.on_scroll
+        )
+        self.canvas.config(yscrollcommand=self.scrollbar.set)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.Y, expand=True)
+
+        self.canvas.bind("<Configure>", lambda e: self.redraw())
+        self.canvas.bind("<ButtonPress-1>", self.on_click)
+        self.canvas.bind("<MouseWheel>", self.on_mouse_wheel)
+
+    def set_paths(self, paths):
+        """更换要显示的图片列表"""
+        self.paths = list(paths)
+        self.current_index = -1
+        self.wanted.clear()
+        self.canvas.config(
+            scrollregion=(0, 0, self.strip_width, len(self.paths) * self.row_height)
+        )
+        self.canvas.yview_moveto(0)
+        self.redraw()
+
+    def update_path(self, index, path):
+        """图片重命名后更新对应行"""
+        if 0 <= index < len(self.paths):
+            old_path = self.paths[index]
+            self.paths[index] = path
+            if old_path in self.photos:
+                self.photos[path] = self.photos.pop(old_path)
+            self.redraw()
+
+    def insert_path(self, index, path):
+        """在列表中插入一张新图片（如裁剪结果）"""
+        self.paths.insert(index, path)
+        if self.current_index >= index:
+            self.current_index += 1
+        self.canvas.config(
+            scrollregion=(0, 0, self.strip_width, len(self.paths) * self.row_height)
+        )
+        self.redraw()
+
+    def rename_paths(self, mapping):
+        """批量重命名后按 {原路径: 新路径} 更新列表，已生成的缩略图继续使用"""
+        self.paths = [mapping.get(path, path) for path in self.paths]
+        self.photos = OrderedDict(
+            (mapping.get(path, path), photo) for path, photo in self.photos.items()
+        )
+        self.redraw()
+
+    def refresh_path(self, index):
+        """图片内容在磁盘上被修改后，丢弃旧缩略图并重新生成"""
+        if 0 <= index < len(self.paths):
+            self._drop_photo(self.paths[index])
+            self.redraw()
+
+    def set_current(self, index):
+        """高亮当前图片，并在其不可见时滚动到该行"""
+        self.current_index = index
+        first, last = self._visible_rows()
+        if self.paths and not first <= index < last:
+            self.canvas.yview_moveto(index / len(self.paths))
+        self.redraw()
+
+    def _visible_rows(self):
+        top = self.canvas.canvasy(0)
+        bottom = self.canvas.canvasy(self.canvas.winfo_height())
+        first = max(0, int(top // self.row_height))
+        last = min(len(self.paths), int(bottom // self.row_height) + 1)
+        return first, last
+
+    def redraw(self):
+        """只绘制可见的行，并为其中还没有缩略图的行请求生成"""
+        self.canvas.delete("all")
+        first, last = self._visible_rows()
+        self.wanted = set(self.paths[first:last])
+
+        for index in range(first, last):
+            path = self.paths[index]
+            top = index * self.row_height
+            center_x = self.strip_width // 2
+
+            if index == self.current_index:
+                self.canvas.create_rectangle(
+                    2,
+                    top + 2,
+                    self.strip_width - 2,
+                    top + self.row_height - 2,
+                    outline="#3874d8",
+                    width=2,
+                )
+
+            photo = self.photos.get(path)
+            if photo is not None:
+                self.photos.move_to_end(path)
+                if self.budget is not None:
+                    self.budget.touch(self, photo)
+                self.canvas.create_image(
+                    center_x, top + 4 + self.thumb_size // 2, image=photo
+                )
+            else:
+                self.canvas.create_rectangle(
+                    8,
+                    top + 4,
+                    self.strip_width - 8,
+                    top + 4 + self.thumb_size,
+                    outline="#cccccc",
+                )
+                self._request(path)
+
+            self.canvas.create_text(
+                center_x,
+                top + self.thumb_size + 14,
+                text=os.path.basename(path),
+                width=self.strip_width - 8,
+                font=("Arial", 8),
+            )
+
+    def _request(self, path):
+        if path in self.pending:
+            return
+        self.pending.add(path)
+        future = self.executor.submit(self._load_thumbnail, path)
+        future.add_done_callback(lambda f: self.results.put(f.result()))
+        if self.poll_job is None:
+            self.poll_job = self.after(50, self._poll_results)
+
+    def _load_thumbnail(self, path):
+        """后台线程：滚动过后已不可见的行直接跳过"""
+        if path not in self.wanted:
+            return path, None
+        try:
+            return path, (self.loader or self.cache.get)(path)
+        except Exception as e:
+            print(f"生成缩略图失败 {path}: {e}")
+            return path, None
+
+    def _poll_results(self):
+        """在Tk线程中把后台生成的缩略图转换为 PhotoImage"""
+        self.poll_job = None
+        changed = False
+        while True:
+            try:
+                path, thumbnail = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.pending.discard(path)
+            if thumbnail is not None:
+                self._drop_photo(path)
+                photo = self.photos[path] = ImageTk.PhotoImage(thumbnail)
+                if self.budget is not None:
+                    self.budget.charge(
+                        self,
+                        photo,
+                        photo_nbytes(photo.width(), photo.height()),
+                        EVICTABLE,
+                        lambda photo=photo: self._release_photo(photo),
+                    )
+                changed = changed or path in self.wanted
+
+        # 淘汰不可见且最久未使用的缩略图
+        for path in list(self.photos):
+            if len(self.photos) <= self.max_photos:
+                break
+            if path not in self.wanted:
+                self._drop_photo(path)
+        # 新缩略图在界面线程中登记，立即按内存预算淘汰，不等下一次定时检查
+        if self.budget is not None:
+            self.budget.enforce()
+
+        if changed:
+            self.redraw()
+        if self.pending:
+            self.poll_job = self.after(50, self._poll_results)
+
+    def _drop_photo(self, path):
+        photo = self.photos.pop(path, None)
+        if photo is not None and self.budget is not None:
+            self.budget.discharge(self, photo)
+
+    def _release_photo(self, photo):
+        """内存预算淘汰的回调；缩略图可能已因重命名换了路径，按对象查找"""
+        for path, held in self.photos.items():
+            if held is photo:
+                del self.photos[path]
+                break
+
+    def on_scroll(self, *args):
+        self.canvas.yview(*args)
+        self.redraw()
+
+    def on_mouse_wheel(self, event):
+        self.canvas.yview_scroll(-1 if event.delta > 0 else 1, "units")
+        self.redraw()
+
+    def on_click(self, event):
+        index = int(self.canvas.canvasy(event.y) // self.row_height)
+        if 0 <= index < len(self.paths) and self.on_select:
+            self.on_select(index)
+
+
+# 批量压缩的格式选项 -> BatchCompressionJob 的 output_format
+BATCH_FORMAT_CHOICES = {
+    "保持原格式": "keep",
+    "渐进式JPEG": "jpeg",
+    "WebP": "webp",
+    "优化PNG": "png",
+}
+
 
 class WordImageExtractorApp:
     def __init__(self, root):
@@ -472,13 +1374,43 @@ class WordImageExtractorApp:
         self.image_files = []
         self.current_index = 0
         self.current_image_path = ""
+        self.extraction_job = None
+        self.dedup_var = tk.BooleanVar(value=True)
+        self.target_size_var = tk.StringVar()  # 压缩目标大小（KB），为空时按固定质量压缩
+        self.compression_job = None
+        self.batch_format_var = tk.StringVar(value="保持原格式")
+        self.status_var = tk.StringVar()  # 编辑区的状态提示（保存、压缩、重命名结果）
+        self.document_update = None  # 正在后台生成新文档的 Future
+        self.docx_source = None  # 浏览文档模式下直接读取的 .docx，None 表示浏览文件夹
+
+        # 全局内存预算：统计解码位图、预览图、Tk图片和缓存，超出上限时按优先级淘汰
+        self.memory_budget = MemoryBudget()
+        self.memory_limit_var = tk.StringVar(
+            value=str(self.memory_budget.limit // (1024 * 1024))
+        )
+        self.memory_usage_var = tk.StringVar()
+
+        # 已解码图片缓存及后台预读
+        self.image_cache = DecodedImageCache(budget=self.memory_budget)
+        self.prefetcher = ImagePrefetcher(self.image_cache)
 
         # 创建界面
         self.create_widgets()
 
+        # 处理后台写盘结果；关闭窗口前等待未完成的写入
+        self.zoomable_image.on_path_changed = self.on_image_path_changed
+        self.zoomable_image.materialize = self.materialize_current
+        self.zoomable_image.budget = self.memory_budget
+        self.thumbnail_strip.budget = self.memory_budget
+        self.root.after(100, self.poll_writes)
+        self.poll_memory()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
         # 绑定键盘事件
         self.root.bind("<Up>", lambda e: self.previous_image())
         self.root.bind("<Down>", lambda e: self.next_image())
+        self.root.bind("<Control-z>", lambda e: self.zoomable_image.undo())
+        self.root.bind("<Control-y>", lambda e: self.zoomable_image.redo())
         self.root.focus_set()  # 确保窗口可以接收键盘事件
 
     def create_widgets(self):
@@ -525,17 +1457,47 @@ class WordImageExtractorApp:
             output_frame, text="浏览...", command=self.browse_output_folder
         ).grid(row=0, column=2)
 
+        # 内容完全相同的图片只提取一份
+        ttk.Checkbutton(
+            output_frame, text="跳过重复图片", variable=self.dedup_var
+        ).grid(row=1, column=1, sticky=tk.W, pady=(5, 0))
+
         # 操作按钮区域
         button_frame = ttk.Frame(extract_tab)
         button_frame.pack(fill=tk.X, pady=10)
 
-        ttk.Button(button_frame, text="提取图片", command=self.extract_images).pack(
-            side=tk.LEFT, padx=5
+        self.extract_button = ttk.Button(
+            button_frame, text="提取图片", command=self.extract_images
         )
+        self.extract_button.pack(side=tk.LEFT, padx=5)
+        ttk.Button(
+            button_frame, text="批量提取...", command=self.batch_extract_images
+        ).pack(side=tk.LEFT, padx=5)
+        ttk.Button(
+            button_frame, text="浏览文档", command=self.browse_document
+        ).pack(side=tk.LEFT, padx=5)
+        self.cancel_extract_button = ttk.Button(
+            button_frame,
+            text="取消提取",
+            command=self.cancel_extraction,
+            state=tk.DISABLED,
+        )
+        self.cancel_extract_button.pack(side=tk.LEFT, padx=5)
         ttk.Button(
             button_frame, text="打开图片文件夹", command=self.open_image_folder
         ).pack(side=tk.LEFT, padx=5)
 
+        # 提取进度
+        progress_frame = ttk.Frame(extract_tab)
+        progress_frame.pack(fill=tk.X, pady=5)
+
+        self.extract_progress = ttk.Progressbar(progress_frame, mode="determinate")
+        self.extract_progress.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.extract_status_var = tk.StringVar()
+        ttk.Label(progress_frame, textvariable=self.extract_status_var).pack(
+            side=tk.LEFT, padx=5
+        )
+
     def create_rename_tab(self):
         """创建图片重命名选项卡"""
         rename_tab = ttk.Frame(self.notebook)
@@ -559,6 +1521,20 @@ class WordImageExtractorApp:
             row=1, column=2, pady=5, sticky=tk.E
         )
 
+        # 内存上限（MB）及当前占用
+        ttk.Label(folder_frame, text="内存上限(MB):").grid(row=1, column=0, sticky=tk.W)
+        memory_frame = ttk.Frame(folder_frame)
+        memory_frame.grid(row=1, column=1, sticky=tk.W, padx=5)
+        memory_entry = ttk.Entry(
+            memory_frame, textvariable=self.memory_limit_var, width=8
+        )
+        memory_entry.pack(side=tk.LEFT)
+        memory_entry.bind("<Return>", self.apply_memory_limit)
+        memory_entry.bind("<FocusOut>", self.apply_memory_limit)
+        ttk.Label(memory_frame, textvariable=self.memory_usage_var).pack(
+            side=tk.LEFT, padx=5
+        )
+
         # 图片显示与重命名区域
         image_frame = ttk.LabelFrame(rename_tab, text="图片预览与重命名", padding="10")
         image_frame.pack(fill=tk.BOTH, expand=True, pady=5)
@@ -594,12 +1570,28 @@ class WordImageExtractorApp:
         ttk.Button(nav_frame, text="保存重命名", command=self.save_rename).pack(
             side=tk.LEFT, padx=2
         )
+        ttk.Button(nav_frame, text="模板重命名...", command=self.template_rename).pack(
+            side=tk.LEFT, padx=2
+        )
+        ttk.Button(nav_frame, text="CSV重命名...", command=self.csv_rename).pack(
+            side=tk.LEFT, padx=2
+        )
+        # 把裁剪、压缩后的图片写回Word文档
+        ttk.Button(nav_frame, text="更新文档...", command=self.update_document).pack(
+            side=tk.LEFT, padx=2
+        )
         # # 重置按钮移至这里
         # ttk.Button(nav_frame, text="重置", command=self.zoomable_image.reset_image).pack(side=tk.LEFT, padx=2)
 
-        # 使用自定义的可缩放图片组件
-        self.zoomable_image = ZoomableImage(image_frame)
-        self.zoomable_image.pack(fill=tk.BOTH, expand=True)
+        # 左侧缩略图条，右侧为自定义的可缩放图片组件
+        viewer_frame = ttk.Frame(image_frame)
+        viewer_frame.pack(fill=tk.BOTH, expand=True)
+
+        self.thumbnail_strip = ThumbnailStrip(viewer_frame, on_select=self.select_image)
+        self.thumbnail_strip.pack(side=tk.LEFT, fill=tk.Y, padx=(0, 5))
+
+        self.zoomable_image = ZoomableImage(viewer_frame)
+        self.zoomable_image.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
         # 编辑功能按钮区域 (放在图片下方)
         bottom_control_frame = ttk.Frame(image_frame)
@@ -631,6 +1623,18 @@ class WordImageExtractorApp:
             row1_frame, text="垂直翻转", command=self.zoomable_image.flip_vertical
         ).pack(side=tk.LEFT, padx=2)
 
+        ttk.Button(row1_frame, text="保存旋转", command=self.save_orientation).pack(
+            side=tk.LEFT, padx=2
+        )
+
+        # 撤销/重做 (Ctrl+Z / Ctrl+Y)
+        ttk.Button(row1_frame, text="撤销", command=self.zoomable_image.undo).pack(
+            side=tk.LEFT, padx=2
+        )
+        ttk.Button(row1_frame, text="重做", command=self.zoomable_image.redo).pack(
+            side=tk.LEFT, padx=2
+        )
+
         # 第二行按钮: 裁剪、压缩等
         row2_frame = ttk.Frame(bottom_control_frame)
         row2_frame.pack(fill=tk.X, pady=2)
@@ -653,6 +1657,33 @@ class WordImageExtractorApp:
         ttk.Button(
             row2_frame, text="压缩图片", command=self.compress_current_image
         ).pack(side=tk.LEFT, padx=2)
+        ttk.Label(row2_frame, text="目标大小(KB):").pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Entry(row2_frame, textvariable=self.target_size_var, width=6).pack(
+            side=tk.LEFT, padx=2
+        )
+
+        # 批量压缩当前文件夹中的所有图片，可同时转换格式
+        self.batch_compress_button = ttk.Button(
+            row2_frame, text="批量压缩", command=self.batch_compress_images
+        )
+        self.batch_compress_button.pack(side=tk.LEFT, padx=(5, 2))
+        self.cancel_compress_button = ttk.Button(
+            row2_frame,
+            text="取消压缩",
+            command=self.cancel_compression,
+            state=tk.DISABLED,
+        )
+        self.cancel_compress_button.pack(side=tk.LEFT, padx=2)
+        ttk.Combobox(
+            row2_frame,
+            textvariable=self.batch_format_var,
+            values=list(BATCH_FORMAT_CHOICES),
+            state="readonly",
+            width=10,
+        ).pack(side=tk.LEFT, padx=2)
+        ttk.Label(row2_frame, textvariable=self.status_var).pack(
+            side=tk.LEFT, padx=5
+        )
 
         # 重置视图
         ttk.Button(
@@ -704,188 +1735,239 @@ class WordImageExtractorApp:
             messagebox.showerror("错误", "请选择有效的 .docx 文件")
             return
 
+        if self.extraction_job is not None:
+            messagebox.showwarning("警告", "正在提取图片，请稍候")
+            return
+
+        self.close_document()
         try:
             # 确保输出文件夹存在
             if not os.path.exists(output_folder):
                 os.makedirs(output_folder)
 
-            # 获取图片在文档中的实际顺序
-            image_order = self.get_image_order_from_docx(word_file)
-
-            # 使用zip解压获取图片文件
-            with zipfile.ZipFile(word_file, "r") as docx_zip:
-                # 获取所有媒体文件
-                media_files = [
-                    f for f in docx_zip.namelist() if f.startswith("word/media/")
-                ]
-
-                # 清空目标文件夹（可选）
-                for existing_file in os.listdir(output_folder):
-                    file_path = os.path.join(output_folder, existing_file)
-                    try:
-                        if os.path.isfile(file_path):
-                            os.unlink(file_path)
-                    except Exception as e:
-                        print(f"删除文件 {file_path} 失败: {e}")
-
-                # 按检测到的顺序提取图片
-                valid_images = []
-                for i, rel_path in enumerate(image_order, 1):
-                    if rel_path in media_files:
-                        # 从zip文件中读取图片数据
-                        with docx_zip.open(rel_path) as source:
-                            image_data = source.read()
-
-                        # 检测图片实际类型
-                        image_type = imghdr.what(None, h=image_data)
-                        if not image_type:
-                            continue  # 不是有效图片，跳过
-
-                        # 确定文件扩展名
-                        ext_map = {
-                            "jpeg": ".jpg",
-                            "jpg": ".jpg",
-                            "png": ".png",
-                            "bmp": ".bmp",
-                            "gif": ".gif",
-                            "tiff": ".tiff",
-                            "webp": ".webp",
-                        }
-                        ext = ext_map.get(image_type, ".png")
-
-                        # 新文件名
-                        new_filename = f"{i:03d}{ext}"
-                        output_path = os.path.join(output_folder, new_filename)
-
-                        # 保存图片
-                        with open(output_path, "wb") as target:
-                            target.write(image_data)
-
-                        valid_images.append(new_filename)
-
-            if valid_images:
-                messagebox.showinfo(
-                    "完成", f"成功提取 {len(valid_images)} 张图片到 {output_folder}"
-                )
-                # 自动切换到重命名标签页
-                self.notebook.select(1)
-                self.load_image_files(output_folder)
-            else:
-                messagebox.showwarning("警告", "未找到有效的图片文件")
-
+            # 在后台线程中解析图片顺序并用线程池提取，界面定时轮询进度
+            self.extraction_job = ImageExtractionJob(
+                word_file,
+                output_folder,
+                dedup="skip" if self.dedup_var.get() else None,
+            )
+            self.extraction_job.start()
         except Exception as e:
+            self.extraction_job = None
             messagebox.showerror("错误", f"提取图片失败: {str(e)}")
+            return
 
-    def get_image_order_from_docx(self, docx_path):
-        """通过解析document.xml获取图片在文档中的实际顺序"""
-        image_order = []
+        self.extract_button.config(state=tk.DISABLED)
+        self.cancel_extract_button.config(state=tk.NORMAL)
+        self.extract_progress["value"] = 0
+        self.extract_status_var.set("正在提取...")
+        self.root.after(50, self.poll_extraction)
 
-        try:
-            with zipfile.ZipFile(docx_path) as z:
-                # 读取document.xml.rels文件建立关系映射
-                with z.open("word/_rels/document.xml.rels") as rels_file:
-                    rels_content = rels_file.read()
-                    rels_root = ET.fromstring(rels_content)
-
-                # 建立ID到图片路径的映射
-                rel_mapping = {}
-                for rel in rels_root.findall(
-                    "{http://schemas.openxmlformats.org/package/2006/relationships}Relationship"
-                ):
-                    rel_id = rel.get("Id")
-                    target = rel.get("Target")
-                    if target and target.startswith("media/"):
-                        rel_mapping[rel_id] = f"word/{target}"
-
-                # 解析document.xml查找图片引用
-                with z.open("word/document.xml") as doc_file:
-                    doc_content = doc_file.read()
-                    doc_root = ET.fromstring(doc_content)
-
-                # 查找所有的图片引用
-                # namespace definitions
-                namespaces = {
-                    "w": "http://schemas.openxmlformats.org/wordprocessingml/2006/main",
-                    "a": "http://schemas.openxmlformats.org/drawingml/2006/main",
-                    "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
-                }
-
-                # 查找所有包含图片的drawing元素
-                drawings = doc_root.findall(".//w:drawing", namespaces)
-                for drawing in drawings:
-                    blips = drawing.findall(".//a:blip", namespaces)
-                    for blip in blips:
-                        embed = blip.get(
-                            "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}embed"
-                        )
-                        if embed and embed in rel_mapping:
-                            image_path = rel_mapping[embed]
-                            if image_path not in image_order:
-                                image_order.append(image_path)
-
-                # 同时查找旧式的图片引用(pict元素)
-                picts = doc_root.findall(".//w:pict", namespaces)
-                for pict in picts:
-                    embeddings = pict.findall(
-                        ".//v:shape/v:imagedata", {"v": "urn:schemas-microsoft-com:vml"}
-                    )
-                    for embedding in embeddings:
-                        rel_id = embedding.get(
-                            "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
-                        )
-                        if rel_id and rel_id in rel_mapping:
-                            image_path = rel_mapping[rel_id]
-                            if image_path not in image_order:
-                                image_order.append(image_path)
+    def batch_extract_images(self):
+        """批量提取文件夹中所有Word文档的图片，每个文档一个子文件夹"""
+        if self.extraction_job is not None:
+            messagebox.showwarning("警告", "正在提取图片，请稍候")
+            return
 
-        except Exception as e:
-            print(f"解析Word文档时出错: {e}")
-            # 回退到原来的实现方式
+        source_folder = filedialog.askdirectory(title="选择包含 Word 文件的文件夹")
+        if not source_folder:
+            return
+
+        docx_paths = collect_docx_files(source_folder)
+        if not docx_paths:
+            messagebox.showwarning("警告", "文件夹中没有找到 .docx 文件")
+            return
+
+        output_root = self.image_folder_path.get() or os.path.join(
+            source_folder, "extracted_images"
+        )
+        self.image_folder_path.set(output_root)
+
+        self.extraction_job = BatchExtractionJob(
+            docx_paths,
+            output_root,
+            dedup="skip" if self.dedup_var.get() else None,
+        )
+        self.extraction_job.start()
+
+        self.extract_button.config(state=tk.DISABLED)
+        self.cancel_extract_button.config(state=tk.NORMAL)
+        self.extract_progress["value"] = 0
+        self.extract_status_var.set(f"正在批量提取 {len(docx_paths)} 个文档...")
+        self.root.after(50, self.poll_extraction)
+
+    def cancel_extraction(self):
+        """取消正在进行的提取"""
+        if self.extraction_job is not None:
+            self.extraction_job.cancel()
+            self.extract_status_var.set("正在取消...")
+
+    def poll_extraction(self):
+        """处理后台提取任务汇报的进度"""
+        job = self.extraction_job
+        if job is None:
+            return
+
+        while True:
             try:
-                with zipfile.ZipFile(docx_path) as z:
-                    with z.open("word/document.xml") as f:
-                        xml_content = f.read().decode("utf-8")
-
-                # 查找所有图片引用，按照在文档中出现的顺序
-                image_refs = re.findall(
-                    r'<w:drawing>.*?<a:blip r:embed="([^"]+)".*?</w:drawing>',
-                    xml_content,
-                    re.DOTALL,
-                )
-                if not image_refs:
-                    # 备用方法：查找所有blip标签
-                    image_refs = re.findall(r'<a:blip r:embed="([^"]+)"', xml_content)
-
-                # 读取rels文件建立映射
-                with z.open("word/_rels/document.xml.rels") as rels_file:
-                    rels_content = rels_file.read().decode("utf-8")
-
-                for ref in image_refs:
-                    # 在rels文件中查找实际的图片文件名
-                    match = re.search(
-                        f'Id="{ref}"[^>]*Target="media/([^"]+)"', rels_content
-                    )
-                    if match:
-                        image_path = f"word/media/{match.group(1)}"
-                        image_order.append(image_path)
-            except Exception as e2:
-                print(f"备用解析方法也失败了: {e2}")
-                # 最后的回退方案：按文件名排序
-                with zipfile.ZipFile(docx_path) as z:
-                    media_files = [
-                        f for f in z.namelist() if f.startswith("word/media/")
-                    ]
-                    # 按照文件名中的数字排序
-                    media_files.sort(
-                        key=lambda x: (
-                            int(re.findall(r"\d+", os.path.basename(x))[0])
-                            if re.findall(r"\d+", os.path.basename(x))
-                            else 0
-                        )
-                    )
-                    image_order = media_files
+                message = job.progress.get_nowait()
+            except queue.Empty:
+                self.root.after(50, self.poll_extraction)
+                return
+
+            if message[0] == "progress":
+                _, done, total = message
+                self.extract_progress["maximum"] = max(total, 1)
+                self.extract_progress["value"] = done
+                if not job.cancel_event.is_set():
+                    self.extract_status_var.set(f"{done}/{total}")
+            elif message[0] == "batch_done":
+                _, summaries, cancelled, error = message
+                self.finish_batch_extraction(job, summaries, cancelled, error)
+                return
+            else:
+                _, valid_images, cancelled, error = message
+                self.finish_extraction(job, valid_images, cancelled, error)
+                return
 
-        return image_order
+    def finish_extraction(self, job, valid_images, cancelled, error):
+        """提取结束后恢复界面并加载结果"""
+        self.extraction_job = None
+        self.extract_button.config(state=tk.NORMAL)
+        self.cancel_extract_button.config(state=tk.DISABLED)
+        output_folder = job.output_folder
+
+        if error is not None:
+            self.extract_status_var.set("提取失败")
+            messagebox.showerror("错误", f"提取图片失败: {str(error)}")
+        elif cancelled:
+            self.extract_status_var.set(f"已取消，已提取 {len(valid_images)} 张")
+            messagebox.showinfo(
+                "已取消", f"提取已取消，已完整提取 {len(valid_images)} 张图片"
+            )
+        elif valid_images:
+            self.extract_status_var.set(f"已提取 {len(valid_images)} 张")
+            messagebox.showinfo(
+                "完成", f"成功提取 {len(valid_images)} 张图片到 {output_folder}"
+            )
+            # 自动切换到重命名标签页
+            self.notebook.select(1)
+            self.load_image_files(output_folder)
+        else:
+            self.extract_status_var.set("")
+            messagebox.showwarning("警告", "未找到有效的图片文件")
+
+    def browse_document(self):
+        """不提取，直接浏览文档中的图片
+
+        图片在显示时才从文档中解压；只有重命名或编辑过的图片才写入输出文件夹
+        """
+        word_file = self.word_file_path.get()
+        if not word_file or not word_file.endswith(".docx"):
+            messagebox.showerror("错误", "请选择有效的 .docx 文件")
+            return
+
+        try:
+            source = DocxImageSource(word_file)
+        except Exception as e:
+            messagebox.showerror("错误", f"打开文档失败: {str(e)}")
+            return
+
+        self.close_document()
+        self.docx_source = source
+        if not self.image_folder_path.get():
+            word_dir = os.path.dirname(word_file)
+            self.image_folder_path.set(os.path.join(word_dir, "extracted_images"))
+
+        self.image_files = list(source.names)
+        self.thumbnail_strip.loader = self.load_document_thumbnail
+        self.thumbnail_strip.set_paths(
+            [self.image_path_for(f) for f in self.image_files]
+        )
+        self.notebook.select(1)
+        if self.image_files:
+            self.current_index = 0
+            self.show_image()
+        else:
+            self.zoomable_image.show_message("文档中没有找到图片")
+            self.clear_file_info()
+            self.current_image_path = ""
+
+    def close_document(self):
+        """退出浏览文档模式"""
+        if self.docx_source is not None:
+            self.docx_source.close()
+            self.docx_source = None
+            self.thumbnail_strip.loader = None
+
+    def in_document(self, image_file):
+        """图片是否仍只在文档中（尚未写入磁盘）"""
+        source = self.docx_source
+        return (
+            source is not None
+            and image_file in source.members
+            and image_file not in source.extracted
+        )
+
+    def image_path_for(self, image_file):
+        """图片的路径；仍在文档中的图片使用 "文档路径/图片名" 形式的虚拟路径"""
+        if self.in_document(image_file):
+            return os.path.join(self.docx_source.docx_path, image_file)
+        if self.docx_source is not None and image_file in self.docx_source.extracted:
+            return self.docx_source.extracted[image_file]
+        return os.path.join(self.image_folder_path.get(), image_file)
+
+    def load_document_thumbnail(self, path):
+        """后台线程：为缩略图条读取文档中的图片数据"""
+        source = self.docx_source
+        name = os.path.basename(path)
+        if source is not None and name in source.members:
+            return self.thumbnail_strip.cache.get_data(source.read(name))
+        return self.thumbnail_strip.cache.get(path)
+
+    def materialize_current(self):
+        """把当前图片从文档写入输出文件夹，返回文件路径"""
+        image_file = self.image_files[self.current_index]
+        path = self.docx_source.extract(image_file, self.image_folder_path.get())
+        self.current_image_path = path
+        self.thumbnail_strip.update_path(self.current_index, path)
+        return path
+
+    def require_folder(self):
+        """批量操作只支持磁盘上的图片，浏览文档时提示先提取"""
+        if self.docx_source is not None:
+            messagebox.showwarning("警告", "正在浏览文档，请先提取图片")
+            return False
+        return True
+
+    def finish_batch_extraction(self, job, summaries, cancelled, error):
+        """批量提取结束后恢复界面并显示汇总"""
+        self.extraction_job = None
+        self.extract_button.config(state=tk.NORMAL)
+        self.cancel_extract_button.config(state=tk.DISABLED)
+
+        if error is not None:
+            self.extract_status_var.set("批量提取失败")
+            messagebox.showerror("错误", f"批量提取失败: {str(error)}")
+            return
+
+        failed = [summary for summary in summaries if summary["error"]]
+        total_images = sum(summary["images"] for summary in summaries)
+        total_bytes = sum(summary["bytes"] for summary in summaries)
+        status = "已取消" if cancelled else "完成"
+        self.extract_status_var.set(
+            f"{status}：{len(summaries)} 个文档，{total_images} 张图片"
+        )
+
+        lines = [
+            f"处理文档: {len(summaries)}/{len(job.docx_paths)}",
+            f"提取图片: {total_images} 张，共 {total_bytes / 1024 / 1024:.1f} MB",
+            f"失败文档: {len(failed)}",
+        ]
+        for summary in failed[:10]:
+            lines.append(f"  {os.path.basename(summary['docx'])}: {summary['error']}")
+        lines.append(f"报告: {os.path.join(job.output_root, job.REPORT_NAME)}")
+        messagebox.showinfo(f"批量提取{status}", "\n".join(lines))
 
     def open_image_folder(self):
         output_folder = self.image_folder_path.get()
@@ -920,21 +2002,31 @@ class WordImageExtractorApp:
             messagebox.showerror("错误", "图片文件夹不存在")
             return
 
-        # 获取文件夹中的所有图片文件（包括无扩展名的）
-        self.image_files = []
-        for f in os.listdir(folder_path):
-            file_path = os.path.join(folder_path, f)
-            if os.path.isfile(file_path):
-                # 检测文件是否为图片
-                try:
-                    image_type = imghdr.what(file_path)
-                    if image_type:
-                        self.image_files.append(f)
-                except:
-                    continue
+        self.close_document()
+
+        # 上次批量重命名中途中断时先回滚，保证文件名与清单一致
+        try:
+            recovered = recover_renames(folder_path)
+        except OSError as e:
+            recovered = 0
+            messagebox.showerror("错误", f"回滚未完成的批量重命名失败: {str(e)}")
+        if recovered:
+            messagebox.showwarning(
+                "提示", f"检测到未完成的批量重命名，已恢复 {recovered} 个文件的原名"
+            )
+
+        # 获取文件夹中的所有图片文件（包括无扩展名的），未变化的文件直接使用索引
+        try:
+            self.image_files = list(scan_image_folder(folder_path))
+        except OSError as e:
+            messagebox.showerror("错误", f"读取图片文件夹失败: {str(e)}")
+            return
 
         # 按数字序号排序
         self.image_files.sort(key=lambda x: int("".join(filter(str.isdigit, x)) or "0"))
+        self.thumbnail_strip.set_paths(
+            [os.path.join(folder_path, f) for f in self.image_files]
+        )
 
         if self.image_files:
             self.current_index = 0
@@ -949,16 +2041,32 @@ class WordImageExtractorApp:
             return
 
         if 0 <= self.current_index < len(self.image_files):
-            folder_path = self.image_folder_path.get()
             image_file = self.image_files[self.current_index]
-            self.current_image_path = os.path.join(folder_path, image_file)
+            self.current_image_path = self.image_path_for(image_file)
 
             # 设置当前图片路径到zoomable_image对象
             self.zoomable_image.current_image_path = self.current_image_path
+            self.thumbnail_strip.set_current(self.current_index)
+            # 当前图片由查看器计入内存预算，前后相邻的图片较晚淘汰
+            self.image_cache.set_focus(self.current_image_path, self.neighbour_paths())
 
-            # 尝试加载图片，如果失败则显示友好消息
-            success = self.zoomable_image.set_image(self.current_image_path)
+            if self.in_document(image_file):
+                # 浏览文档：只解码正在查看的这一张，不预读也不缓存
+                cached = self.load_document_image(image_file)
+            else:
+                # 优先使用后台预读好的位图，如果加载失败则显示友好消息
+                cached = self.image_cache.get(self.current_image_path)
+            success = self.zoomable_image.set_image(
+                self.current_image_path, image=cached
+            )
             if success:
+                if cached is None and self.zoomable_image.original_image is not None:
+                    self.image_cache.put(
+                        self.current_image_path, self.zoomable_image.original_image
+                    )
+                if self.docx_source is None:
+                    self.prefetch_neighbours()
+
                 # 设置默认缩放为50%
                 self.zoomable_image.scale = 0.5
                 self.zoomable_image.update_image()
@@ -979,6 +2087,29 @@ class WordImageExtractorApp:
         else:
             self.show_completion_message()
 
+    def load_document_image(self, image_file):
+        """从文档中解码一张图片，失败返回 None"""
+        try:
+            return load_image(io.BytesIO(self.docx_source.read(image_file)))
+        except Exception as e:
+            print(f"图片加载错误: {e}")
+            return None
+
+    def neighbour_paths(self):
+        """当前图片前后会被预读的图片路径"""
+        if self.docx_source is not None:
+            return []
+        folder_path = self.image_folder_path.get()
+        first = max(0, self.current_index - self.prefetcher.behind)
+        last = self.current_index + self.prefetcher.ahead + 1
+        return [os.path.join(folder_path, f) for f in self.image_files[first:last]]
+
+    def prefetch_neighbours(self):
+        """在后台预读当前图片前后的图片"""
+        folder_path = self.image_folder_path.get()
+        paths = [os.path.join(folder_path, f) for f in self.image_files]
+        self.prefetcher.prefetch_around(paths, self.current_index)
+
     def clear_file_info(self):
         """清空文件信息显示"""
         self.name_var.set("")
@@ -999,6 +2130,12 @@ class WordImageExtractorApp:
             self.zoomable_image.show_message("无图片可显示")
         self.clear_file_info()
 
+    def select_image(self, index):
+        """点击缩略图跳转到对应图片"""
+        if 0 <= index < len(self.image_files):
+            self.current_index = index
+            self.show_image()
+
     def previous_image(self):
         if self.image_files:
             if self.current_index > 0:
@@ -1024,50 +2161,400 @@ class WordImageExtractorApp:
             messagebox.showwarning("警告", "没有可重命名的图片")
             return
 
+        if self.current_image_path in self.zoomable_image.pending_paths:
+            messagebox.showwarning("警告", "图片正在保存，请稍后再重命名")
+            return
+
+        folder_path = self.image_folder_path.get()
+        old_name = self.image_files[self.current_index]
+
+        try:
+            if self.docx_source is not None and old_name in self.docx_source.members:
+                # 文档中的图片改名时才写入输出文件夹
+                new_name = self.rename_document_image(old_name)
+            else:
+                new_name = rename_image(folder_path, old_name, self.name_var.get())
+        except (ValueError, FileExistsError) as e:
+            messagebox.showerror("错误", str(e))
+            return
+        except Exception as e:
+            messagebox.showerror("错误", f"重命名失败: {str(e)}")
+            return
+
+        if new_name == old_name:
+            return  # 没有变化
+
+        # 更新文件列表和当前路径
+        self.image_files[self.current_index] = new_name
+        self.current_image_path = self.image_path_for(new_name)
+        self.zoomable_image.current_image_path = self.current_image_path
+        self.thumbnail_strip.update_path(self.current_index, self.current_image_path)
+        self.status_var.set("文件名已更新")
+
+    def rename_document_image(self, old_name):
+        """把文档中的图片以新文件名写入输出文件夹，返回新文件名"""
         new_base_name = self.name_var.get().strip()
         if not new_base_name:
-            messagebox.showerror("错误", "文件名不能为空")
-            return
-
-        # 获取原文件的扩展名
-        _, ext = os.path.splitext(self.current_image_path)
-        if not ext:
-            # 如果没有扩展名，尝试检测
-            image_type = imghdr.what(self.current_image_path)
-            ext_map = {
-                "jpeg": ".jpg",
-                "jpg": ".jpg",
-                "png": ".png",
-                "bmp": ".bmp",
-                "gif": ".gif",
-                "tiff": ".tiff",
-                "webp": ".webp",
+            raise ValueError("文件名不能为空")
+        new_name = new_base_name + os.path.splitext(old_name)[1]
+        if new_name != old_name:
+            self.docx_source.extract(old_name, self.image_folder_path.get(), new_name)
+        return new_name
+
+    def template_rename(self):
+        """按模板批量重命名全部图片，顺序与当前列表一致"""
+        if not self.image_files:
+            messagebox.showwarning("警告", "请先加载图片")
+            return
+        if not self.require_folder():
+            return
+        template = simpledialog.askstring(
+            "模板重命名",
+            "新文件名模板（扩展名保持不变）：\n"
+            "{n} 为序号，{n:03d} 补零到3位；{name} 为原文件名\n"
+            "例如：图片_{n:03d}",
+            parent=self.root,
+        )
+        if not template:
+            return
+        try:
+            mapping = names_from_template(self.image_files, template)
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
+            return
+        self.bulk_rename(mapping)
+
+    def csv_rename(self):
+        """按CSV（原文件名, 新文件名）批量重命名"""
+        if not self.image_files:
+            messagebox.showwarning("警告", "请先加载图片")
+            return
+        if not self.require_folder():
+            return
+        csv_path = filedialog.askopenfilename(
+            title="选择重命名对照表",
+            filetypes=[("CSV文件", "*.csv"), ("所有文件", "*.*")],
+        )
+        if not csv_path:
+            return
+        try:
+            mapping = names_from_csv(csv_path, self.image_files)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("错误", f"读取对照表失败: {str(e)}")
+            return
+        self.bulk_rename(mapping)
+
+    def bulk_rename(self, mapping):
+        """以事务方式执行批量重命名，完成后一次性更新列表"""
+        folder_path = self.image_folder_path.get()
+        changed = {old: new for old, new in mapping.items() if old != new}
+        if not changed:
+            self.status_var.set("文件名没有变化")
+            return
+        pending = self.zoomable_image.pending_paths
+        if any(os.path.join(folder_path, name) in pending for name in changed):
+            messagebox.showwarning("警告", "有图片正在保存，请稍后再重命名")
+            return
+        if not messagebox.askyesno("批量重命名", f"将重命名 {len(changed)} 个文件，是否继续？"):
+            return
+
+        try:
+            renamed = apply_renames(folder_path, mapping)
+        except (ValueError, OSError) as e:
+            messagebox.showerror("错误", f"批量重命名失败，未做任何修改: {str(e)}")
+            return
+
+        # 按映射更新列表、当前路径与缩略图，不重新扫描文件夹
+        self.image_files = [renamed.get(name, name) for name in self.image_files]
+        self.thumbnail_strip.rename_paths(
+            {
+                os.path.join(folder_path, old): os.path.join(folder_path, new)
+                for old, new in renamed.items()
             }
-            ext = ext_map.get(image_type, ".png")
+        )
+        if 0 <= self.current_index < len(self.image_files):
+            image_file = self.image_files[self.current_index]
+            self.current_image_path = os.path.join(folder_path, image_file)
+            self.zoomable_image.current_image_path = self.current_image_path
+            base_name, ext = os.path.splitext(image_file)
+            self.name_var.set(base_name)
+            self.ext_var.set(ext)
+        self.status_var.set(f"已重命名 {len(renamed)} 个文件")
+
+    def on_image_path_changed(self, path):
+        """裁剪后当前图片切换为新文件（可能仍在后台写入）"""
+        self.current_image_path = path
+        base_name, ext = os.path.splitext(os.path.basename(path))
+        self.name_var.set(base_name)
+        self.ext_var.set(ext)
+
+    def poll_writes(self):
+        """在Tk线程中处理后台写盘完成或失败的通知"""
+        while True:
+            result = self.zoomable_image.take_write_result()
+            if result is None:
+                break
+            status, (kind, source_path), path, value = result
+            if status == "failed":
+                self.status_var.set("保存失败")
+                messagebox.showerror(
+                    "错误", f"保存 {os.path.basename(path)} 失败: {str(value)}"
+                )
+            elif kind == "crop":
+                self.finish_crop_write(source_path, path)
+            elif kind == "orientation":
+                self.status_var.set(f"已保存 {os.path.basename(path)}")
+                self.refresh_thumbnail(path)
+            else:
+                self.finish_compress_write(path, value)
+        self.root.after(100, self.poll_writes)
 
-        new_name = new_base_name + ext
+    def refresh_thumbnail(self, path):
+        folder_path = self.image_folder_path.get()
+        if os.path.dirname(path) == folder_path:
+            name = os.path.basename(path)
+            if name in self.image_files:
+                self.thumbnail_strip.refresh_path(self.image_files.index(name))
+
+    def finish_crop_write(self, source_path, path):
+        """裁剪结果写完后加入图片列表，排在原图之后"""
+        self.status_var.set(f"已保存 {os.path.basename(path)}")
         folder_path = self.image_folder_path.get()
-        new_path = os.path.join(folder_path, new_name)
+        name = os.path.basename(path)
+        if os.path.dirname(path) != folder_path or name in self.image_files:
+            return
 
-        if self.current_image_path == new_path:
-            return  # 没有变化
+        source_name = os.path.basename(source_path)
+        if source_name in self.image_files:
+            index = self.image_files.index(source_name) + 1
+        else:
+            index = len(self.image_files)
+        self.image_files.insert(index, name)
+        self.thumbnail_strip.insert_path(index, path)
+
+        if self.current_image_path == path:
+            # 仍在查看裁剪结果：它已在内存中，直接放入缓存
+            self.current_index = index
+            self.image_cache.set_focus(path, self.neighbour_paths())
+            if self.zoomable_image.original_image is not None:
+                self.image_cache.put(path, self.zoomable_image.original_image)
+            self.thumbnail_strip.set_current(index)
+        elif self.current_index >= index:
+            self.current_index += 1
+
+    def finish_compress_write(self, path, result):
+        """后台压缩写完后显示结果"""
+        message = f"图片已压缩并保存为:\n{os.path.basename(path)}"
+        if result:
+            message += (
+                f"\n\n大小: {result['bytes'] / 1024:.1f} KB"
+                f"，质量: {result['quality'] or '-'}"
+                f"，缩放: {result['scale']:.0%}"
+                f"，编码 {result['encodes']} 次"
+            )
+            if not result["fits"]:
+                message += "\n已达到最低质量和最小尺寸，仍超出目标大小"
+        self.status_var.set(f"已保存 {os.path.basename(path)}")
+        messagebox.showinfo("成功", message)
 
+    def apply_memory_limit(self, event=None):
+        """应用用户设置的内存上限，并立即淘汰超出的部分"""
         try:
-            # 检查新文件名是否已存在
-            if os.path.exists(new_path):
-                messagebox.showerror("错误", "文件名已存在")
+            limit_mb = int(self.memory_limit_var.get())
+            if limit_mb < 64:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("错误", "内存上限必须是不小于 64 的整数（MB）")
+            self.memory_limit_var.set(str(self.memory_budget.limit // (1024 * 1024)))
+            return
+
+        self.memory_budget.limit = limit_mb * 1024 * 1024
+        # 大图放大查看保留的数据不超过上限的一半，对之后打开的大图生效
+        self.zoomable_image.large_image_budget = min(
+            DEFAULT_MEMORY_BUDGET, self.memory_budget.limit // 2
+        )
+        self.memory_budget.enforce()
+        self.update_memory_usage()
+
+    def update_memory_usage(self):
+        budget = self.memory_budget
+        self.memory_usage_var.set(
+            f"已用 {budget.current_bytes / (1024 * 1024):.0f} MB"
+            f" / {budget.limit / (1024 * 1024):.0f} MB"
+        )
+
+    def poll_memory(self):
+        """定期执行内存预算（同时为预留失败的后台预读腾出空间）并刷新占用显示"""
+        self.memory_budget.enforce()
+        self.update_memory_usage()
+        self.root.after(1000, self.poll_memory)
+
+    def on_close(self):
+        """关闭窗口前等待后台写盘完成，避免留下不完整的文件"""
+        if self.zoomable_image.pending_paths:
+            self.status_var.set("正在等待保存完成...")
+            self.root.update_idletasks()
+            self.zoomable_image.writer.wait()
+        self.close_document()
+        self.root.destroy()
+
+    def save_orientation(self):
+        """把旋转和翻转写回当前图片文件"""
+        if not self.current_image_path:
+            messagebox.showwarning("警告", "没有可保存的图片")
+            return
+
+        if self.zoomable_image.save_orientation():
+            self.thumbnail_strip.refresh_path(self.current_index)
+        else:
+            messagebox.showerror("错误", "保存旋转失败")
+
+    def batch_compress_images(self):
+        """在后台进程池中压缩已加载的全部图片，结果写入 compressed 子文件夹"""
+        if self.compression_job is not None:
+            return
+        if not self.image_files:
+            messagebox.showwarning("警告", "请先加载图片")
+            return
+        if not self.require_folder():
+            return
+
+        folder_path = self.image_folder_path.get()
+        output_folder = os.path.join(folder_path, "compressed")
+        image_paths = [os.path.join(folder_path, f) for f in self.image_files]
+        output_format = BATCH_FORMAT_CHOICES.get(self.batch_format_var.get(), "keep")
+
+        self.compression_job = BatchCompressionJob(
+            image_paths, output_folder, output_format=output_format
+        )
+        self.batch_compress_button.config(state=tk.DISABLED)
+        self.cancel_compress_button.config(state=tk.NORMAL)
+        self.status_var.set(f"0/{len(image_paths)}")
+        self.compression_job.start()
+        self.root.after(50, self.poll_compression)
+
+    def cancel_compression(self):
+        """取消正在进行的批量压缩，已开始的图片会完整写完"""
+        if self.compression_job is not None:
+            self.compression_job.cancel()
+            self.status_var.set("正在取消...")
+
+    def poll_compression(self):
+        """处理后台批量压缩汇报的进度"""
+        job = self.compression_job
+        if job is None:
+            return
+
+        while True:
+            try:
+                message = job.progress.get_nowait()
+            except queue.Empty:
+                self.root.after(50, self.poll_compression)
                 return
 
-            # 重命名文件
-            os.rename(self.current_image_path, new_path)
+            if message[0] == "progress":
+                _, done, total = message
+                if not job.cancel_event.is_set():
+                    self.status_var.set(f"{done}/{total}")
+            else:
+                _, summaries, cancelled, error = message
+                self.finish_batch_compression(job, summaries, cancelled, error)
+                return
+
+    def finish_batch_compression(self, job, summaries, cancelled, error):
+        """批量压缩结束后恢复界面并显示汇总"""
+        self.compression_job = None
+        self.batch_compress_button.config(state=tk.NORMAL)
+        self.cancel_compress_button.config(state=tk.DISABLED)
+
+        if error is not None:
+            self.status_var.set("批量压缩失败")
+            messagebox.showerror("错误", f"批量压缩失败: {str(error)}")
+            return
+
+        totals = job.totals
+        saved_mb = totals["saved_bytes"] / (1024 * 1024)
+        if cancelled:
+            self.status_var.set("已取消")
+            title = "批量压缩已取消"
+            processed = f"已处理 {totals['images']}/{len(job.image_paths)} 张"
+        else:
+            self.status_var.set(f"节省 {saved_mb:.1f} MB")
+            title = "批量压缩完成"
+            processed = f"共 {totals['images']} 张"
+        message = (
+            f"{processed}，写出 {totals['written']} 张，"
+            f"跳过 {totals['skipped']} 张（压缩后不更小），失败 {totals['failed']} 张\n"
+            f"节省 {saved_mb:.2f} MB，耗时 {totals['seconds']} 秒"
+            f"（{totals['images_per_second']} 张/秒）\n\n输出文件夹: {job.output_folder}"
+        )
+        failed = [summary for summary in summaries if summary["error"]]
+        if failed:
+            details = "\n".join(
+                f"{os.path.basename(s['source'])}: {s['error']}" for s in failed[:10]
+            )
+            messagebox.showwarning(title, f"{message}\n\n失败的图片:\n{details}")
+        else:
+            messagebox.showinfo(title, message)
+
+    def update_document(self):
+        """把编辑过的图片写回文档，在后台生成新的 .docx"""
+        word_file = self.word_file_path.get()
+        folder_path = self.image_folder_path.get()
+        if not word_file or not folder_path:
+            messagebox.showerror("错误", "请先选择 Word 文件和图片文件夹")
+            return
+        if self.document_update is not None:
+            messagebox.showwarning("警告", "正在更新文档，请稍候")
+            return
+        if self.zoomable_image.pending_paths:
+            messagebox.showwarning("警告", "有图片正在保存，请稍后再更新文档")
+            return
 
-            # 更新文件列表和当前路径
-            self.image_files[self.current_index] = new_name
-            self.current_image_path = new_path
+        default_path = updated_docx_path_for(word_file)
+        output_path = filedialog.asksaveasfilename(
+            title="保存更新后的文档",
+            initialdir=os.path.dirname(default_path),
+            initialfile=os.path.basename(default_path),
+            defaultextension=".docx",
+            filetypes=[("Word 文件", "*.docx")],
+        )
+        if not output_path:
+            return
 
-            messagebox.showinfo("成功", "文件名已更新")
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.document_update = executor.submit(
+            update_docx_from_folder, word_file, folder_path, output_path
+        )
+        executor.shutdown(wait=False)
+        self.status_var.set("正在更新文档...")
+        self.root.after(100, self.poll_document_update)
+
+    def poll_document_update(self):
+        """文档生成完成后显示结果"""
+        future = self.document_update
+        if not future.done():
+            self.root.after(100, self.poll_document_update)
+            return
+        self.document_update = None
+
+        try:
+            summary = future.result()
         except Exception as e:
-            messagebox.showerror("错误", f"重命名失败: {str(e)}")
+            self.status_var.set("更新文档失败")
+            messagebox.showerror("错误", f"更新文档失败: {str(e)}")
+            return
+
+        self.status_var.set(f"已替换 {summary['replaced']} 张图片")
+        message = (
+            f"已替换 {summary['replaced']} 张图片，保存为:\n{summary['output']}\n\n"
+            f"大小: {summary['bytes_before'] / (1024 * 1024):.2f} MB -> "
+            f"{summary['bytes_after'] / (1024 * 1024):.2f} MB"
+        )
+        if summary["skipped"]:
+            details = "\n".join(reason for _, reason in summary["skipped"][:10])
+            message += f"\n\n跳过的图片:\n{details}"
+        messagebox.showinfo("完成", message)
 
     def compress_current_image(self):
         """压缩当前图片"""
@@ -1075,11 +2562,25 @@ class WordImageExtractorApp:
             messagebox.showwarning("警告", "没有可压缩的图片")
             return
 
+        target_text = self.target_size_var.get().strip()
+        target_bytes = None
+        if target_text:
+            try:
+                target_bytes = int(float(target_text) * 1024)
+            except ValueError:
+                target_bytes = 0
+            if target_bytes <= 0:
+                messagebox.showerror("错误", "目标大小必须是正数（单位KB）")
+                return
+
         try:
-            compressed_path = self.zoomable_image.compress_image()
+            # 编码在后台进行，完成后由 poll_writes 显示结果
+            compressed_path = self.zoomable_image.compress_image(
+                target_bytes=target_bytes
+            )
             if compressed_path:
-                messagebox.showinfo(
-                    "成功", f"图片已压缩并保存为:\n{os.path.basename(compressed_path)}"
+                self.status_var.set(
+                    f"正在压缩 {os.path.basename(compressed_path)}..."
                 )
             else:
                 messagebox.showerror("错误", "图片压缩失败")
@@ -1088,6 +2589,7 @@ class WordImageExtractorApp:
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # 打包为exe后进程池需要
     root = tk.Tk()
     app = WordImageExtractorApp(root)
     root.mainloop()
@@ -0,0 +1,226 @@
+"""非破坏性的图片编辑记录
+
+旋转与翻转合并为一个二面体变换（先水平翻转、再逆时针旋转 k 个90°），
+裁剪记录为原图坐标系中的矩形。编辑过程中只对预览图应用，保存时才对
+全分辨率原图应用一次
+"""
+
+from PIL import Image
+
+# (是否水平翻转, 逆时针旋转的90°次数) -> 等价的单次 transpose 操作
+TRANSPOSE_METHODS = {
+    (False, 0): None,
+    (False, 1): Image.Transpose.ROTATE_90,
+    (False, 2): Image.Transpose.ROTATE_180,
+    (False, 3): Image.Transpose.ROTATE_270,
+    (True, 0): Image.Transpose.FLIP_LEFT_RIGHT,
+    (True, 1): Image.Transpose.TRANSPOSE,
+    (True, 2): Image.Transpose.FLIP_TOP_BOTTOM,
+    (True, 3): Image.Transpose.TRANSVERSE,
+}
+
+
+def _map_point(x, y, size, flip, turns):
+    """把裁剪后图像上的点映射到变换后的图像上，返回 (x, y, 变换后的尺寸)"""
+    width, height = size
+    if flip:
+        x = width - x
+    for _ in range(turns):
+        # 逆时针旋转90°：(x, y) -> (y, w - x)，宽高互换
+        x, y = y, width - x
+        width, height = height, width
+    return x, y, (width, height)
+
+
+def _map_box(box, size, flip, turns):
+    left, top, right, bottom = box
+    x1, y1, new_size = _map_point(left, top, size, flip, turns)
+    x2, y2, _ = _map_point(right, bottom, size, flip, turns)
+    return (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)), new_size
+
+
+class EditPipeline:
+    """记录对一张图片的编辑：原图坐标下的裁剪框 + 一个合成后的二面体变换"""
+
+    def __init__(self, source_size):
+        self.source_size = source_size
+        self.crop_box = None  # 原图坐标 (left, top, right, bottom)，None 表示不裁剪
+        self.flip = False
+        self.turns = 0
+
+    def copy(self):
+        pipeline = EditPipeline(self.source_size)
+        pipeline.crop_box = self.crop_box
+        pipeline.flip = self.flip
+        pipeline.turns = self.turns
+        return pipeline
+
+    @property
+    def is_identity(self):
+        return self.crop_box is None and not self.flip and self.turns == 0
+
+    @property
+    def transpose_method(self):
+        return TRANSPOSE_METHODS[(self.flip, self.turns)]
+
+    def cropped_size(self):
+        if self.crop_box is None:
+            return self.source_size
+        left, top, right, bottom = self.crop_box
+        return (right - left, bottom - top)
+
+    def output_size(self):
+        """应用全部编辑后的图像尺寸"""
+        width, height = self.cropped_size()
+        return (height, width) if self.turns % 2 else (width, height)
+
+    def reset(self):
+        """撤销全部编辑"""
+        self.crop_box = None
+        self.flip = False
+        self.turns = 0
+
+    def rotate(self, angle):
+        """逆时针旋转 angle 度（与 Image.rotate 的方向一致），只支持90°的整数倍"""
+        if angle % 90:
+            raise ValueError("只支持90°整数倍的旋转")
+        self.turns = (self.turns + angle // 90) % 4
+
+    def flip_horizontal(self):
+        # 水平翻转 H 满足 H·R(k) = R(-k)·H
+        self.flip = not self.flip
+        self.turns = -self.turns % 4
+
+    def flip_vertical(self):
+        # 垂直翻转等于水平翻转后再旋转180°
+        self.flip_horizontal()
+        self.turns = (self.turns + 2) % 4
+
+    def _cropped_box(self, box):
+        """把编辑后图像上的矩形换算为裁剪后（变换前）图像上的坐标"""
+        # 二面体变换的逆变换：翻转是自身的逆，旋转取反方向
+        inverse_flip = self.flip
+        inverse_turns = self.turns if self.flip else -self.turns % 4
+        local_box, _ = _map_box(box, self.output_size(), inverse_flip, inverse_turns)
+        return local_box
+
+    def source_box(self, box):
+        """把编辑后图像上的矩形换算为原图坐标"""
+        left, top, right, bottom = self._cropped_box(box)
+        offset_x, offset_y = (self.crop_box or (0, 0, 0, 0))[:2]
+        return (offset_x + left, offset_y + top, offset_x + right, offset_y + bottom)
+
+    def output_box(self, box):
+        """把原图坐标的矩形换算为编辑后图像上的坐标（source_box 的逆运算）"""
+        offset_x, offset_y = (self.crop_box or (0, 0, 0, 0))[:2]
+        left, top, right, bottom = box
+        local_box = (
+            left - offset_x,
+            top - offset_y,
+            right - offset_x,
+            bottom - offset_y,
+        )
+        output_box, _ = _map_box(local_box, self.cropped_size(), self.flip, self.turns)
+        return output_box
+
+    def then(self, other):
+        """返回先应用本编辑、再应用 other 的等价编辑记录（other 作用于本编辑的输出）"""
+        combined = self.copy()
+        if other.crop_box is not None:
+            left, top, right, bottom = self.source_box(other.crop_box)
+            combined.crop_box = (
+                int(round(left)),
+                int(round(top)),
+                int(round(right)),
+                int(round(bottom)),
+            )
+        if other.flip:
+            combined.flip_horizontal()
+        combined.rotate(other.turns * 90)
+        return combined
+
+    def crop(self, box):
+        """按当前显示（已变换）坐标裁剪，换算为原图坐标后记录"""
+        local_box = self._cropped_box(box)
+
+        offset_x, offset_y = (self.crop_box or (0, 0, 0, 0))[:2]
+        width, height = self.cropped_size()
+        left, top, right, bottom = (int(round(v)) for v in local_box)
+        left, right = max(0, left), min(width, right)
+        top, bottom = max(0, top), min(height, bottom)
+        self.crop_box = (
+            offset_x + left,
+            offset_y + top,
+            offset_x + right,
+            offset_y + bottom,
+        )
+
+    def apply(self, image, ratio=1.0):
+        """对图片应用全部编辑；ratio 为 image 相对原图的缩小比例（用于预览图）"""
+        if self.crop_box is not None:
+            left, top, right, bottom = self.crop_box
+            if ratio != 1.0:
+                left, top = int(left * ratio), int(top * ratio)
+                right = max(left + 1, int(round(right * ratio)))
+                bottom = max(top + 1, int(round(bottom * ratio)))
+            image = image.crop((left, top, right, bottom))
+        method = self.transpose_method
+        if method is not None:
+            image = image.transpose(method)
+        return image
+
+
+class EditHistory:
+    """编辑操作日志，支持多级撤销/重做
+
+    只记录操作名和参数（如 ("rotate", 90)），需要时从头重放得到编辑状态；
+    编辑状态本身只有几个数字，因此不需要保存任何图片副本或检查点
+    """
+
+    OPERATIONS = ("rotate", "flip_horizontal", "flip_vertical", "crop", "reset")
+
+    def __init__(self, source_size):
+        self.source_size = source_size
+        self.operations = []
+        self.position = 0  # 已生效的操作数，之后的为可重做的操作
+
+    def record(self, name, *args):
+        """记录一个新操作，会丢弃所有可重做的操作"""
+        if name not in self.OPERATIONS:
+            raise ValueError(f"未知的编辑操作: {name}")
+        del self.operations[self.position :]
+        self.operations.append((name, args))
+        self.position += 1
+
+    def last(self):
+        """最近生效的一个操作，没有时返回 None"""
+        return self.operations[self.position - 1] if self.position else None
+
+    def discard(self, operation):
+        """去掉最近生效的操作（其结果已另存为新文件）；之后又有变化时不做处理"""
+        if operation is not None and self.last() is operation:
+            del self.operations[self.position - 1 :]
+            self.position -= 1
+
+    def can_undo(self):
+        return self.position > 0
+
+    def can_redo(self):
+        return self.position < len(self.operations)
+
+    def undo(self):
+        if self.can_undo():
+            self.position -= 1
+        return self.pipeline()
+
+    def redo(self):
+        if self.can_redo():
+            self.position += 1
+        return self.pipeline()
+
+    def pipeline(self):
+        """重放已生效的操作，返回对应的编辑记录"""
+        pipeline = EditPipeline(self.source_size)
+        for name, args in self.operations[: self.position]:
+            getattr(pipeline, name)(*args)
+        return pipeline
@@ -0,0 +1,293 @@
+"""只读取文件头的图片元数据探测
+
+识别 JPEG/PNG/GIF/BMP/TIFF/WebP，返回格式、像素尺寸、颜色模式和EXIF方向，
+不解码像素、不依赖 Pillow，可用于磁盘文件，也可用于zip成员等内存中的字节
+"""
+
+import io
+import os
+import struct
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# format 与 imghdr 的类型名一致；尺寸等信息不在已读取的前缀中时为 None
+ImageInfo = namedtuple("ImageInfo", "format width height mode orientation")
+
+# 单个文件最多读取的字节数，防止损坏文件导致无限读取
+MAX_PROBE_BYTES = 1024 * 1024
+# 只读取一段固定前缀时使用的长度
+PREFIX_BYTES = 64 * 1024
+
+EXIF_ORIENTATION_TAG = 274
+
+# 带有图像尺寸的JPEG帧起始标记（SOF0-SOF15，除去 DHT/JPG/DAC）
+JPEG_SOF_MARKERS = {
+    0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+    0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF,
+}  # fmt: skip
+
+
+class _Reader:
+    """在文件对象上按需读取，统计并限制总读取量"""
+
+    def __init__(self, fp, limit=MAX_PROBE_BYTES):
+        self.fp = fp
+        self.limit = limit
+        self.consumed = 0
+
+    def read(self, size):
+        size = max(0, min(size, self.limit - self.consumed))
+        data = self.fp.read(size)
+        self.consumed += len(data)
+        return data
+
+    def skip(self, size):
+        """跳过 size 字节，文件对象支持 seek 时不实际读取"""
+        if size <= 0:
+            return True
+        if self.consumed + size > self.limit:
+            return False
+        try:
+            self.fp.seek(size, os.SEEK_CUR)
+            self.consumed += size
+            return True
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            return len(self.read(size)) == size
+
+
+def _tiff_tags(data, wanted):
+    """解析内存中TIFF结构第一个IFD里的指定标签，返回 {标签: 值}"""
+    if data[:4] == b"II*\x00":
+        endian = "<"
+    elif data[:4] == b"MM\x00*":
+        endian = ">"
+    else:
+        return {}
+
+    (ifd_offset,) = struct.unpack_from(endian + "I", data, 4)
+    if ifd_offset + 2 > len(data):
+        return {}
+    (count,) = struct.unpack_from(endian + "H", data, ifd_offset)
+
+    tags = {}
+    for i in range(count):
+        pos = ifd_offset + 2 + i * 12
+        if pos + 12 > len(data):
+            break
+        tag, field_type, _ = struct.unpack_from(endian + "HHI", data, pos)
+        if tag not in wanted:
+            continue
+        # 只处理值直接存放在条目中的 SHORT/LONG
+        if field_type == 3:
+            (value,) = struct.unpack_from(endian + "H", data, pos + 8)
+        elif field_type == 4:
+            (value,) = struct.unpack_from(endian + "I", data, pos + 8)
+        else:
+            continue
+        tags[tag] = value
+    return tags
+
+
+def _probe_jpeg(reader):
+    orientation = 1
+    while True:
+        byte = reader.read(1)
+        if not byte:
+            break
+        if byte != b"\xff":
+            continue
+        marker = reader.read(1)
+        # 跳过填充字节 0xFF
+        while marker == b"\xff":
+            marker = reader.read(1)
+        if not marker:
+            break
+        marker = marker[0]
+        if marker == 0xD8 or marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            continue  # 无长度字段的独立标记
+        if marker == 0xD9 or marker == 0xDA:
+            break  # 图像结束或扫描数据开始，之后不再有帧头
+
+        length_bytes = reader.read(2)
+        if len(length_bytes) < 2:
+            break
+        (length,) = struct.unpack(">H", length_bytes)
+        if length < 2:
+            break
+
+        if marker in JPEG_SOF_MARKERS:
+            segment = reader.read(min(length - 2, 6))
+            if len(segment) < 6:
+                break
+            height, width, components = struct.unpack(">HHB", segment[1:6])
+            mode = {1: "L", 3: "RGB", 4: "CMYK"}.get(components)
+            return ImageInfo("jpeg", width, height, mode, orientation)
+
+        if marker == 0xE1:
+            segment = reader.read(length - 2)
+            if segment[:6] == b"Exif\x00\x00":
+                try:
+                    tags = _tiff_tags(segment[6:], {EXIF_ORIENTATION_TAG})
+                except struct.error:
+                    tags = {}
+                orientation = tags.get(EXIF_ORIENTATION_TAG, orientation)
+        elif not reader.skip(length - 2):
+            break
+
+    return ImageInfo("jpeg", None, None, None, orientation)
+
+
+def _probe_png(header):
+    if len(header) < 26 or header[12:16] != b"IHDR":
+        return ImageInfo("png", None, None, None, 1)
+    width, height, bit_depth, color_type = struct.unpack(">IIBB", header[16:26])
+    if color_type == 0:
+        mode = "1" if bit_depth == 1 else "I;16" if bit_depth == 16 else "L"
+    else:
+        mode = {2: "RGB", 3: "P", 4: "LA", 6: "RGBA"}.get(color_type)
+    return ImageInfo("png", width, height, mode, 1)
+
+
+def _probe_gif(header):
+    if len(header) < 10:
+        return ImageInfo("gif", None, None, None, 1)
+    width, height = struct.unpack("<HH", header[6:10])
+    return ImageInfo("gif", width, height, "P", 1)
+
+
+def _probe_bmp(header):
+    if len(header) < 26:
+        return ImageInfo("bmp", None, None, None, 1)
+    (dib_size,) = struct.unpack("<I", header[14:18])
+    if dib_size == 12:
+        width, height, _, bits = struct.unpack("<HHHH", header[18:26])
+    elif len(header) >= 30:
+        width, height, _, bits = struct.unpack("<iiHH", header[18:30])
+    else:
+        return ImageInfo("bmp", None, None, None, 1)
+    mode = "P" if bits <= 8 else "RGB"
+    return ImageInfo("bmp", width, abs(height), mode, 1)
+
+
+def _probe_webp(header):
+    chunk = header[12:16]
+    if chunk == b"VP8X" and len(header) >= 30:
+        alpha = header[20] & 0x10
+        width = int.from_bytes(header[24:27], "little") + 1
+        height = int.from_bytes(header[27:30], "little") + 1
+        return ImageInfo("webp", width, height, "RGBA" if alpha else "RGB", 1)
+    if chunk == b"VP8 " and len(header) >= 30 and header[23:26] == b"\x9d\x01\x2a":
+        width, height = struct.unpack("<HH", header[26:30])
+        return ImageInfo("webp", width & 0x3FFF, height & 0x3FFF, "RGB", 1)
+    if chunk == b"VP8L" and len(header) >= 25 and header[20] == 0x2F:
+        (bits,) = struct.unpack("<I", header[21:25])
+        width = (bits & 0x3FFF) + 1
+        height = ((bits >> 14) & 0x3FFF) + 1
+        alpha = (bits >> 28) & 1
+        return ImageInfo("webp", width, height, "RGBA" if alpha else "RGB", 1)
+    return ImageInfo("webp", None, None, None, 1)
+
+
+def _probe_tiff(reader, header):
+    # 第一个IFD通常紧跟文件头，读入一段足够长的前缀即可
+    data = header + reader.read(PREFIX_BYTES - len(header))
+    try:
+        tags = _tiff_tags(data, {256, 257, 258, 262, 277, EXIF_ORIENTATION_TAG})
+    except struct.error:
+        tags = {}
+    photometric = tags.get(262)
+    samples = tags.get(277, 1)
+    bits = tags.get(258, 8)
+    if photometric in (0, 1):
+        mode = "1" if bits == 1 else "I;16" if bits == 16 else "L"
+    elif photometric in (2, 6):
+        mode = "RGBA" if samples == 4 else "RGB"
+    else:
+        mode = {3: "P", 5: "CMYK"}.get(photometric)
+    return ImageInfo(
+        "tiff",
+        tags.get(256),
+        tags.get(257),
+        mode,
+        tags.get(EXIF_ORIENTATION_TAG, 1),
+    )
+
+
+class _ChainedStream:
+    """先返回已读取的前缀，再继续读取底层文件对象"""
+
+    def __init__(self, prefix, fp):
+        self.prefix = prefix
+        self.fp = fp
+
+    def read(self, size):
+        if self.prefix:
+            data, self.prefix = self.prefix[:size], self.prefix[size:]
+            if len(data) < size:
+                data += self.fp.read(size - len(data))
+            return data
+        return self.fp.read(size)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence != os.SEEK_CUR:
+            raise io.UnsupportedOperation("只支持相对跳转")
+        if offset <= len(self.prefix):
+            self.prefix = self.prefix[offset:]
+            return
+        offset -= len(self.prefix)
+        self.prefix = b""
+        self.fp.seek(offset, os.SEEK_CUR)
+
+
+def probe_stream(fp, limit=MAX_PROBE_BYTES):
+    """从文件对象当前位置探测图片信息，不是支持的图片格式时返回 None"""
+    reader = _Reader(fp, limit)
+    header = reader.read(32)
+
+    if header[:3] == b"\xff\xd8\xff":
+        # 已读取的文件头需要重新交给JPEG段解析
+        return _probe_jpeg(_Reader(_ChainedStream(header[2:], fp), limit))
+    if header[:8] == b"\x89PNG\r\n\x1a\n":
+        return _probe_png(header)
+    if header[:6] in (b"GIF87a", b"GIF89a"):
+        return _probe_gif(header)
+    if header[:2] == b"BM":
+        return _probe_bmp(header)
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return _probe_webp(header)
+    if header[:4] in (b"II*\x00", b"MM\x00*"):
+        return _probe_tiff(reader, header)
+    return None
+
+
+def probe_bytes(data):
+    """探测内存中图片数据（可以只是文件头前缀）的信息"""
+    return probe_stream(io.BytesIO(data))
+
+
+def probe_file(path):
+    """探测磁盘上图片文件的信息，不是支持的图片格式时返回 None"""
+    with open(path, "rb") as fp:
+        return probe_stream(fp)
+
+
+# probe_files 中读取失败（而不是格式不支持）的文件的结果，调用方不应缓存
+PROBE_FAILED = object()
+
+
+def probe_files(paths, max_workers=8):
+    """批量探测多个文件，返回与 paths 顺序一致的结果列表
+
+    不是支持的图片格式时为 None，读取失败（如网络共享暂时不可用）时为 PROBE_FAILED
+    """
+
+    def safe_probe(path):
+        try:
+            return probe_file(path)
+        except OSError:
+            return PROBE_FAILED
+
+    if len(paths) < 2:
+        return [safe_probe(path) for path in paths]
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(safe_probe, paths))
@@ -0,0 +1,185 @@
+"""通过EXIF方向标记无损旋转/翻转JPEG
+
+只改写文件头中的 Orientation 标签（通常是原地修改2个字节），不解码也不重新
+编码像素数据；文件中没有该标签时才重写一次文件头，像素数据按原样流式复制
+"""
+
+import os
+import shutil
+import struct
+
+from image_probe import EXIF_ORIENTATION_TAG, probe_file
+from picture_tools import temp_path_for
+
+# EXIF方向值 -> 显示时对存储的像素做的变换 (是否水平翻转, 逆时针旋转的90°次数)，
+# 与 image_edits.EditPipeline 的表示一致
+ORIENTATION_TRANSFORMS = {
+    1: (False, 0),
+    2: (True, 0),
+    3: (False, 2),
+    4: (True, 2),
+    5: (True, 1),
+    6: (False, 3),
+    7: (True, 3),
+    8: (False, 1),
+}
+TRANSFORM_ORIENTATIONS = {v: k for k, v in ORIENTATION_TRANSFORMS.items()}
+
+# APP1 段的最大数据长度（段长度字段为16位且包含自身的2个字节）
+MAX_SEGMENT_DATA = 65533
+
+
+def compose_orientation(orientation, flip=False, turns=0):
+    """在已有方向上再做一次变换（先水平翻转、再逆时针旋转 turns 个90°），返回新的方向值"""
+    current_flip, current_turns = ORIENTATION_TRANSFORMS.get(orientation, (False, 0))
+    if flip:
+        # 与 EditPipeline.flip_horizontal 相同：H·R(k) = R(-k)·H
+        current_flip = not current_flip
+        current_turns = -current_turns % 4
+    return TRANSFORM_ORIENTATIONS[(current_flip, (current_turns + turns) % 4)]
+
+
+def _scan_segments(fp):
+    """列出扫描数据之前的所有标记段，返回 [(标记, 段起始偏移, 段总长度)]"""
+    if fp.read(2) != b"\xff\xd8":
+        raise ValueError("不是JPEG文件")
+
+    segments = []
+    while True:
+        start = fp.tell()
+        byte = fp.read(1)
+        if byte != b"\xff":
+            raise ValueError("JPEG文件头已损坏")
+        marker = fp.read(1)
+        # 跳过填充字节 0xFF
+        while marker == b"\xff":
+            start += 1
+            marker = fp.read(1)
+        if not marker:
+            raise ValueError("JPEG文件头不完整")
+        marker = marker[0]
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            continue  # 无长度字段的独立标记
+        if marker in (0xD9, 0xDA):
+            return segments
+
+        length_bytes = fp.read(2)
+        if len(length_bytes) < 2:
+            raise ValueError("JPEG文件头不完整")
+        (length,) = struct.unpack(">H", length_bytes)
+        segments.append((marker, start, length + 2))
+        fp.seek(start + 2 + length)
+
+
+def _read_exif(fp, segments):
+    """找到 Exif APP1 段，返回 (段信息, TIFF数据, TIFF数据在文件中的偏移)"""
+    for segment in segments:
+        marker, start, size = segment
+        if marker != 0xE1:
+            continue
+        fp.seek(start + 4)
+        data = fp.read(size - 4)
+        if data[:6] == b"Exif\x00\x00":
+            return segment, data[6:], start + 10
+    return None, None, None
+
+
+def _orientation_offset(tiff):
+    """返回第一个IFD中方向标签值在TIFF数据中的偏移与字节序，没有时返回 None"""
+    if tiff[:4] == b"II*\x00":
+        endian = "<"
+    elif tiff[:4] == b"MM\x00*":
+        endian = ">"
+    else:
+        return None
+
+    try:
+        (ifd_offset,) = struct.unpack_from(endian + "I", tiff, 4)
+        (count,) = struct.unpack_from(endian + "H", tiff, ifd_offset)
+        for i in range(count):
+            pos = ifd_offset + 2 + i * 12
+            tag, field_type, value_count = struct.unpack_from(endian + "HHI", tiff, pos)
+            if tag == EXIF_ORIENTATION_TAG and field_type == 3 and value_count == 1:
+                return pos + 8, endian
+    except struct.error:
+        pass
+    return None
+
+
+def _rewrite_header(path, segments, exif_segment, orientation):
+    """文件中没有方向标签时，替换（或插入）Exif段，其余字节原样复制"""
+    from PIL import Image
+
+    with Image.open(path) as image:
+        exif = image.getexif()
+    exif[EXIF_ORIENTATION_TAG] = orientation
+    payload = exif.tobytes()
+    if not payload.startswith(b"Exif\x00\x00"):
+        payload = b"Exif\x00\x00" + payload
+    if len(payload) > MAX_SEGMENT_DATA:
+        raise ValueError("EXIF数据过大，无法写入方向标记")
+    segment = b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload
+
+    if exif_segment is not None:
+        _, insert_at, skip = exif_segment
+    else:
+        # 放在 JFIF(APP0) 段之后，没有时紧跟文件开头的 SOI
+        insert_at = 2
+        for marker, start, size in segments:
+            if marker != 0xE0:
+                break
+            insert_at = start + size
+        skip = 0
+
+    temp_path = temp_path_for(path)
+    try:
+        with open(path, "rb") as src, open(temp_path, "wb") as dst:
+            dst.write(src.read(insert_at))
+            dst.write(segment)
+            src.seek(insert_at + skip)
+            shutil.copyfileobj(src, dst)
+        shutil.copystat(path, temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def write_orientation(path, orientation):
+    """把JPEG的EXIF方向标记设为 orientation
+
+    已有方向标签时原地改写2个字节并返回 True；否则重写文件头并返回 False
+    """
+    if orientation not in ORIENTATION_TRANSFORMS:
+        raise ValueError(f"无效的EXIF方向值: {orientation}")
+
+    with open(path, "r+b") as fp:
+        segments = _scan_segments(fp)
+        exif_segment, tiff, tiff_offset = _read_exif(fp, segments)
+        located = _orientation_offset(tiff) if tiff else None
+        if located is not None:
+            offset, endian = located
+            fp.seek(tiff_offset + offset)
+            fp.write(struct.pack(endian + "H", orientation))
+            return True
+
+    _rewrite_header(path, segments, exif_segment, orientation)
+    return False
+
+
+def transform_jpeg(path, flip=False, turns=0):
+    """无损地翻转/旋转JPEG（相对于当前显示方向），返回新的方向值"""
+    info = probe_file(path)
+    if info is None or info.format != "jpeg":
+        raise ValueError("只支持JPEG文件")
+    orientation = compose_orientation(info.orientation or 1, flip, turns)
+    write_orientation(path, orientation)
+    return orientation
+
+
+def rotate_jpeg(path, angle=0, flip_horizontal=False):
+    """先按需水平翻转，再逆时针旋转 angle 度（90°的整数倍），返回新的方向值"""
+    if angle % 90:
+        raise ValueError("只支持90°整数倍的旋转")
+    return transform_jpeg(path, flip_horizontal, angle // 90 % 4)
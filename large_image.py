@@ -0,0 +1,438 @@
+"""超大图片的按需解码
+
+只读取文件头获得尺寸，显示时解码一张不超过指定像素数的预览图：JPEG 在解码阶段
+按 1/2、1/4、1/8 缩小（draft）；由多个条带或分块组成的TIFF逐段解码并缩小，内存
+只需一段的大小；只能整幅解码的格式（如PNG）在整幅大小不超过内存预算时解码一次。
+放大查看时只解码可见区域，保存时才解码全分辨率原图
+"""
+
+import math
+import struct
+
+from PIL import Image
+
+from image_edits import EditPipeline
+from image_probe import EXIF_ORIENTATION_TAG, probe_file
+from jpeg_orientation import ORIENTATION_TRANSFORMS
+
+# 默认的内存预算（字节）：预览之外为放大查看保留的全分辨率数据不超过该值
+DEFAULT_MEMORY_BUDGET = 1024 * 1024 * 1024
+# 逐段生成预览图时每段最多占用的字节数
+BAND_BYTES = 64 * 1024 * 1024
+# 解码分块区域时在需要的区域四周多解码的比例，小幅平移时无需重新解码
+REGION_MARGIN = 0.25
+# 超过该像素数的图片按需解码（大图模式），不整幅解码，也不预读
+LARGE_IMAGE_PIXELS = 64_000_000
+
+# Pillow 的解压炸弹检查按像素数拒绝打开、解码和裁剪超大图片。大图模式自行按
+# 内存预算决定解码多少，因此绕过这几处检查；不修改全局的 Image.MAX_IMAGE_PIXELS，
+# 其它线程中的 Image.open 仍受保护
+
+
+def open_unchecked(fp):
+    """直接调用格式插件打开图片，跳过 Image.open 中的解压炸弹检查"""
+    Image.init()
+    prefix = fp.read(16)
+    for format_id in Image.ID:
+        factory, accept = Image.OPEN[format_id]
+        result = not accept or accept(prefix)
+        if not result or isinstance(result, str):
+            continue
+        fp.seek(0)
+        try:
+            return factory(fp, None)
+        except (SyntaxError, IndexError, TypeError, struct.error):
+            continue
+    raise Image.UnidentifiedImageError("无法识别的图片格式")
+
+
+def load_unchecked(image):
+    """解码图片；先按当前尺寸分配位图，load() 中就不再做解压炸弹检查"""
+    # 新版 Pillow 的位图保存在 _im 中（未加载时访问 im 会出错），旧版直接保存在 im 中
+    if getattr(image, "_im", None) is None and vars(image).get("im") is None:
+        image.im = Image.core.new(image.mode, image.size)
+    image.load()
+
+
+def crop_unchecked(image, box):
+    """裁剪图片，等价于 image.crop，但不做解压炸弹检查（最近邻等尺寸重采样）"""
+    left, top, right, bottom = (int(round(value)) for value in box)
+    size = (right - left, bottom - top)
+    return image.resize(size, Image.Resampling.NEAREST, box=(left, top, right, bottom))
+
+
+def _open_stored(fp):
+    """打开图片，返回 (图片, EXIF方向)；去掉方向标记，解码结果保持存储的方向
+
+    新版 Pillow 的TIFF在 load() 时自行按方向标记转正，且打开时就报告转正后的尺寸，
+    这里统一改回存储的尺寸，由调用方自己处理方向
+    """
+    image = open_unchecked(fp)
+    orientation = image.getexif().pop(EXIF_ORIENTATION_TAG, 1)
+    tags = getattr(image, "tag_v2", None)
+    if tags is not None:
+        tags.pop(EXIF_ORIENTATION_TAG, None)
+    image._size = getattr(image, "_tile_size", image.size)
+    return image, orientation
+
+
+def _set_decoded_size(image, size):
+    # 与 JpegImageFile.draft 相同，直接修改尺寸只解码一部分
+    image._size = size
+    if hasattr(image, "_tile_size"):
+        image._tile_size = size
+
+
+def bitmap_nbytes(mode, size):
+    """估算解码后位图占用的内存字节数（按Pillow内部每像素存储大小）"""
+    if mode in ("1", "L", "P"):
+        pixel_size = 1
+    elif mode.startswith("I;16"):
+        pixel_size = 2
+    else:
+        pixel_size = 4
+    return size[0] * size[1] * pixel_size
+
+
+def is_large_image(path, max_pixels):
+    """只读取文件头判断图片像素数是否超过 max_pixels"""
+    info = probe_file(path)
+    if info is None or not info.width or not info.height:
+        return False
+    return info.width * info.height > max_pixels
+
+
+def shrink(image, factor):
+    """把图片缩小为 1/factor；reduce 不支持的模式使用最近邻"""
+    if factor <= 1:
+        return image
+    if image.mode in ("1", "P", "PA") or image.mode.startswith("I;"):
+        size = (
+            max(1, math.ceil(image.width / factor)),
+            max(1, math.ceil(image.height / factor)),
+        )
+        return image.resize(size, Image.Resampling.NEAREST)
+    return image.reduce(factor)
+
+
+def _shift_tile(tile, dx, dy):
+    """把分块的位置平移到以 (dx, dy) 为原点的坐标系"""
+    name, (x0, y0, x1, y1), offset, args = tile[:4]
+    extents = (x0 - dx, y0 - dy, x1 - dx, y1 - dy)
+    if hasattr(tile, "_replace"):
+        return tile._replace(extents=extents)
+    return (name, extents, offset, args)
+
+
+def _intersects(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+class LargeImage:
+    """按需解码的超大图片
+
+    坐标均为全分辨率像素；size 为按EXIF方向转正后的尺寸，stored_size 为文件中
+    存储的尺寸。decoded 保存在预算内整幅解码的位图（JPEG可能是按 decoded_scale
+    缩小解码的），由多个分块组成的图片则只缓存最近解码的区域
+    """
+
+    def __init__(self, path, memory_budget=DEFAULT_MEMORY_BUDGET):
+        self.path = path
+        self.memory_budget = memory_budget
+        with open(path, "rb") as f:
+            image, orientation = _open_stored(f)
+            self.stored_size = image.size
+            self.mode = image.mode
+            self.format = image.format
+            self.tiled = image.format == "TIFF" and len(image.tile) > 1
+
+        # 方向标记表示为作用于存储像素的编辑，与用户的编辑合成后一次应用
+        self.orientation = EditPipeline(self.stored_size)
+        self.orientation.flip, self.orientation.turns = ORIENTATION_TRANSFORMS.get(
+            orientation, (False, 0)
+        )
+        self.size = self.orientation.output_size()
+        self.decoded = None
+        self.decoded_scale = 1
+        self.region_cache = None  # (区域在原图中的矩形, 位图)
+
+    def nbytes(self, scale=1):
+        """按 scale 缩小后整幅解码所需的字节数"""
+        width, height = self.stored_size
+        return bitmap_nbytes(
+            self.mode, (math.ceil(width / scale), math.ceil(height / scale))
+        )
+
+    def memory_usage(self):
+        """保留在内存中的已解码数据的字节数"""
+        total = 0
+        if self.decoded is not None:
+            total += bitmap_nbytes(self.decoded.mode, self.decoded.size)
+        if self.region_cache is not None:
+            bitmap = self.region_cache[1]
+            total += bitmap_nbytes(bitmap.mode, bitmap.size)
+        return total
+
+    def release(self):
+        """释放已解码的全分辨率数据，之后需要时重新解码"""
+        self.decoded = None
+        self.decoded_scale = 1
+        self.region_cache = None
+
+    def _load(self, draft_size=None):
+        """解码整幅图片；draft_size 为 JPEG 解码时缩小的目标尺寸"""
+        with open(self.path, "rb") as f:
+            image, _ = _open_stored(f)
+            if draft_size:
+                image.draft(image.mode, draft_size)
+            load_unchecked(image)
+        return image
+
+    def _decode_jpeg(self, scale):
+        """用 draft 按 1/scale 解码 JPEG 并保留在内存中"""
+        if self.decoded is not None and self.decoded_scale <= scale:
+            return
+        self.decoded = None  # 先释放旧的位图
+        width, height = self.stored_size
+        draft_size = (max(1, width // scale), max(1, height // scale))
+        self.decoded = self._load(draft_size if scale > 1 else None)
+        self.decoded_scale = max(1, round(width / self.decoded.width))
+
+    def _decode_tiles(self, rect):
+        """只解码与 rect 相交的条带/分块，返回 (位图, 位图在原图中的矩形)"""
+        with open(self.path, "rb") as f:
+            image, _ = _open_stored(f)
+            tiles = [tile for tile in image.tile if _intersects(tile[1], rect)]
+            if not tiles:
+                return None, None
+            bbox = (
+                min(tile[1][0] for tile in tiles),
+                min(tile[1][1] for tile in tiles),
+                max(tile[1][2] for tile in tiles),
+                max(tile[1][3] for tile in tiles),
+            )
+            image.tile = [
+                _shift_tile(tile, bbox[0], bbox[1])
+                for tile in image.tile
+                if tile[1][0] >= bbox[0]
+                and tile[1][1] >= bbox[1]
+                and tile[1][2] <= bbox[2]
+                and tile[1][3] <= bbox[3]
+            ]
+            _set_decoded_size(image, (bbox[2] - bbox[0], bbox[3] - bbox[1]))
+            load_unchecked(image)
+        return image, bbox
+
+    def _tiled_preview(self, factor):
+        """按条带逐段解码并缩小，内存只需一段的大小"""
+        width, height = self.stored_size
+        with open(self.path, "rb") as f:
+            tiles = open_unchecked(f).tile
+        bands = sorted({(tile[1][1], tile[1][3]) for tile in tiles})
+
+        row_bytes = bitmap_nbytes(self.mode, (width, 1))
+        band_rows = max(factor, min(BAND_BYTES, self.memory_budget) // row_bytes)
+        preview = Image.new(
+            self.mode, (math.ceil(width / factor), math.ceil(height / factor))
+        )
+        carry = None  # 上一段中不足 factor 行、留给下一段的部分
+        out_y = 0
+        index = 0
+        while index < len(bands):
+            top, bottom = bands[index]
+            while index + 1 < len(bands) and bands[index + 1][1] - top <= band_rows:
+                index += 1
+                bottom = max(bottom, bands[index][1])
+            index += 1
+
+            band, _ = self._decode_tiles((0, top, width, bottom))
+            if band is None:
+                continue
+            if carry is not None:
+                merged = Image.new(self.mode, (width, carry.height + band.height))
+                merged.paste(carry, (0, 0))
+                merged.paste(band, (0, carry.height))
+                band = merged
+            usable = band.height // factor * factor
+            if usable:
+                reduced = shrink(crop_unchecked(band, (0, 0, width, usable)), factor)
+                preview.paste(reduced, (0, out_y))
+                out_y += usable // factor
+            carry = None
+            if usable < band.height:
+                carry = crop_unchecked(band, (0, usable, width, band.height))
+        if carry is not None:
+            preview.paste(shrink(carry, factor), (0, out_y))
+        return preview
+
+    def preview(self, max_pixels):
+        """返回不超过 max_pixels 像素、已按EXIF方向转正的预览图
+
+        只能整幅解码且超出内存预算的图片抛出 MemoryError
+        """
+        width, height = self.stored_size
+        factor = max(1, math.ceil(math.sqrt(width * height / max_pixels)))
+        if self.format == "JPEG":
+            scale = 8
+            while scale > 1 and scale > factor:
+                scale //= 2
+            while scale < 8 and self.nbytes(scale) > self.memory_budget:
+                scale *= 2
+            self._decode_jpeg(scale)
+            bitmap = self.decoded
+        elif self.tiled:
+            bitmap = self._tiled_preview(factor)
+        else:
+            if self.nbytes() > self.memory_budget:
+                raise MemoryError(
+                    f"图片过大：整幅解码需要 {self.nbytes() // (1024 * 1024)} MB，"
+                    f"超过内存预算 {self.memory_budget // (1024 * 1024)} MB"
+                )
+            self.decoded = self._load()
+            self.decoded_scale = 1
+            bitmap = self.decoded
+
+        remaining = math.ceil(math.sqrt(bitmap.width * bitmap.height / max_pixels))
+        return self.orientation.apply(shrink(bitmap, remaining))
+
+    def _bitmap_for(self, rect, density):
+        """返回覆盖原图矩形 rect 的 (位图, 位图在原图中的左上角, 缩小倍数)
+
+        density 为每个输出像素对应的原图像素数，超出内存预算时返回 None
+        """
+        if self.format == "JPEG":
+            scale = 1
+            while scale < 8 and scale * 2 <= density:
+                scale *= 2
+            while scale < 8 and self.nbytes(scale) > self.memory_budget:
+                scale *= 2
+            if self.nbytes(scale) > self.memory_budget:
+                return None
+            self._decode_jpeg(scale)
+            return self.decoded, (0, 0), self.decoded_scale
+
+        if self.decoded is None and not self.tiled:
+            # 只能整幅解码的格式（释放后）在预算内时重新解码
+            if self.nbytes() > self.memory_budget:
+                return None
+            self.decoded = self._load()
+            self.decoded_scale = 1
+        if self.decoded is not None:
+            return self.decoded, (0, 0), 1
+
+        cached = self.region_cache
+        if cached is not None:
+            (left, top, right, bottom), bitmap = cached
+            if (
+                left <= rect[0]
+                and top <= rect[1]
+                and right >= rect[2]
+                and bottom >= rect[3]
+            ):
+                return bitmap, (left, top), 1
+
+        self.region_cache = None
+        width, height = self.stored_size
+        margin_x = int((rect[2] - rect[0]) * REGION_MARGIN)
+        margin_y = int((rect[3] - rect[1]) * REGION_MARGIN)
+        expanded = (
+            max(0, rect[0] - margin_x),
+            max(0, rect[1] - margin_y),
+            min(width, rect[2] + margin_x),
+            min(height, rect[3] + margin_y),
+        )
+        for wanted in (expanded, rect):
+            # 先只读分块列表估算大小，超出预算时改为只解码需要的区域
+            with open(self.path, "rb") as f:
+                tiles = [
+                    tile[1]
+                    for tile in open_unchecked(f).tile
+                    if _intersects(tile[1], wanted)
+                ]
+            if not tiles:
+                return None
+            size = (
+                max(t[2] for t in tiles) - min(t[0] for t in tiles),
+                max(t[3] for t in tiles) - min(t[1] for t in tiles),
+            )
+            if bitmap_nbytes(self.mode, size) <= self.memory_budget:
+                bitmap, bbox = self._decode_tiles(wanted)
+                self.region_cache = (bbox, bitmap)
+                return bitmap, bbox[:2], 1
+        return None
+
+    def region(self, pipeline, box, size):
+        """解码编辑后图像上 box 区域的数据，用于放大显示
+
+        pipeline 为作用于存储像素的编辑（方向标记与用户编辑合成后的结果），
+        box 为编辑后图像上的全分辨率坐标，size 为显示尺寸。返回 (位图, 子区域)，
+        用 image.resize(size, box=子区域) 得到显示结果；超出内存预算时返回 None
+        """
+        density = max(1.0, (box[2] - box[0]) / max(1, size[0]))
+        width, height = self.stored_size
+        left, top, right, bottom = pipeline.source_box(box)
+        rect = (
+            max(0, math.floor(left)),
+            max(0, math.floor(top)),
+            min(width, math.ceil(right)),
+            min(height, math.ceil(bottom)),
+        )
+        if rect[2] <= rect[0] or rect[3] <= rect[1]:
+            return None
+        located = self._bitmap_for(rect, density)
+        if located is None:
+            return None
+
+        bitmap, (origin_x, origin_y), scale = located
+        piece_box = (
+            max(0, (rect[0] - origin_x) // scale),
+            max(0, (rect[1] - origin_y) // scale),
+            min(bitmap.width, math.ceil((rect[2] - origin_x) / scale)),
+            min(bitmap.height, math.ceil((rect[3] - origin_y) / scale)),
+        )
+        piece = crop_unchecked(bitmap, piece_box)
+        method = pipeline.transpose_method
+        if method is not None:
+            piece = piece.transpose(method)
+
+        # 子区域 = box 相对于该块在编辑后图像中位置的偏移，再换算到块的分辨率
+        covered = (
+            origin_x + piece_box[0] * scale,
+            origin_y + piece_box[1] * scale,
+            origin_x + piece_box[2] * scale,
+            origin_y + piece_box[3] * scale,
+        )
+        piece_left, piece_top, _, _ = pipeline.output_box(covered)
+        sub_box = (
+            max(0.0, (box[0] - piece_left) / scale),
+            max(0.0, (box[1] - piece_top) / scale),
+            min(float(piece.width), (box[2] - piece_left) / scale),
+            min(float(piece.height), (box[3] - piece_top) / scale),
+        )
+        return piece, sub_box
+
+    def render(self, edits):
+        """解码全分辨率原图并应用编辑（作用于转正后的图像），用于保存
+
+        保存需要完整的像素，不受内存预算限制；分块图片只解码裁剪框内的部分
+        """
+        pipeline = self.orientation.then(edits)
+        crop_box = pipeline.crop_box
+        if self.decoded is not None and self.decoded_scale == 1:
+            bitmap = self.decoded
+        elif self.tiled and crop_box is not None:
+            bitmap, bbox = self._decode_tiles(crop_box)
+            left, top, right, bottom = crop_box
+            crop_box = (
+                left - bbox[0],
+                top - bbox[1],
+                right - bbox[0],
+                bottom - bbox[1],
+            )
+        else:
+            bitmap = self._load()
+        # 裁剪由这里完成（跳过解压炸弹检查），编辑记录只剩翻转和旋转
+        if crop_box is not None:
+            bitmap = crop_unchecked(bitmap, crop_box)
+            pipeline.crop_box = None
+        return pipeline.apply(bitmap)
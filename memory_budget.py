@@ -0,0 +1,123 @@
+"""解码位图与各类缓存的全局内存预算
+
+持有位图的对象（查看器、已解码图片缓存、缩略图条等）按 (所有者, 键) 登记占用的
+字节数和优先级，并提供释放回调。总占用超过上限时按优先级淘汰：当前图片固定不
+淘汰，当前图片可重建的数据和前后相邻的图片其次，其余按最久未使用先淘汰。
+
+登记可以在任意线程中进行；淘汰只在调用 enforce 的线程（界面线程）中执行，
+释放回调因此可以安全地释放Tk图片。后台线程在解码前用 reserve 预留字节数，
+只有不超过上限时才预留成功，并行解码的线程因此不会在两次淘汰之间越过上限
+"""
+
+import threading
+from collections import OrderedDict
+
+# 优先级：数值越大越先被淘汰
+PINNED = 0  # 当前显示的图片，不淘汰
+NEARBY = 1  # 当前图片可重建的数据（金字塔、放大区域）和前后相邻的图片
+EVICTABLE = 2  # 其余缓存
+
+# 默认上限（字节），8GB内存的电脑上为系统和其它程序留出足够余量
+DEFAULT_LIMIT = 2 * 1024 * 1024 * 1024
+
+
+def photo_nbytes(width, height):
+    """Tk图片占用的字节数：Tk按每像素4字节（RGBA）保存"""
+    return width * height * 4
+
+
+class MemoryBudget:
+    """按字节统计内存占用，超出上限时按优先级和最近使用顺序淘汰"""
+
+    def __init__(self, limit=DEFAULT_LIMIT):
+        self.limit = limit
+        self.current_bytes = 0
+        # (所有者, 键) -> [字节数, 优先级, 释放回调]，按最近使用排序
+        self.entries = OrderedDict()
+        # 后台线程因需要先淘汰而预留失败的字节数，下次 enforce 时一并腾出
+        self.requested_bytes = 0
+        self.lock = threading.Lock()
+
+    def charge(self, owner, key, nbytes, priority=EVICTABLE, release=None):
+        """登记（或更新）一项占用；release 为 None 的项不会被淘汰"""
+        with self.lock:
+            old = self.entries.pop((owner, key), None)
+            if old is not None:
+                self.current_bytes -= old[0]
+            self.entries[(owner, key)] = [nbytes, priority, release]
+            self.current_bytes += nbytes
+
+    def discharge(self, owner, key):
+        """注销一项占用，不存在时忽略"""
+        with self.lock:
+            old = self.entries.pop((owner, key), None)
+            if old is not None:
+                self.current_bytes -= old[0]
+
+    def discharge_owner(self, owner):
+        """注销某个所有者的全部占用"""
+        with self.lock:
+            for entry_key in [k for k in self.entries if k[0] is owner]:
+                self.current_bytes -= self.entries.pop(entry_key)[0]
+
+    def touch(self, owner, key):
+        """标记为最近使用"""
+        with self.lock:
+            if (owner, key) in self.entries:
+                self.entries.move_to_end((owner, key))
+
+    def reserve(self, owner, key, nbytes, priority=NEARBY):
+        """不超过上限时预留 nbytes 并返回 True，否则返回 False（用于决定是否预读）
+
+        预留项不会被淘汰，之后用相同的 (所有者, 键) 调用 charge 登记实际占用，
+        不再需要时调用 discharge 取消预留。淘汰优先级低于 priority 的项后能容纳
+        时，下次 enforce 会腾出这部分空间，之后再预留即可成功
+        """
+        with self.lock:
+            if self.current_bytes + nbytes > self.limit:
+                if self._kept_bytes(priority) + nbytes <= self.limit:
+                    self.requested_bytes = max(self.requested_bytes, nbytes)
+                return False
+            old = self.entries.pop((owner, key), None)
+            if old is not None:
+                self.current_bytes -= old[0]
+            self.entries[(owner, key)] = [nbytes, priority, None]
+            self.current_bytes += nbytes
+        return True
+
+    def _kept_bytes(self, priority):
+        # 调用方持有 self.lock；淘汰优先级低于 priority 的项后仍保留的字节数
+        return sum(
+            entry[0]
+            for entry in self.entries.values()
+            if entry[1] <= priority or entry[2] is None
+        )
+
+    def enforce(self):
+        """淘汰直到不超过上限，返回释放的字节数；必须在界面线程中调用"""
+        releases = []
+        freed = 0
+        with self.lock:
+            target = self.limit - self.requested_bytes
+            self.requested_bytes = 0
+            for priority in (EVICTABLE, NEARBY):
+                if self.current_bytes <= target:
+                    break
+                for entry_key, entry in list(self.entries.items()):
+                    if self.current_bytes <= target:
+                        break
+                    nbytes, entry_priority, release = entry
+                    if entry_priority != priority or release is None:
+                        continue
+                    del self.entries[entry_key]
+                    self.current_bytes -= nbytes
+                    freed += nbytes
+                    releases.append(release)
+
+        # 在锁外调用释放回调，回调中可以再登记或注销
+        for release in releases:
+            try:
+                release()
+            except Exception as e:
+                print(f"释放内存失败: {e}")
+        return freed
@@ -0,0 +1,1367 @@
+"""Word图片提取、排序、压缩与重命名的核心逻辑
+
+不依赖 tkinter，可在图形界面与命令行之间共用；Pillow 只在需要解码图片时才导入
+"""
+
+import os
+import csv
+import glob
+import hashlib
+import io
+import json
+import math
+import queue
+import re
+import shutil
+import threading
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from image_probe import PROBE_FAILED, probe_bytes, probe_file, probe_files
+
+# 检测图片类型时读取的文件头字节数
+SNIFF_BYTES = 512
+# 流式复制时每次读写的块大小
+COPY_CHUNK_SIZE = 64 * 1024
+# 提取清单文件名，记录zip成员与输出文件的对应关系，用于增量提取
+MANIFEST_NAME = ".extract_manifest.json"
+# 图片文件夹索引文件名，缓存每个文件的格式与尺寸，避免重复打开文件检测
+INDEX_NAME = ".image_index.json"
+INDEX_VERSION = 2
+# 批量重命名的事务日志，重命名中途崩溃时用于回滚
+RENAME_JOURNAL_NAME = ".rename_journal.json"
+# 工具自身生成的元数据文件，扫描图片时忽略
+METADATA_NAMES = {MANIFEST_NAME, INDEX_NAME, RENAME_JOURNAL_NAME}
+# 图片类型到文件扩展名的映射
+IMAGE_EXT_MAP = {
+    "jpeg": ".jpg",
+    "jpg": ".jpg",
+    "png": ".png",
+    "bmp": ".bmp",
+    "gif": ".gif",
+    "tiff": ".tiff",
+    "webp": ".webp",
+}
+# 按目标大小压缩时支持的扩展名及保存格式
+TARGET_FORMATS = {".jpg": "JPEG", ".jpeg": "JPEG", ".webp": "WEBP", ".png": "PNG"}
+# 质量搜索范围；JPEG先在不低于 TARGET_FULL_CHROMA_QUALITY 的质量下尝试 4:4:4
+# 色度采样，放不下时再在整个范围内尝试 4:2:0
+TARGET_MIN_QUALITY = 20
+TARGET_MAX_QUALITY = 95
+TARGET_FULL_CHROMA_QUALITY = 90
+# 结果达到目标大小的 (1 - 容差) 以上即停止搜索
+TARGET_TOLERANCE = 0.05
+# 最低质量仍超出目标时允许缩小到的最小比例
+TARGET_MIN_SCALE = 0.25
+# 批量压缩的输出格式：名称 -> (保存格式, 扩展名)，"keep" 表示保持原格式
+BATCH_FORMATS = {
+    "jpeg": ("JPEG", ".jpg"),
+    "webp": ("WEBP", ".webp"),
+    "png": ("PNG", ".png"),
+}
+
+
+def compressed_path_for(image_path):
+    """压缩结果的保存路径：在原文件名后加 _compressed"""
+    folder_path = os.path.dirname(image_path)
+    name, ext = os.path.splitext(os.path.basename(image_path))
+    return os.path.join(folder_path, f"{name}_compressed{ext}")
+
+
+def save_compressed(image, output_path, quality=85):
+    """根据扩展名选择格式压缩保存图片"""
+    ext = os.path.splitext(output_path)[1]
+    if ext.lower() in [".jpg", ".jpeg"]:
+        rgb_image = image.convert("RGB")
+        rgb_image.save(output_path, "JPEG", quality=quality, optimize=True)
+    elif ext.lower() == ".png":
+        image.save(output_path, "PNG", optimize=True)
+    else:
+        image.save(output_path)
+
+
+def open_upright(image_path):
+    """解码图片并按EXIF方向标记转正
+
+    重新编码时不保留EXIF，方向标记会丢失，因此压缩前必须先把像素转正
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(image_path) as image:
+        image.load()
+        ImageOps.exif_transpose(image, in_place=True)
+    return image
+
+
+def compress_image_file(image_path, quality=85):
+    """压缩磁盘上的图片文件，返回压缩后的文件路径"""
+    compressed_path = compressed_path_for(image_path)
+    save_compressed(open_upright(image_path), compressed_path, quality)
+    return compressed_path
+
+
+def encode_to_buffer(image, fmt, quality=None, progressive=False, subsampling=None):
+    """在内存中编码图片，返回编码后的字节
+
+    JPEG未指定色度采样（"4:4:4"、"4:2:0"）时按质量选择
+    """
+    buffer = io.BytesIO()
+    if fmt == "JPEG":
+        if subsampling is None:
+            subsampling = "4:4:4" if quality >= TARGET_FULL_CHROMA_QUALITY else "4:2:0"
+        image.save(
+            buffer,
+            "JPEG",
+            quality=quality,
+            subsampling=subsampling,
+            optimize=True,
+            progressive=progressive,
+        )
+    elif fmt == "WEBP":
+        image.save(buffer, "WEBP", quality=quality)
+    else:
+        image.save(buffer, fmt, optimize=True)
+    return buffer.getvalue()
+
+
+def _search_quality(image, fmt, target_bytes, tolerance, stats):
+    """搜索不超过目标大小的最高质量，返回 (质量, 色度采样, 数据)，都超出时返回 None
+
+    JPEG的色度采样是独立的一维：先在高质量区间内尝试 4:4:4，放不下时再用
+    4:2:0 搜索整个质量范围（包括最高质量），仍放不下才由调用方缩小尺寸。
+    stats 记录编码次数和最小的一次编码结果，用于估算缩小比例
+    """
+
+    def encode(quality, subsampling):
+        data = encode_to_buffer(image, fmt, quality, subsampling=subsampling)
+        stats["encodes"] += 1
+        if stats["smallest"] is None or len(data) < len(stats["smallest"][2]):
+            stats["smallest"] = (quality, subsampling, data)
+        return data
+
+    if fmt == "PNG":
+        data = encode(None, None)
+        return (None, None, data) if len(data) <= target_bytes else None
+
+    if fmt == "JPEG":
+        ranges = [
+            ("4:4:4", TARGET_FULL_CHROMA_QUALITY, TARGET_MAX_QUALITY),
+            ("4:2:0", TARGET_MIN_QUALITY, TARGET_MAX_QUALITY),
+        ]
+    else:
+        ranges = [(None, TARGET_MIN_QUALITY, TARGET_MAX_QUALITY)]
+
+    for subsampling, low, high in ranges:
+        # 大多数小图在最高质量下就已满足要求
+        data = encode(high, subsampling)
+        if len(data) <= target_bytes:
+            return high, subsampling, data
+        # 区间内最低质量也放不下时不必再二分
+        data = encode(low, subsampling)
+        if len(data) > target_bytes:
+            continue
+
+        best = (low, subsampling, data)
+        low, high = low + 1, high - 1
+        if len(data) >= target_bytes * (1 - tolerance):
+            return best
+        while low <= high:
+            quality = (low + high) // 2
+            data = encode(quality, subsampling)
+            if len(data) <= target_bytes:
+                best = (quality, subsampling, data)
+                if len(data) >= target_bytes * (1 - tolerance):
+                    break
+                low = quality + 1
+            else:
+                high = quality - 1
+        return best
+    return None
+
+
+def compress_to_target(
+    image, target_bytes, fmt="JPEG", allow_downscale=True, tolerance=TARGET_TOLERANCE
+):
+    """在内存中搜索质量、JPEG色度采样（及缩小比例），使编码结果不超过 target_bytes
+
+    所有尝试共用同一份解码后的图像，返回包含 data、bytes、quality、subsampling、
+    scale、encodes、fits 的字典；无法满足目标时 fits 为 False，data 为最小的结果
+    """
+    from PIL import Image
+
+    if fmt == "JPEG" and image.mode != "RGB":
+        image = image.convert("RGB")
+    elif fmt == "WEBP" and image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+    stats = {"encodes": 0, "smallest": None}
+    scale = 1.0
+    candidate = image
+    while True:
+        found = _search_quality(candidate, fmt, target_bytes, tolerance, stats)
+        if found is not None or not allow_downscale or scale <= TARGET_MIN_SCALE:
+            break
+        # 文件大小大致与像素数成正比，按最小编码结果估算下一次的缩小比例
+        smallest = len(stats["smallest"][2])
+        scale = max(TARGET_MIN_SCALE, scale * math.sqrt(target_bytes / smallest) * 0.95)
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        candidate = image.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        stats["smallest"] = None
+
+    fits = found is not None
+    quality, subsampling, data = found if fits else stats["smallest"]
+    return {
+        "data": data,
+        "bytes": len(data),
+        "quality": quality,
+        "subsampling": subsampling,
+        "scale": round(scale, 3),
+        "encodes": stats["encodes"],
+        "fits": fits,
+    }
+
+
+def save_to_target(image, output_path, target_bytes, allow_downscale=True):
+    """按扩展名选择格式，以不超过 target_bytes 的大小保存图片，返回搜索结果"""
+    ext = os.path.splitext(output_path)[1].lower()
+    fmt = TARGET_FORMATS.get(ext)
+    if fmt is None:
+        raise ValueError(f"不支持按目标大小压缩 {ext} 格式")
+
+    result = compress_to_target(image, target_bytes, fmt, allow_downscale)
+    with open(output_path, "wb") as f:
+        f.write(result["data"])
+    return result
+
+
+def compress_image_file_to_target(image_path, target_bytes, allow_downscale=True):
+    """把磁盘上的图片压缩到目标大小以内，返回搜索结果（含输出路径 path）"""
+    compressed_path = compressed_path_for(image_path)
+    image = open_upright(image_path)
+    result = save_to_target(image, compressed_path, target_bytes, allow_downscale)
+    result["path"] = compressed_path
+    return result
+
+
+def _batch_format(image_path, output_format):
+    """批量压缩时源文件对应的 (保存格式, 扩展名)"""
+    if output_format != "keep":
+        return BATCH_FORMATS[output_format]
+    ext = os.path.splitext(image_path)[1].lower()
+    fmt = TARGET_FORMATS.get(ext)
+    if fmt is None:
+        # 无扩展名或其它格式的文件按检测到的类型处理，无法保持的转为PNG
+        info = probe_file(image_path)
+        fmt = (info.format if info else "png").upper()
+        fmt = {"JPG": "JPEG"}.get(fmt, fmt)
+        if fmt not in ("JPEG", "WEBP", "PNG"):
+            fmt = "PNG"
+    return fmt, {"JPEG": ".jpg", "WEBP": ".webp", "PNG": ".png"}[fmt]
+
+
+def compress_file_for_batch(image_path, output_path, fmt, quality=85):
+    """压缩单个文件，结果不比原文件小时不写出；在批量压缩的子进程中运行"""
+    start = time.perf_counter()
+    summary = {
+        "source": image_path,
+        "output": "",
+        "input_bytes": 0,
+        "output_bytes": 0,
+        "skipped": False,
+        "seconds": 0.0,
+        "error": "",
+    }
+    try:
+        summary["input_bytes"] = os.path.getsize(image_path)
+        image = open_upright(image_path)
+        if fmt == "JPEG" and image.mode != "RGB":
+            image = image.convert("RGB")
+        elif fmt == "WEBP" and image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        # 照片输出为渐进式JPEG，截图等转为WebP或优化过的PNG
+        data = encode_to_buffer(image, fmt, quality, progressive=True)
+
+        summary["output_bytes"] = len(data)
+        if len(data) >= summary["input_bytes"]:
+            summary["skipped"] = True
+        else:
+            temp_path = temp_path_for(output_path)
+            try:
+                with open(temp_path, "wb") as f:
+                    f.write(data)
+                os.replace(temp_path, output_path)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+            summary["output"] = output_path
+    except Exception as e:
+        summary["error"] = f"{type(e).__name__}: {e}"
+    summary["seconds"] = round(time.perf_counter() - start, 3)
+    return summary
+
+
+def summarize_compression(summaries, seconds):
+    """汇总批量压缩结果：写出/跳过/失败数量、节省的字节数与吞吐量"""
+    written = [s for s in summaries if s["output"]]
+    input_bytes = sum(s["input_bytes"] for s in summaries)
+    saved = sum(s["input_bytes"] - s["output_bytes"] for s in written)
+    seconds = max(seconds, 1e-6)
+    return {
+        "images": len(summaries),
+        "written": len(written),
+        "skipped": sum(1 for s in summaries if s["skipped"]),
+        "failed": sum(1 for s in summaries if s["error"]),
+        "input_bytes": input_bytes,
+        "saved_bytes": saved,
+        "seconds": round(seconds, 3),
+        "images_per_second": round(len(summaries) / seconds, 1),
+        "mb_per_second": round(input_bytes / seconds / (1024 * 1024), 2),
+    }
+
+
+class BatchCompressionJob:
+    """在进程池中批量压缩图片，可同时转换格式
+
+    压缩结果写入输出文件夹，文件名与源文件相同（转换格式时更换扩展名）；
+    结果不比原文件小的图片不写出
+    """
+
+    def __init__(
+        self,
+        image_paths,
+        output_folder,
+        output_format="keep",
+        quality=85,
+        max_workers=None,
+    ):
+        if output_format != "keep" and output_format not in BATCH_FORMATS:
+            raise ValueError(f"不支持的输出格式: {output_format}")
+        self.image_paths = image_paths
+        self.output_folder = output_folder
+        self.output_format = output_format
+        self.quality = quality
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.progress = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.totals = None
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def _plan(self):
+        """确定每个文件的保存格式与输出路径，转换格式后重名时追加序号"""
+        tasks = []
+        used = set()
+        for image_path in self.image_paths:
+            fmt, ext = _batch_format(image_path, self.output_format)
+            base_name = os.path.splitext(os.path.basename(image_path))[0]
+            name = base_name + ext
+            counter = 1
+            while name.lower() in used:
+                name = f"{base_name}_{counter}{ext}"
+                counter += 1
+            used.add(name.lower())
+            tasks.append((image_path, os.path.join(self.output_folder, name), fmt))
+        return tasks
+
+    def run(self):
+        """同步执行批量压缩，返回 (各文件结果列表, 是否已取消, 错误)"""
+        summaries = []
+        error = None
+        total = len(self.image_paths)
+        start = time.perf_counter()
+        try:
+            os.makedirs(self.output_folder, exist_ok=True)
+            tasks = self._plan()
+            from concurrent.futures import ProcessPoolExecutor
+
+            self.progress.put(("progress", 0, total))
+            with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+                futures = [
+                    pool.submit(
+                        compress_file_for_batch,
+                        image_path,
+                        output_path,
+                        fmt,
+                        self.quality,
+                    )
+                    for image_path, output_path, fmt in tasks
+                ]
+                for done, future in enumerate(as_completed(futures), 1):
+                    self.progress.put(("progress", done, total))
+                    if self.cancel_event.is_set():
+                        # 已开始的图片会完整写完，尚未开始的直接取消
+                        pool.shutdown(wait=True, cancel_futures=True)
+                        break
+
+            # 取消时只汇总已写完（或已跳过）的图片
+            summaries = [
+                future.result()
+                for future in futures
+                if future.done() and not future.cancelled()
+            ]
+            summaries.sort(key=lambda summary: summary["source"])
+        except Exception as e:
+            error = e
+
+        self.totals = summarize_compression(summaries, time.perf_counter() - start)
+        cancelled = self.cancel_event.is_set()
+        self.progress.put(("compress_done", summaries, cancelled, error))
+        return summaries, cancelled, error
+
+
+def temp_path_for(output_path):
+    """原子写入使用的临时文件路径：与目标同目录的隐藏文件，保留扩展名以便按扩展名选择格式"""
+    folder, name = os.path.split(output_path)
+    base, ext = os.path.splitext(name)
+    return os.path.join(folder, f".{base}.part{ext}")
+
+
+def is_temp_name(name):
+    """是否为 temp_path_for 生成的临时文件名，扫描图片文件夹时忽略"""
+    return name.startswith(".") and (".part." in name or name.endswith(".part"))
+
+
+class ImageWriter:
+    """后台写盘队列
+
+    submit 立即返回，编码和写入在后台线程中按提交顺序依次完成；先写入临时文件
+    再 os.replace 到目标路径，结果 ("saved"|"failed", 标记, 路径, 返回值或异常)
+    放入 results 队列
+    """
+
+    def __init__(self):
+        self.tasks = queue.Queue()
+        self.results = queue.Queue()
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def submit(self, output_path, save, tag=None):
+        """save(temp_path) 负责编码并写入临时文件，其返回值会随结果一起返回"""
+        self.tasks.put((output_path, save, tag))
+
+    def wait(self):
+        """等待已提交的写入全部完成"""
+        self.tasks.join()
+
+    def _run(self):
+        while True:
+            output_path, save, tag = self.tasks.get()
+            temp_path = temp_path_for(output_path)
+            try:
+                value = save(temp_path)
+                os.replace(temp_path, output_path)
+                self.results.put(("saved", tag, output_path, value))
+            except Exception as e:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                self.results.put(("failed", tag, output_path, e))
+            finally:
+                self.tasks.task_done()
+
+
+def rename_image(folder_path, old_name, new_base_name):
+    """重命名图片并同步提取清单，返回新文件名
+
+    新文件名为空时抛出 ValueError，目标已存在时抛出 FileExistsError
+    """
+    new_base_name = new_base_name.strip()
+    if not new_base_name:
+        raise ValueError("文件名不能为空")
+
+    old_path = os.path.join(folder_path, old_name)
+
+    # 获取原文件的扩展名
+    _, ext = os.path.splitext(old_name)
+    if not ext:
+        # 如果没有扩展名，尝试检测
+        info = probe_file(old_path)
+        ext = IMAGE_EXT_MAP.get(info.format if info else None, ".png")
+
+    new_name = new_base_name + ext
+    new_path = os.path.join(folder_path, new_name)
+    if new_path == old_path:
+        return new_name  # 没有变化
+
+    # 检查新文件名是否已存在
+    if os.path.exists(new_path):
+        raise FileExistsError("文件名已存在")
+
+    os.rename(old_path, new_path)
+    rename_in_manifest(folder_path, old_name, new_name)
+    return new_name
+
+
+def load_folder_index(folder):
+    """读取图片文件夹索引，不存在、损坏或版本不符时返回空索引"""
+    try:
+        with open(os.path.join(folder, INDEX_NAME), "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("version") == INDEX_VERSION and isinstance(
+            index.get("files"), dict
+        ):
+            return index
+    except (OSError, ValueError, AttributeError):
+        pass
+    return {"version": INDEX_VERSION, "files": {}}
+
+
+def save_folder_index(folder, index):
+    """原子地写回图片文件夹索引，失败（如只读网络共享）时忽略"""
+    index_path = os.path.join(folder, INDEX_NAME)
+    temp_path = temp_path_for(index_path)
+    try:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(temp_path, index_path)
+    except OSError as e:
+        print(f"写入图片索引失败: {e}")
+
+
+def rename_in_folder_index(folder, mapping):
+    """重命名不改变文件内容和修改时间，直接改写索引中的文件名，避免重新检测"""
+    index = load_folder_index(folder)
+    files = index["files"]
+    if not files:
+        return
+    renamed = {}
+    for name, entry in files.items():
+        renamed[mapping.get(name, name)] = entry
+    index["files"] = renamed
+    save_folder_index(folder, index)
+
+
+def scan_image_folder(folder):
+    """扫描文件夹中的图片文件，返回 {文件名: 索引条目}
+
+    索引条目包含 size、mtime_ns、format、width、height、mode、orientation。
+    大小和修改时间未变的文件直接沿用磁盘上的索引，只批量检测新增或修改过的
+    文件；索引写回失败（如只读网络共享）时忽略
+    """
+    index = load_folder_index(folder)
+    old_files = index["files"]
+    files = {}
+    to_probe = []
+
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.name in METADATA_NAMES or is_temp_name(entry.name):
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+            except OSError:
+                continue
+
+            cached = old_files.get(entry.name)
+            if (
+                cached
+                and cached.get("size") == stat.st_size
+                and cached.get("mtime_ns") == stat.st_mtime_ns
+            ):
+                files[entry.name] = cached
+            else:
+                to_probe.append((entry.name, entry.path, stat))
+
+    # 只读取文件头检测格式和尺寸，网络共享上并行读取可显著缩短等待
+    infos = probe_files([path for _, path, _ in to_probe])
+    for (name, _, stat), info in zip(to_probe, infos):
+        if info is PROBE_FAILED:
+            continue  # 暂时读取失败的文件本次跳过，不写入索引，下次扫描重新检测
+        files[name] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "format": info.format if info else None,
+            "width": info.width if info else None,
+            "height": info.height if info else None,
+            "mode": info.mode if info else None,
+            "orientation": info.orientation if info else None,
+        }
+
+    if to_probe or len(files) != len(old_files):
+        index["files"] = files
+        save_folder_index(folder, index)
+
+    return {name: info for name, info in files.items() if info["format"]}
+
+
+def load_manifest(folder):
+    """读取输出文件夹中的提取清单，不存在或损坏时返回 None"""
+    manifest_path = os.path.join(folder, MANIFEST_NAME)
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if isinstance(manifest.get("entries"), dict):
+            return manifest
+    except (OSError, ValueError, AttributeError):
+        pass
+    return None
+
+
+def manifest_matches(manifest, docx_path):
+    """清单是否是从该文档提取时写入的；没有记录来源的旧清单视为匹配"""
+    source = manifest.get("source")
+    return not source or source == os.path.basename(docx_path)
+
+
+def save_manifest(folder, manifest):
+    """原子地写入提取清单"""
+    manifest_path = os.path.join(folder, MANIFEST_NAME)
+    temp_path = temp_path_for(manifest_path)
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(temp_path, manifest_path)
+
+
+def rename_in_manifest(folder, old_name, new_name):
+    """用户重命名图片后同步更新提取清单，下次提取时保留新名称"""
+    rename_many_in_manifest(folder, {old_name: new_name})
+
+
+def rename_many_in_manifest(folder, mapping):
+    """按 {原文件名: 新文件名} 一次性更新提取清单"""
+    manifest = load_manifest(folder)
+    if manifest is None:
+        return
+    changed = False
+    for entry in manifest["entries"].values():
+        new_name = mapping.get(entry.get("output"))
+        if new_name is not None:
+            entry["output"] = new_name
+            changed = True
+    if changed:
+        save_manifest(folder, manifest)
+
+
+def hash_zip_member(docx_zip, name):
+    """流式计算zip成员内容的SHA-256"""
+    digest = hashlib.sha256()
+    with docx_zip.open(name) as source:
+        while True:
+            chunk = source.read(COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def find_duplicate_members(docx_zip, names):
+    """找出内容完全相同的zip成员，返回 {重复成员: 首次出现的成员}
+
+    先用中央目录中已有的CRC32和大小分组，只对可能重复的成员计算哈希
+    """
+    groups = {}
+    for name in names:
+        info = docx_zip.getinfo(name)
+        groups.setdefault((info.CRC, info.file_size), []).append(name)
+
+    duplicates = {}
+    for candidates in groups.values():
+        if len(candidates) < 2:
+            continue
+        first_by_hash = {}
+        for name in candidates:
+            digest = hash_zip_member(docx_zip, name)
+            if digest in first_by_hash:
+                duplicates[name] = first_by_hash[digest]
+            else:
+                first_by_hash[digest] = name
+    return duplicates
+
+
+def get_image_order_from_docx(docx_path):
+    """通过解析document.xml获取图片在文档中的实际顺序"""
+    image_order = []
+
+    try:
+        with zipfile.ZipFile(docx_path) as z:
+            # 读取document.xml.rels文件建立关系映射
+            with z.open("word/_rels/document.xml.rels") as rels_file:
+                rels_content = rels_file.read()
+                rels_root = ET.fromstring(rels_content)
+
+            # 建立ID到图片路径的映射
+            rel_mapping = {}
+            for rel in rels_root.findall(
+                "{http://schemas.openxmlformats.org/package/2006/relationships}Relationship"
+            ):
+                rel_id = rel.get("Id")
+                target = rel.get("Target")
+                if target and target.startswith("media/"):
+                    rel_mapping[rel_id] = f"word/{target}"
+
+            # 流式解析document.xml，按图片在文档中出现的真实顺序单遍收集引用
+            blip_tag = "{http://schemas.openxmlformats.org/drawingml/2006/main}blip"
+            imagedata_tag = "{urn:schemas-microsoft-com:vml}imagedata"
+            embed_attr = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}embed"
+            id_attr = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+
+            seen = set()
+            depth = 0
+            body = None
+            with z.open("word/document.xml") as doc_file:
+                for event, elem in ET.iterparse(doc_file, events=("start", "end")):
+                    if event == "start":
+                        depth += 1
+                        if depth == 2:
+                            body = elem  # w:body
+
+                        # drawing中的图片(a:blip)与旧式pict中的图片(v:imagedata)
+                        if elem.tag == blip_tag:
+                            rel_id = elem.get(embed_attr)
+                        elif elem.tag == imagedata_tag:
+                            rel_id = elem.get(id_attr)
+                        else:
+                            continue
+
+                        if rel_id and rel_id in rel_mapping:
+                            image_path = rel_mapping[rel_id]
+                            if image_path not in seen:
+                                seen.add(image_path)
+                                image_order.append(image_path)
+                    else:
+                        depth -= 1
+                        # 每处理完一个段落/表格就释放已解析的元素，内存与文档大小无关
+                        if depth == 2 and body is not None:
+                            body.clear()
+
+    except Exception as e:
+        print(f"解析Word文档时出错: {e}")
+        # 回退到原来的实现方式
+        try:
+            with zipfile.ZipFile(docx_path) as z:
+                with z.open("word/document.xml") as f:
+                    xml_content = f.read().decode("utf-8")
+
+            # 查找所有图片引用，按照在文档中出现的顺序
+            image_refs = re.findall(
+                r'<w:drawing>.*?<a:blip r:embed="([^"]+)".*?</w:drawing>',
+                xml_content,
+                re.DOTALL,
+            )
+            if not image_refs:
+                # 备用方法：查找所有blip标签
+                image_refs = re.findall(r'<a:blip r:embed="([^"]+)"', xml_content)
+
+            # 读取rels文件建立映射
+            with z.open("word/_rels/document.xml.rels") as rels_file:
+                rels_content = rels_file.read().decode("utf-8")
+
+            for ref in image_refs:
+                # 在rels文件中查找实际的图片文件名
+                match = re.search(
+                    f'Id="{ref}"[^>]*Target="media/([^"]+)"', rels_content
+                )
+                if match:
+                    image_path = f"word/media/{match.group(1)}"
+                    image_order.append(image_path)
+        except Exception as e2:
+            print(f"备用解析方法也失败了: {e2}")
+            # 最后的回退方案：按文件名排序
+            with zipfile.ZipFile(docx_path) as z:
+                media_files = [
+                    f for f in z.namelist() if f.startswith("word/media/")
+                ]
+                # 按照文件名中的数字排序
+                media_files.sort(
+                    key=lambda x: (
+                        int(re.findall(r"\d+", os.path.basename(x))[0])
+                        if re.findall(r"\d+", os.path.basename(x))
+                        else 0
+                    )
+                )
+                image_order = media_files
+
+    return image_order
+
+
+class DocxImageSource:
+    """不提取到磁盘、直接从 .docx 中按需读取图片
+
+    打开时只解析图片顺序并读取每个成员的文件头，zip 保持打开；图片数据在显示
+    时才解压。名称与提取时一致（按文档顺序的 001.png 等），只有重命名、编辑或
+    导出的图片才写入输出文件夹，并记入提取清单，之后完整提取时沿用这些文件
+    """
+
+    def __init__(self, docx_path):
+        self.docx_path = docx_path
+        self.lock = threading.Lock()  # ZipFile 共用一个文件句柄，多线程读取需加锁
+        self.zip = zipfile.ZipFile(docx_path, "r")
+        self.members = {}  # 显示名称 -> zip成员路径
+        self.names = []
+        self.extracted = {}  # 显示名称 -> 已写入磁盘的文件路径
+
+        media_infos = {
+            info.filename: info
+            for info in self.zip.infolist()
+            if info.filename.startswith("word/media/")
+        }
+        for i, rel_path in enumerate(get_image_order_from_docx(docx_path), 1):
+            if rel_path not in media_infos:
+                continue
+            with self.zip.open(rel_path) as source:
+                info = probe_bytes(source.read(SNIFF_BYTES))
+            if info is None:
+                continue  # 不是有效图片（如 EMF），与提取时一样跳过
+            name = f"{i:03d}{IMAGE_EXT_MAP.get(info.format, '.png')}"
+            self.members[name] = rel_path
+            self.names.append(name)
+
+    def close(self):
+        with self.lock:
+            self.zip.close()
+
+    def read(self, name):
+        """读取图片数据；已写入磁盘的图片读取磁盘上的版本"""
+        path = self.extracted.get(name)
+        if path and os.path.isfile(path):
+            with open(path, "rb") as f:
+                return f.read()
+        with self.lock:
+            return self.zip.read(self.members[name])
+
+    def extract(self, name, output_folder, new_name=None):
+        """把一张图片写入输出文件夹（可同时改名），返回文件路径
+
+        原样复制zip成员的数据，不重新编码；已写入过的图片只做重命名
+        """
+        new_name = new_name or name
+        manifest = load_manifest(output_folder)
+        if manifest is not None and not manifest_matches(manifest, self.docx_path):
+            # 不能把本文档的图片记入另一个文档的清单
+            raise ValueError(f"输出文件夹中是从 {manifest['source']} 提取的图片")
+        output_path = os.path.join(output_folder, new_name)
+        previous_path = self.extracted.get(name)
+        os.makedirs(output_folder, exist_ok=True)
+
+        if previous_path and os.path.isfile(previous_path):
+            if previous_path != output_path:
+                if os.path.exists(output_path):
+                    raise FileExistsError("文件名已存在")
+                os.rename(previous_path, output_path)
+        else:
+            if os.path.exists(output_path):
+                raise FileExistsError("文件名已存在")
+            rel_path = self.members[name]
+            temp_path = temp_path_for(output_path)
+            with self.lock:
+                with self.zip.open(rel_path) as source, open(temp_path, "wb") as target:
+                    shutil.copyfileobj(source, target, COPY_CHUNK_SIZE)
+            os.replace(temp_path, output_path)
+
+        self._record(name, output_folder, new_name)
+        if new_name != name:
+            self.rename(name, new_name)
+        self.extracted[new_name] = output_path
+        return output_path
+
+    def rename(self, old_name, new_name):
+        """更新显示名称"""
+        if old_name == new_name:
+            return
+        self.members[new_name] = self.members.pop(old_name)
+        self.names[self.names.index(old_name)] = new_name
+        path = self.extracted.pop(old_name, None)
+        if path:
+            self.extracted[new_name] = path
+
+    def _record(self, name, output_folder, output_name):
+        """把写出的图片记入提取清单，之后完整提取时沿用其文件名"""
+        rel_path = self.members[name]
+        info = self.zip.getinfo(rel_path)
+        manifest = load_manifest(output_folder) or {
+            "source": os.path.basename(self.docx_path),
+            "entries": {},
+        }
+        manifest["entries"][rel_path] = {
+            "crc": info.CRC,
+            "size": info.file_size,
+            "output": output_name,
+            "exported": True,
+        }
+        try:
+            save_manifest(output_folder, manifest)
+        except OSError as e:
+            print(f"写入提取清单失败: {e}")
+
+
+class ImageExtractionJob:
+    """在线程池中并行提取docx中的图片
+
+    每个工作线程使用独立的zip句柄；进度通过 progress 队列汇报给界面，
+    调用 cancel() 后尽快停止，未写完的临时文件会被删除。
+    图片顺序在后台线程中解析，解析大文档的 document.xml 不会阻塞界面。
+    输出文件夹中存在提取清单时只重写CRC发生变化的图片，并保留用户改过的文件名。
+    dedup 为 "skip" 时内容相同的图片只写一份，其余仅记入清单；
+    为 "hardlink" 时重复图片以硬链接形式出现；为 None 时每份都单独写出
+    """
+
+    def __init__(self, docx_path, output_folder, max_workers=None, dedup="skip"):
+        self.docx_path = docx_path
+        self.image_order = []
+        self.output_folder = output_folder
+        self.dedup = dedup
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        self.progress = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.local = threading.local()
+        self.zip_handles = []
+        self.zip_lock = threading.Lock()
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def _get_zip(self):
+        """获取当前线程专用的zip句柄"""
+        docx_zip = getattr(self.local, "docx_zip", None)
+        if docx_zip is None:
+            docx_zip = zipfile.ZipFile(self.docx_path, "r")
+            self.local.docx_zip = docx_zip
+            with self.zip_lock:
+                self.zip_handles.append(docx_zip)
+        return docx_zip
+
+    def _clear_output_folder(self):
+        # 清空目标文件夹（可选）
+        for existing_file in os.listdir(self.output_folder):
+            file_path = os.path.join(self.output_folder, existing_file)
+            try:
+                if os.path.isfile(file_path):
+                    os.unlink(file_path)
+            except Exception as e:
+                print(f"删除文件 {file_path} 失败: {e}")
+
+    def _extract_one(self, rel_path, base_name, previous_output=None):
+        """提取单张图片，返回输出文件名；不是有效图片或已取消时返回 None"""
+        if self.cancel_event.is_set():
+            return None
+
+        # 流式读取zip成员，内存占用只取决于缓冲区大小
+        with self._get_zip().open(rel_path) as source:
+            # 只读取文件头检测图片实际类型
+            header = source.read(SNIFF_BYTES)
+            info = probe_bytes(header)
+            image_type = info.format if info else None
+            if not image_type:
+                return None  # 不是有效图片，跳过
+
+            # 确定文件扩展名
+            ext = IMAGE_EXT_MAP.get(image_type, ".png")
+
+            # 新文件名
+            new_filename = f"{base_name}{ext}"
+            output_path = os.path.join(self.output_folder, new_filename)
+            temp_path = temp_path_for(output_path)
+
+            # 先写入临时文件，完整写完后再改名，取消时不会留下半个文件
+            try:
+                with open(temp_path, "wb") as target:
+                    target.write(header)
+                    while True:
+                        if self.cancel_event.is_set():
+                            raise InterruptedError
+                        chunk = source.read(COPY_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        target.write(chunk)
+                os.replace(temp_path, output_path)
+                # 图片格式变化导致扩展名不同时删除旧文件
+                if previous_output and previous_output != new_filename:
+                    previous_path = os.path.join(self.output_folder, previous_output)
+                    if os.path.isfile(previous_path):
+                        os.unlink(previous_path)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
+                if self.cancel_event.is_set():
+                    return None
+                raise
+
+        return new_filename
+
+    def _plan(self, docx_zip, previous_entries):
+        """对比上次的提取清单，决定每个zip成员是保留、重写、新写入还是去重
+
+        返回 (需要写入的任务, 需要硬链接的任务, 保持不变的清单条目, 需要删除的条目)
+        """
+        media_infos = {
+            info.filename: info
+            for info in docx_zip.infolist()
+            if info.filename.startswith("word/media/")
+        }
+        ordered = [
+            (i, rel_path)
+            for i, rel_path in enumerate(self.image_order, 1)
+            if rel_path in media_infos
+        ]
+        current = {rel_path for _, rel_path in ordered}
+        duplicates = {}
+        if self.dedup:
+            duplicates = find_duplicate_members(
+                docx_zip, [rel_path for _, rel_path in ordered]
+            )
+
+        # 只有带输出文件的条目才对应磁盘上的文件
+        previous_entries = {
+            rel_path: entry
+            for rel_path, entry in previous_entries.items()
+            if entry.get("output")
+        }
+        # 浏览文档时导出（改名或编辑）的重复图片是用户要的文件，去重时也保留
+        skipped = {
+            rel_path
+            for rel_path in duplicates
+            if self.dedup == "skip"
+            and not previous_entries.get(rel_path, {}).get("exported")
+        }
+        removed = {
+            rel_path: entry
+            for rel_path, entry in previous_entries.items()
+            if rel_path not in current or rel_path in skipped
+        }
+
+        # 沿用上次的文件名（可能已被用户重命名），新图片按序号命名并避开已占用的名称
+        taken = {
+            os.path.splitext(entry["output"])[0]
+            for rel_path, entry in previous_entries.items()
+            if rel_path not in removed
+        }
+        tasks = []
+        links = []
+        unchanged = {}
+        for i, rel_path in ordered:
+            info = media_infos[rel_path]
+            if rel_path in skipped:
+                unchanged[rel_path] = {
+                    "crc": info.CRC,
+                    "size": info.file_size,
+                    "duplicate_of": duplicates[rel_path],
+                }
+                continue
+
+            previous = previous_entries.get(rel_path)
+            if previous:
+                output_path = os.path.join(self.output_folder, previous["output"])
+                if (
+                    previous.get("crc") == info.CRC
+                    and previous.get("size") == info.file_size
+                    and os.path.isfile(output_path)
+                ):
+                    if rel_path in duplicates:
+                        previous = dict(previous, duplicate_of=duplicates[rel_path])
+                    unchanged[rel_path] = previous
+                    continue
+                base_name = os.path.splitext(previous["output"])[0]
+                previous_output = previous["output"]
+            else:
+                base_name = f"{i:03d}"
+                counter = 1
+                while base_name in taken:
+                    base_name = f"{i:03d}_{counter}"
+                    counter += 1
+                taken.add(base_name)
+                previous_output = None
+
+            task = (rel_path, base_name, previous_output, info)
+            if rel_path in duplicates:
+                links.append(task + (duplicates[rel_path],))
+            else:
+                tasks.append(task)
+        return tasks, links, unchanged, removed
+
+    def _link_duplicate(self, base_name, previous_output, primary_output):
+        """为重复图片创建指向首次出现图片的硬链接，不支持硬链接时复制文件"""
+        _, ext = os.path.splitext(primary_output)
+        new_filename = f"{base_name}{ext}"
+        source_path = os.path.join(self.output_folder, primary_output)
+        output_path = os.path.join(self.output_folder, new_filename)
+        temp_path = temp_path_for(output_path)
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        try:
+            os.link(source_path, temp_path)
+        except OSError:
+            shutil.copyfile(source_path, temp_path)
+        os.replace(temp_path, output_path)
+        if previous_output and previous_output != new_filename:
+            previous_path = os.path.join(self.output_folder, previous_output)
+            if os.path.isfile(previous_path):
+                os.unlink(previous_path)
+        return new_filename
+
+    def run(self):
+        """同步执行提取，返回 (图片文件名列表, 是否已取消, 错误)"""
+        valid_images = []
+        error = None
+        entries = {}
+        try:
+            # 获取图片在文档中的实际顺序
+            self.image_order = get_image_order_from_docx(self.docx_path)
+            manifest = load_manifest(self.output_folder)
+            if manifest is not None and not manifest_matches(manifest, self.docx_path):
+                # 清单来自另一个文档，其中的成员名无法对应到本文档，同样全部重新提取
+                manifest = None
+            if manifest is None:
+                # 没有清单时无法判断哪些文件来自上次提取，按原方式全部重新提取
+                self._clear_output_folder()
+                manifest = {"entries": {}}
+            previous_entries = manifest["entries"]
+
+            tasks, links, unchanged, removed = self._plan(
+                self._get_zip(), previous_entries
+            )
+            entries.update(unchanged)
+            valid_images.extend(
+                entry["output"] for entry in unchanged.values() if "output" in entry
+            )
+
+            # 删除文档中已不存在的图片以及去重后多余的副本
+            for entry in removed.values():
+                file_path = os.path.join(self.output_folder, entry["output"])
+                try:
+                    if os.path.isfile(file_path):
+                        os.unlink(file_path)
+                except Exception as e:
+                    print(f"删除文件 {file_path} 失败: {e}")
+
+            # 取消时未处理的条目仍沿用上次的结果
+            pending = {
+                rel_path: previous_entries[rel_path]
+                for rel_path, _, previous_output, _, *_ in tasks + links
+                if previous_output
+            }
+            total = len(tasks) + len(links)
+            self.progress.put(("progress", 0, total))
+
+            done = 0
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                futures = {
+                    pool.submit(self._extract_one, rel_path, base_name, previous): (
+                        rel_path,
+                        info,
+                    )
+                    for rel_path, base_name, previous, info in tasks
+                }
+                try:
+                    # 取消后排队中的任务会立即返回，已写完的图片仍记入清单
+                    for future in as_completed(futures):
+                        done += 1
+                        new_filename = future.result()
+                        rel_path, info = futures[future]
+                        if new_filename:
+                            valid_images.append(new_filename)
+                            pending.pop(rel_path, None)
+                            entries[rel_path] = {
+                                "crc": info.CRC,
+                                "size": info.file_size,
+                                "output": new_filename,
+                            }
+                        self.progress.put(("progress", done, total))
+                except BaseException:
+                    self.cancel_event.set()
+                    pool.shutdown(wait=True, cancel_futures=True)
+                    raise
+
+            # 首次出现的图片写完后再为重复图片建立硬链接
+            for rel_path, base_name, previous, info, primary in links:
+                if self.cancel_event.is_set():
+                    break
+                done += 1
+                primary_entry = entries.get(primary)
+                if primary_entry and primary_entry.get("output"):
+                    new_filename = self._link_duplicate(
+                        base_name, previous, primary_entry["output"]
+                    )
+                    valid_images.append(new_filename)
+                    pending.pop(rel_path, None)
+                    entries[rel_path] = {
+                        "crc": info.CRC,
+                        "size": info.file_size,
+                        "output": new_filename,
+                        "duplicate_of": primary,
+                    }
+                    if previous_entries.get(rel_path, {}).get("exported"):
+                        entries[rel_path]["exported"] = True
+                self.progress.put(("progress", done, total))
+
+            if self.cancel_event.is_set():
+                entries.update(pending)
+        except Exception as e:
+            error = e
+        finally:
+            with self.zip_lock:
+                for docx_zip in self.zip_handles:
+                    docx_zip.close()
+                self.zip_handles.clear()
+
+        if error is None:
+            try:
+                save_manifest(
+                    self.output_folder,
+                    {"source": os.path.basename(self.docx_path), "entries": entries},
+                )
+            except Exception as e:
+                print(f"写入提取清单失败: {e}")
+
+        valid_images.sort()
+        cancelled = self.cancel_event.is_set()
+        self.progress.put(("done", valid_images, cancelled, error))
+        return valid_images, cancelled, error
+
+
+def collect_docx_files(source):
+    """收集文件夹中的 .docx 文件，或按通配符模式匹配，跳过Word的临时锁文件"""
+    if os.path.isdir(source):
+        paths = glob.glob(os.path.join(source, "*.docx"))
+    else:
+        paths = glob.glob(source, recursive=True)
+    return sorted(
+        p
+        for p in paths
+        if p.lower().endswith(".docx")
+        and not os.path.basename(p).startswith("~$")
+        and os.path.isfile(p)
+    )
+
+
+def collect_image_files(source):
+    """收集文件夹中的图片（使用文件夹索引），或按通配符模式匹配图片文件"""
+    if os.path.isdir(source):
+        names = sorted(scan_image_folder(source))
+        return [os.path.join(source, name) for name in names]
+    paths = glob.glob(source, recursive=True)
+    return sorted(
+        p
+        for p in paths
+        if os.path.isfile(p) and os.path.basename(p) not in METADATA_NAMES
+    )
+
+
+def extract_docx_to_folder(docx_path, output_folder, dedup="skip", max_workers=2):
+    """提取单个文档中的图片，返回汇总信息；在批量提取的子进程中运行"""
+    start = time.perf_counter()
+    summary = {
+        "docx": docx_path,
+        "output": output_folder,
+        "images": 0,
+        "bytes": 0,
+        "seconds": 0.0,
+        "error": "",
+    }
+    try:
+        os.makedirs(output_folder, exist_ok=True)
+        job = ImageExtractionJob(
+            docx_path, output_folder, max_workers=max_workers, dedup=dedup
+        )
+        valid_images, _, error = job.run()
+        if error is not None:
+            raise error
+        summary["images"] = len(valid_images)
+        summary["bytes"] = sum(
+            os.path.getsize(os.path.join(output_folder, name)) for name in valid_images
+        )
+    except Exception as e:
+        summary["error"] = f"{type(e).__name__}: {e}"
+    summary["seconds"] = round(time.perf_counter() - start, 3)
+    return summary
+
+
+def write_batch_report(report_path, summaries):
+    """把批量提取结果写成CSV报告（带BOM，便于Excel打开）"""
+    with open(report_path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["文档", "输出文件夹", "图片数", "字节数", "耗时(秒)", "错误"])
+        for summary in summaries:
+            writer.writerow(
+                [
+                    summary["docx"],
+                    summary["output"],
+                    summary["images"],
+                    summary["bytes"],
+                    summary["seconds"],
+                    summary["error"],
+                ]
+            )
+
+
+class BatchExtractionJob:
+    """在进程池中批量提取多个文档的图片，每个文档写入各自的子文件夹
+
+    单个文档损坏不会中断整个批次，结束后在输出目录生成汇总报告
+    """
+
+    REPORT_NAME = "batch_report.csv"
+
+    def __init__(self, docx_paths, output_root, dedup="skip", max_workers=None):
+        self.docx_paths = docx_paths
+        self.output_root = output_root
+        self.dedup = dedup
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.progress = queue.Queue()
+        self.cancel_event = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def _output_folders(self):
+        """以文档名作为子文件夹名，重名时追加序号"""
+        folders = []
+        used = set()
+        for docx_path in self.docx_paths:
+            base_name = os.path.splitext(os.path.basename(docx_path))[0]
+            name = base_name
+            counter = 1
+            while name.lower() in used:
+                name = f"{base_name}_{counter}"
+                counter += 1
+            used.add(name.lower())
+            folders.append(os.path.join(self.output_root, name))
+        return folders
+
+    def run(self):
+        """同步执行批量提取，返回 (各文档汇总列表, 是否已取消, 错误)"""
+        summaries = []
+        error = None
+        total = len(self.docx_paths)
+        try:
+            os.makedirs(self.output_root, exist_ok=True)
+            # 进程池会引入 multiprocessing，只在真正批量提取时才导入
+            from concurrent.futures import ProcessPoolExecutor
+
+            self.progress.put(("progress", 0, total))
+            with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+                futures = [
+                    pool.submit(extract_docx_to_folder, docx_path, folder, self.dedup)
+                    for docx_path, folder in zip(self.docx_paths, self._output_folders())
+                ]
+                for done, future in enumerate(as_completed(futures), 1):
+                    if self.cancel_event.is_set():
+                        # 已开始的文档会完整写完，尚未开始的直接取消
+                        pool.shutdown(wait=True, cancel_futures=True)
+                        break
+                    summaries.append(future.result())
+                    self.progress.put(("progress", done, total))
+
+            summaries.sort(key=lambda summary: summary["docx"])
+            write_batch_report(
+                os.path.join(self.output_root, self.REPORT_NAME), summaries
+            )
+        except Exception as e:
+            error = e
+
+        cancelled = self.cancel_event.is_set()
+        self.progress.put(("batch_done", summaries, cancelled, error))
+        return summaries, cancelled, error
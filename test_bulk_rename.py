@@ -0,0 +1,95 @@
+"""批量重命名事务日志的崩溃恢复测试
+
+通过手工执行计划中的前若干步（可选是否记录进度）模拟进程在任意位置崩溃，
+恢复后每个文件名下必须仍是原来的内容
+"""
+
+import os
+
+import pytest
+
+import bulk_rename
+from bulk_rename import apply_renames, plan_renames, recover_renames
+
+SWAP = {"001.jpg": "002.jpg", "002.jpg": "001.jpg"}
+# 一个环（001 -> 002 -> 003 -> 001）加一条链（004 -> 005 -> 006）
+MIXED = {
+    "001.jpg": "002.jpg",
+    "002.jpg": "003.jpg",
+    "003.jpg": "001.jpg",
+    "005.jpg": "006.jpg",
+    "004.jpg": "005.jpg",
+}
+
+
+def make_folder(folder, names):
+    for name in names:
+        (folder / name).write_bytes(name.encode())
+
+
+def contents(folder):
+    return {
+        name: (folder / name).read_bytes()
+        for name in os.listdir(folder)
+        if name != bulk_rename.RENAME_JOURNAL_NAME
+    }
+
+
+def crash_after(folder, mapping, executed, logged):
+    """执行计划的前 executed 步后“崩溃”；logged 为 False 时最后一步未记录进度"""
+    steps = plan_renames(str(folder), mapping)
+    with bulk_rename._write_journal(str(folder), steps) as journal:
+        for index, (old_name, new_name) in enumerate(steps[:executed]):
+            os.rename(folder / old_name, folder / new_name)
+            if logged or index < executed - 1:
+                bulk_rename._log_progress(journal, "done", index)
+    return steps
+
+
+@pytest.mark.parametrize("mapping", [SWAP, MIXED], ids=["swap", "mixed"])
+def test_recover_after_crash_at_every_step(tmp_path, mapping):
+    names = sorted(mapping)
+    make_folder(tmp_path, names)
+    step_count = len(plan_renames(str(tmp_path), mapping))
+    for executed in range(step_count + 1):
+        for logged in (True, False):
+            folder = tmp_path / f"crash_{executed}_{logged}"
+            folder.mkdir()
+            make_folder(folder, names)
+            original = contents(folder)
+
+            crash_after(folder, mapping, executed, logged)
+            assert recover_renames(str(folder)) == executed
+            assert contents(folder) == original
+            assert not os.path.exists(folder / bulk_rename.RENAME_JOURNAL_NAME)
+
+
+def test_recover_after_crash_while_undoing(tmp_path, monkeypatch):
+    make_folder(tmp_path, SWAP)
+    original = contents(tmp_path)
+    steps = crash_after(tmp_path, SWAP, 3, True)
+
+    # 第一次恢复只撤销了一步就“崩溃”
+    real_rename = os.rename
+    calls = []
+
+    def failing_rename(src, dst):
+        if calls:
+            raise KeyboardInterrupt
+        calls.append(src)
+        real_rename(src, dst)
+
+    monkeypatch.setattr(bulk_rename.os, "rename", failing_rename)
+    with pytest.raises(KeyboardInterrupt):
+        recover_renames(str(tmp_path))
+    monkeypatch.setattr(bulk_rename.os, "rename", real_rename)
+
+    assert recover_renames(str(tmp_path)) == len(steps) - 1
+    assert contents(tmp_path) == original
+
+
+def test_apply_swaps_contents(tmp_path):
+    make_folder(tmp_path, SWAP)
+    assert apply_renames(str(tmp_path), SWAP) == SWAP
+    assert contents(tmp_path) == {"001.jpg": b"002.jpg", "002.jpg": b"001.jpg"}
+    assert not os.path.exists(tmp_path / bulk_rename.RENAME_JOURNAL_NAME)
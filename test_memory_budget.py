@@ -0,0 +1,62 @@
+"""内存预算的预留与淘汰测试"""
+
+import threading
+
+from memory_budget import EVICTABLE, NEARBY, PINNED, MemoryBudget
+
+
+def test_parallel_reservations_stay_under_limit():
+    budget = MemoryBudget(limit=1000)
+    budget.charge("viewer", "image", 400, PINNED)
+    results = []
+    barrier = threading.Barrier(8)
+
+    def worker(index):
+        barrier.wait()
+        results.append(budget.reserve("cache", index, 200))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 3
+    assert budget.current_bytes == 1000
+
+
+def test_reservation_becomes_charge_and_can_be_cancelled():
+    budget = MemoryBudget(limit=1000)
+    assert budget.reserve("cache", "a", 300)
+    budget.charge("cache", "a", 250, NEARBY, lambda: None)
+    assert budget.reserve("cache", "b", 300)
+    budget.discharge("cache", "b")
+    assert budget.current_bytes == 250
+
+
+def test_failed_reservation_is_made_room_for_by_enforce():
+    budget = MemoryBudget(limit=1000)
+    released = []
+    for key in ("old", "new"):
+        budget.charge(
+            "cache", key, 400, EVICTABLE, lambda key=key: released.append(key)
+        )
+
+    # 淘汰缓存后才能容纳：预留失败，但下次 enforce 会腾出空间
+    assert not budget.reserve("prefetch", "next", 300)
+    assert budget.current_bytes == 800
+    assert budget.enforce() == 400
+    assert released == ["old"]
+    assert budget.reserve("prefetch", "next", 300)
+
+
+
+def test_unreachable_reservation_does_not_evict():
+    budget = MemoryBudget(limit=1000)
+    budget.charge("viewer", "image", 800, PINNED)
+    budget.charge("cache", "old", 100, EVICTABLE, lambda: None)
+
+    # 即使淘汰全部缓存也放不下时，不为其淘汰任何内容
+    assert not budget.reserve("prefetch", "next", 300)
+    assert budget.enforce() == 0
+    assert budget.current_bytes == 900
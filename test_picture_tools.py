@@ -0,0 +1,106 @@
+"""浏览文档与完整提取之间的提取清单衔接测试，以及按目标大小压缩的搜索"""
+
+import io
+import os
+import zipfile
+
+from PIL import Image, ImageFilter
+
+from picture_tools import (
+    DocxImageSource,
+    ImageExtractionJob,
+    compress_to_target,
+    encode_to_buffer,
+    load_manifest,
+)
+
+RELS_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+DOC_NS = (
+    'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+    'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+)
+DRAWING = '<w:p><w:r><w:drawing><a:blip r:embed="rId{}"/></w:drawing></w:r></w:p>'
+
+
+def png_bytes(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (40, 30), color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def make_docx(path, colors):
+    """按顺序嵌入纯色PNG，颜色相同的图片内容完全相同"""
+    rels = []
+    body = []
+    with zipfile.ZipFile(path, "w") as z:
+        for i, color in enumerate(colors, 1):
+            z.writestr(f"word/media/image{i}.png", png_bytes(color))
+            rels.append(f'<Relationship Id="rId{i}" Target="media/image{i}.png"/>')
+            body.append(DRAWING.format(i))
+        z.writestr(
+            "word/_rels/document.xml.rels",
+            f'<Relationships xmlns="{RELS_NS}">{"".join(rels)}</Relationships>',
+        )
+        z.writestr(
+            "word/document.xml",
+            f"<w:document {DOC_NS}><w:body>{''.join(body)}</w:body></w:document>",
+        )
+
+
+def extract(docx_path, output_folder):
+    images, cancelled, error = ImageExtractionJob(
+        docx_path, output_folder, max_workers=2, dedup="skip"
+    ).run()
+    assert error is None and not cancelled
+    return images
+
+
+def test_skip_dedup_does_not_write_duplicates(tmp_path):
+    docx_path = tmp_path / "doc.docx"
+    make_docx(docx_path, ["red", "red", "blue"])
+    output = tmp_path / "out"
+    output.mkdir()
+
+    assert extract(str(docx_path), str(output)) == ["001.png", "003.png"]
+    entry = load_manifest(str(output))["entries"]["word/media/image2.png"]
+    assert entry["duplicate_of"] == "word/media/image1.png"
+    assert "output" not in entry
+
+
+def test_renamed_duplicate_survives_full_extraction(tmp_path):
+    docx_path = tmp_path / "doc.docx"
+    make_docx(docx_path, ["red", "red", "blue"])
+    output = tmp_path / "out"
+
+    # 浏览文档时把重复的第二张图片改名写出
+    source = DocxImageSource(str(docx_path))
+    try:
+        source.extract("002.png", str(output), "封面.png")
+    finally:
+        source.close()
+
+    for _ in range(2):
+        images = extract(str(docx_path), str(output))
+        assert images == ["001.png", "003.png", "封面.png"]
+        entry = load_manifest(str(output))["entries"]["word/media/image2.png"]
+        assert entry["output"] == "封面.png"
+        assert entry["duplicate_of"] == "word/media/image1.png"
+        assert (output / "封面.png").read_bytes() == png_bytes("red")
+    assert not os.path.exists(output / "002.png")
+
+
+def test_target_search_tries_chroma_subsampling_before_lower_quality():
+    # 带色彩噪声的图片，色度采样对大小影响明显
+    noise = [
+        Image.effect_noise((400, 300), 60).filter(ImageFilter.GaussianBlur(1.5))
+        for _ in range(3)
+    ]
+    image = Image.merge("RGB", noise)
+    full_chroma = len(encode_to_buffer(image, "JPEG", 90, subsampling="4:4:4"))
+    subsampled = len(encode_to_buffer(image, "JPEG", 95, subsampling="4:2:0"))
+    assert subsampled < full_chroma
+
+    result = compress_to_target(image, subsampled, "JPEG")
+    assert result["fits"] and result["scale"] == 1.0
+    assert (result["quality"], result["subsampling"]) == (95, "4:2:0")
@@ -0,0 +1,116 @@
+"""缩略图生成与磁盘缓存
+
+缩略图按文件内容的哈希存放，重命名或移动图片后仍可命中缓存；
+生成时使用JPEG草稿模式和 reduce，不必完整解码大图
+"""
+
+import hashlib
+import io
+import os
+import threading
+
+from PIL import Image, ImageOps
+
+from large_image import LARGE_IMAGE_PIXELS, LargeImage, is_large_image
+
+# 流式计算文件哈希时每次读取的块大小
+HASH_CHUNK_SIZE = 256 * 1024
+
+
+def default_cache_dir():
+    """缩略图缓存目录：Windows 使用 LOCALAPPDATA，其它平台使用 ~/.cache"""
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "picture-tools", "thumbnails")
+
+
+def file_digest(path):
+    """流式计算文件内容的SHA-1"""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_thumbnail(path, size):
+    """生成不超过 size×size 的缩略图，尽量避免完整解码原图；path 也可以是文件对象"""
+    if isinstance(path, str) and is_large_image(path, LARGE_IMAGE_PIXELS):
+        # 大图逐段解码出已转正的预览图再缩小，不整幅解码
+        thumbnail = LargeImage(path).preview(size * size)
+        thumbnail.thumbnail((size, size), Image.Resampling.LANCZOS)
+    else:
+        with Image.open(path) as image:
+            # JPEG 在解码阶段直接按 1/2、1/4、1/8 缩小
+            image.draft("RGB", (size, size))
+            image.thumbnail((size, size), Image.Resampling.LANCZOS, reducing_gap=2.0)
+            # 关闭原图前复制出缩略图，缩略图很小，复制几乎没有开销
+            thumbnail = ImageOps.exif_transpose(image)
+
+    if thumbnail.mode not in ("RGB", "RGBA"):
+        thumbnail = thumbnail.convert("RGBA" if "A" in thumbnail.getbands() else "RGB")
+    return thumbnail
+
+
+class ThumbnailCache:
+    """以文件内容哈希为键的缩略图磁盘缓存
+
+    哈希按 (路径, 大小, 修改时间) 在内存中记住，同一会话内不会重复读取文件
+    """
+
+    def __init__(self, cache_dir=None, size=96):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.size = size
+        self.digests = {}
+        self.lock = threading.Lock()
+
+    def _digest(self, path):
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        with self.lock:
+            digest = self.digests.get(key)
+        if digest is None:
+            digest = file_digest(path)
+            with self.lock:
+                self.digests[key] = digest
+        return digest
+
+    def _cache_path(self, digest):
+        return os.path.join(
+            self.cache_dir, digest[:2], f"{digest}_{self.size}.png"
+        )
+
+    def get(self, path):
+        """返回图片的缩略图，缓存中没有时生成并写入缓存；可在后台线程中调用"""
+        return self._get(self._digest(path), path)
+
+    def get_data(self, data):
+        """返回内存中图片数据（如 .docx 中的成员）的缩略图
+
+        哈希与 file_digest 一致，提取到磁盘后仍命中同一份缓存
+        """
+        return self._get(hashlib.sha1(data).hexdigest(), io.BytesIO(data))
+
+    def _get(self, digest, source):
+        cache_path = self._cache_path(digest)
+        try:
+            cached = Image.open(cache_path)
+            cached.load()
+            return cached
+        except (OSError, ValueError):
+            pass
+
+        thumbnail = make_thumbnail(source, self.size)
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            temp_path = f"{cache_path}.{threading.get_ident()}.part"
+            thumbnail.save(temp_path, "PNG")
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            print(f"写入缩略图缓存失败: {e}")
+        return thumbnail